@@ -94,6 +94,28 @@ def extract_param_list(params, prefix=''):
     return [dict(kv for di, kv in m) for mi, m in members]
 
 
+def extract_param_values(params, prefix=''):
+    """
+    Extract a list of user input values, from an AWS style list of simple
+    values
+
+    Statistics.member.1=Average
+    Statistics.member.2=Maximum
+
+    This can be extracted by passing prefix=Statistics, resulting in the
+    list ['Average', 'Maximum']
+    """
+    key_re = re.compile(r"%s\.member\.([0-9]+)$" % (prefix))
+
+    members = []
+    for param_name, value in params.items():
+        match = key_re.match(param_name)
+        if match:
+            members.append((int(match.group(1)), value))
+
+    return [value for index, value in sorted(members)]
+
+
 def get_param_value(params, key):
     """
     Helper function, looks up an expected parameter in a parsed
@@ -16,16 +16,20 @@
 """
 endpoint for heat AWS-compatible CloudWatch API
 """
+import datetime
+
 from heat.api.aws import exception
 from heat.api.aws import utils as api_utils
 from heat.common import wsgi
 from heat.common import policy
 from heat.common import exception as heat_exception
+from heat.openstack.common import timeutils
 from heat.rpc import client as rpc_client
 from heat.rpc import api as engine_api
 
 import heat.openstack.common.rpc.common as rpc_common
 from heat.openstack.common import log as logging
+from heat.openstack.common.gettextutils import _
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +41,10 @@ class WatchController(object):
     Implements the API actions
     """
 
+    # The most results returned at once, as for AWS
+    MAX_METRICS = 500
+    MAX_DATAPOINTS = 1440
+
     def __init__(self, options):
         self.options = options
         self.engine_rpcapi = rpc_client.EngineClient()
@@ -174,7 +182,64 @@ class WatchController(object):
         Implements GetMetricStatistics API action
         """
         self._enforce(req, 'GetMetricStatistics')
-        return exception.HeatAPINotImplementedError()
+
+        def format_datapoint(d):
+            """
+            Reformat engine output into the AWS "Datapoint" format
+            """
+            result = {
+                'Timestamp': d[engine_api.METRIC_STATISTICS_TIME],
+                'Unit': d[engine_api.METRIC_STATISTICS_UNIT],
+            }
+            result.update(d[engine_api.METRIC_STATISTICS])
+            return result
+
+        con = req.context
+        parms = dict(req.params)
+        namespace = api_utils.get_param_value(parms, 'Namespace')
+        metric_name = api_utils.get_param_value(parms, 'MetricName')
+        statistics = api_utils.extract_param_values(parms,
+                                                    prefix='Statistics')
+        if not statistics:
+            return exception.HeatMissingParameterError("Statistics list")
+        for stat in statistics:
+            if stat not in engine_api.METRIC_STATISTICS_TYPES:
+                msg = 'Invalid statistic %s' % stat
+                return exception.HeatInvalidParameterValueError(detail=msg)
+
+        try:
+            start = timeutils.normalize_time(timeutils.parse_isotime(
+                parms.get('NextToken') or
+                api_utils.get_param_value(parms, 'StartTime')))
+            end = timeutils.normalize_time(timeutils.parse_isotime(
+                api_utils.get_param_value(parms, 'EndTime')))
+            period = int(api_utils.get_param_value(parms, 'Period'))
+        except ValueError as ex:
+            return exception.HeatInvalidParameterValueError(detail=str(ex))
+        if period <= 0:
+            msg = 'Period must be a positive number of seconds'
+            return exception.HeatInvalidParameterValueError(detail=msg)
+
+        # Return at most MAX_DATAPOINTS periods at once, and a NextToken
+        # giving the start of the next page if there are more
+        page_end = min(end, start + datetime.timedelta(
+            seconds=period * self.MAX_DATAPOINTS))
+
+        try:
+            stats = self.engine_rpcapi.show_watch_metric_statistics(
+                con, namespace, metric_name, timeutils.isotime(start),
+                timeutils.isotime(page_end), period, statistics,
+                unit=parms.get('Unit'))
+        except rpc_common.RemoteError as ex:
+            return exception.map_remote_error(ex)
+
+        res = {'Label': metric_name,
+               'Datapoints': [format_datapoint(d) for d in stats]}
+        if page_end < end:
+            res['NextToken'] = timeutils.isotime(page_end)
+
+        result = api_utils.format_response("GetMetricStatistics", res)
+        return result
 
     def list_metrics(self, req):
         """
@@ -184,12 +249,9 @@ class WatchController(object):
         """
         self._enforce(req, 'ListMetrics')
 
-        def format_metric_data(d, fil={}):
+        def format_metric_data(d):
             """
             Reformat engine output into the AWS "Metric" format
-            Takes an optional filter dict, which is traversed
-            so a metric dict is only returned if all keys match
-            the filter dict
             """
             dimensions = [
                 {'AlarmName': d[engine_api.WATCH_DATA_ALARM]},
@@ -206,39 +268,34 @@ class WatchController(object):
                 'Namespace': d[engine_api.WATCH_DATA_NAMESPACE],
             }
 
-            for f in fil:
-                try:
-                    value = result[f]
-                    if value != fil[f]:
-                        # Filter criteria not met, return None
-                        return
-                except KeyError:
-                    logger.warning("Invalid filter key %s, ignoring" % f)
-
             return result
 
         con = req.context
         parms = dict(req.params)
         # FIXME : Don't yet handle filtering by Dimensions
-        filter_result = dict((k, v) for (k, v) in parms.iteritems() if k in
-                             ("MetricName", "Namespace"))
-        logger.debug("filter parameters : %s" % filter_result)
+        namespace = parms.get('Namespace')
+        metric_name = parms.get('MetricName')
+        logger.debug("filter parameters : namespace %s, metric_name %s" %
+                     (namespace, metric_name))
+
+        marker = parms.get('NextToken')
+        if marker is not None:
+            try:
+                marker = int(marker)
+            except ValueError:
+                msg = 'Invalid NextToken %s' % marker
+                return exception.HeatInvalidParameterValueError(detail=msg)
 
         try:
-            # Engine does not currently support query by namespace/metric
-            # so we pass None/None and do any filtering locally
-            null_kwargs = {'metric_namespace': None,
-                           'metric_name': None}
-            watch_data = self.engine_rpcapi.show_watch_metric(con,
-                                                              **null_kwargs)
+            watch_data = self.engine_rpcapi.show_watch_metric(
+                con, metric_namespace=namespace, metric_name=metric_name,
+                limit=self.MAX_METRICS, marker=marker)
         except rpc_common.RemoteError as ex:
             return exception.map_remote_error(ex)
 
-        res = {'Metrics': []}
-        for d in watch_data:
-            metric = format_metric_data(d, filter_result)
-            if metric:
-                res['Metrics'].append(metric)
+        res = {'Metrics': [format_metric_data(d) for d in watch_data]}
+        if len(watch_data) == self.MAX_METRICS:
+            res['NextToken'] = str(watch_data[-1][engine_api.WATCH_DATA_ID])
 
         result = api_utils.format_response("ListMetrics", res)
         return result
@@ -271,17 +328,19 @@ class WatchController(object):
             logger.error("Request does not contain required MetricData")
             return exception.HeatMissingParameterError("MetricData list")
 
+        # Each MetricData entry may have its own AlarmName dimension,
+        # otherwise the one given in any entry applies
         watch_name = None
-        dimensions = []
+        entries = []
         for p in metric_data:
             dimension = api_utils.extract_param_pairs(p,
                                                       prefix='Dimensions',
                                                       keyname='Name',
                                                       valuename='Value')
-            if 'AlarmName' in dimension:
-                watch_name = dimension['AlarmName']
-            else:
-                dimensions.append(dimension)
+            alarm_name = dimension.pop('AlarmName', None)
+            if alarm_name and not watch_name:
+                watch_name = alarm_name
+            entries.append((p, alarm_name, dimension))
 
         # We expect an AlarmName dimension as currently the engine
         # implementation requires metric data to be associated
@@ -292,17 +351,30 @@ class WatchController(object):
             logger.error("Request does not contain AlarmName dimension!")
             return exception.HeatMissingParameterError("AlarmName dimension")
 
-        # Extract the required data from the metric_data
-        # and format dict to pass to engine
-        data = {'Namespace': namespace,
-                api_utils.get_param_value(metric_data[0], 'MetricName'): {
-                    'Unit': api_utils.get_param_value(metric_data[0], 'Unit'),
-                    'Value': api_utils.get_param_value(metric_data[0],
-                                                       'Value'),
-                    'Dimensions': dimensions}}
-
+        # Extract the required data from each entry of the metric_data
+        # and format dicts to pass to engine
+        watch_data = []
+        for p, alarm_name, dimension in entries:
+            # The data is only stored after the request has returned, so
+            # values which could not be stored are rejected now
+            value = api_utils.get_param_value(p, 'Value')
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                msg = _('Invalid MetricData Value "%s"') % value
+                return exception.HeatInvalidParameterValueError(detail=msg)
+
+            data = {'Namespace': namespace,
+                    api_utils.get_param_value(p, 'MetricName'): {
+                        'Unit': api_utils.get_param_value(p, 'Unit'),
+                        'Value': value,
+                        'Dimensions': [dimension] if dimension else []}}
+            watch_data.append([alarm_name or watch_name, data])
+
+        # The engine stores the data asynchronously, so all of the entries
+        # are simply cast to it together
         try:
-            self.engine_rpcapi.create_watch_data(con, watch_name, data)
+            self.engine_rpcapi.create_watch_data_all(con, watch_data)
         except rpc_common.RemoteError as ex:
             return exception.map_remote_error(ex)
 
@@ -22,8 +22,10 @@ import sys
 
 from oslo.config import cfg
 
+from heat.common import context
 from heat.db import api as db_api
 from heat.db import migration
+from heat.engine import watchrule
 from heat.openstack.common import log
 from heat import version
 
@@ -44,6 +46,21 @@ def do_db_sync():
     migration.db_sync(CONF.command.version)
 
 
+def do_metric_purge():
+    """
+    Purge metric samples older than the evaluation periods of their watch
+    rules plus a grace period, as the engine does periodically.
+    """
+    grace_period = CONF.command.grace_period
+    if grace_period is None:
+        grace_period = CONF.metric_retention_grace_period
+    deleted = watchrule.purge_metric_samples(context.get_admin_context(),
+                                             grace_period,
+                                             CONF.command.rollup or
+                                             CONF.metric_rollup)
+    print('Purged %d metric samples' % deleted)
+
+
 def add_command_parsers(subparsers):
     parser = subparsers.add_parser('db_version')
     parser.set_defaults(func=do_db_version)
@@ -53,6 +70,12 @@ def add_command_parsers(subparsers):
     parser.add_argument('version', nargs='?')
     parser.add_argument('current_version', nargs='?')
 
+    parser = subparsers.add_parser('metric_purge')
+    parser.set_defaults(func=do_metric_purge)
+    parser.add_argument('grace_period', nargs='?', type=int)
+    parser.add_argument('--rollup',
+                        choices=sorted(watchrule.ROLLUP_RESOLUTIONS))
+
 
 command_opt = cfg.SubCommandOpt('command',
                                 title='Commands',
@@ -100,7 +100,48 @@ engine_opts = [
                help='Driver to use for controlling instances'),
     cfg.ListOpt('plugin_dirs',
                 default=['/usr/lib64/heat', '/usr/lib/heat'],
-                help='List of directories to search for Plugins')]
+                help='List of directories to search for Plugins'),
+    cfg.IntOpt('nova_catalog_ttl',
+               default=300,
+               help='Seconds for which the flavors, images and keypairs '
+                    'listed from Nova are cached, or 0 to disable caching'),
+    cfg.IntOpt('availability_zone_ttl',
+               default=600,
+               help='Seconds after which the cached availability zones are '
+                    'listed again from Nova in the background'),
+    cfg.IntOpt('validation_pool_size',
+               default=10,
+               help='Number of the resources of a stack which are validated '
+                    'concurrently'),
+    cfg.BoolOpt('bulk_watch_evaluation',
+                default=False,
+                help='Evaluate the watch rules which are due at the same '
+                     'time together, using NumPy if it is available'),
+    cfg.IntOpt('alarm_coalesce_window',
+               default=30,
+               help='Seconds within which repeated alarm actions on the same '
+                    'resource of a stack, triggered by the periodic '
+                    'evaluation of watch rules, are run only once'),
+    cfg.FloatOpt('metric_flush_interval',
+                 default=1.0,
+                 help='Seconds between bulk writes of buffered metric '
+                      'samples'),
+    cfg.IntOpt('metric_flush_samples',
+               default=100,
+               help='Number of buffered metric samples which triggers an '
+                    'immediate bulk write'),
+    cfg.IntOpt('metric_purge_interval',
+               default=3600,
+               help='Seconds between purges of old metric samples, '
+                    'or 0 to disable purging'),
+    cfg.IntOpt('metric_retention_grace_period',
+               default=3600,
+               help='Seconds to keep metric samples beyond the evaluation '
+                    'period of their watch rule'),
+    cfg.StrOpt('metric_rollup',
+               default=None,
+               help='Resolution ("minute" or "hour") at which purged metric '
+                    'samples are rolled up into aggregates, if at all')]
 
 rpc_opts = [
     cfg.StrOpt('host',
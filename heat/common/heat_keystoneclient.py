@@ -23,6 +23,9 @@ from heat.openstack.common import log as logging
 
 logger = logging.getLogger('heat.common.keystoneclient')
 
+# IDs of the stack user role, keyed by Keystone endpoint and role name
+_stack_user_roles = {}
+
 
 class KeystoneClient(object):
     """
@@ -77,21 +80,52 @@ class KeystoneClient(object):
         # This role is designed to allow easier differentiation of the
         # heat-generated "stack users" which will generally have credentials
         # deployed on an instance (hence are implicitly untrusted)
-        roles = self.client.roles.list()
-        stack_user_role = [r.id for r in roles
-                           if r.name == cfg.CONF.heat_stack_user_role]
-        if len(stack_user_role) == 1:
-            role_id = stack_user_role[0]
-            logger.debug("Adding user %s to role %s" % (user.id, role_id))
-            self.client.roles.add_user_role(user.id, role_id,
-                                            self.context.tenant_id)
-        else:
+        try:
+            added = self._add_stack_user_role(user.id)
+        except kc.exceptions.NotFound:
+            # The cached role ID is stale (e.g. the role was recreated), so
+            # look the role up again
+            self._forget_stack_user_role_id()
+            added = self._add_stack_user_role(user.id)
+        if not added:
             logger.error("Failed to add user %s to role %s, check role exists!"
                          % (username,
                             cfg.CONF.heat_stack_user_role))
 
         return user.id
 
+    def _stack_user_role_id(self):
+        """
+        Return the ID of the heat_stack_user_role, which is looked up only
+        once per Keystone endpoint, or None if the role does not exist.
+        """
+        key = (self.context.auth_url, cfg.CONF.heat_stack_user_role)
+        if key not in _stack_user_roles:
+            roles = self.client.roles.list()
+            stack_user_role = [r.id for r in roles
+                               if r.name == cfg.CONF.heat_stack_user_role]
+            if len(stack_user_role) != 1:
+                return None
+            _stack_user_roles[key] = stack_user_role[0]
+        return _stack_user_roles[key]
+
+    def _forget_stack_user_role_id(self):
+        key = (self.context.auth_url, cfg.CONF.heat_stack_user_role)
+        _stack_user_roles.pop(key, None)
+
+    def _add_stack_user_role(self, user_id):
+        """
+        Add the user to the heat_stack_user_role, returning False if the role
+        does not exist.
+        """
+        role_id = self._stack_user_role_id()
+        if role_id is None:
+            return False
+        logger.debug("Adding user %s to role %s" % (user_id, role_id))
+        self.client.roles.add_user_role(user_id, role_id,
+                                        self.context.tenant_id)
+        return True
+
     def delete_stack_user(self, user_id):
 
         user = self.client.users.get(user_id)
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
 import re
 import yaml
 import json
@@ -21,20 +22,29 @@ HEAT_VERSIONS = (u'2012-12-12',)
 CFN_VERSIONS = (u'2010-09-09',)
 
 
+if hasattr(yaml, 'CSafeLoader'):
+    yaml_loader = yaml.CSafeLoader
+else:
+    yaml_loader = yaml.SafeLoader
+
+if hasattr(yaml, 'CSafeDumper'):
+    yaml_dumper = yaml.CSafeDumper
+else:
+    yaml_dumper = yaml.SafeDumper
+
+
 def _construct_yaml_str(self, node):
     # Override the default string handling function
     # to always return unicode objects
     return self.construct_scalar(node)
-yaml.Loader.add_constructor(u'tag:yaml.org,2002:str', _construct_yaml_str)
-yaml.SafeLoader.add_constructor(u'tag:yaml.org,2002:str', _construct_yaml_str)
-# Unquoted dates like 2013-05-23 in yaml files get loaded as objects of type
-# datetime.data which causes problems in API layer when being processed by
-# openstack.common.jsonutils. Therefore, make unicode string out of timestamps
-# until jsonutils can handle dates.
-yaml.Loader.add_constructor(u'tag:yaml.org,2002:timestamp',
-                            _construct_yaml_str)
-yaml.SafeLoader.add_constructor(u'tag:yaml.org,2002:timestamp',
-                                _construct_yaml_str)
+for loader in set([yaml.Loader, yaml.SafeLoader, yaml_loader]):
+    loader.add_constructor(u'tag:yaml.org,2002:str', _construct_yaml_str)
+    # Unquoted dates like 2013-05-23 in yaml files get loaded as objects of
+    # type datetime.data which causes problems in API layer when being
+    # processed by openstack.common.jsonutils. Therefore, make unicode string
+    # out of timestamps until jsonutils can handle dates.
+    loader.add_constructor(u'tag:yaml.org,2002:timestamp',
+                           _construct_yaml_str)
 
 
 def parse(tmpl_str, add_template_sections=True):
@@ -47,7 +57,7 @@ def parse(tmpl_str, add_template_sections=True):
         tpl = json.loads(tmpl_str)
     else:
         try:
-            tpl = yaml.safe_load(tmpl_str)
+            tpl = yaml.load(tmpl_str, Loader=yaml_loader)
         except (yaml.scanner.ScannerError, yaml.parser.ParserError) as e:
             raise ValueError(e)
         else:
@@ -75,36 +85,36 @@ def default_for_missing(tpl, version_param, versions):
             tpl[param] = {}
 
 
+_AWS_VERSION_RE = re.compile('"AWSTemplateFormatVersion"\s*:\s*"[^"]+"\s*,')
+_KEY_RE = re.compile('^(\s*)"([^"]+)"\s*:', re.M)
+_KEY_ORDER_RE = re.compile('__\d*__order__')
+
+
 def convert_json_to_yaml(json_str):
     '''Convert a string containing the AWS JSON template format
     to an equivalent string containing the Heat YAML format.
     '''
 
-    global key_order
     # Replace AWS format version with Heat format version
-    json_str = re.sub('"AWSTemplateFormatVersion"\s*:\s*"[^"]+"\s*,',
-                      '', json_str)
+    json_str = _AWS_VERSION_RE.sub('', json_str)
 
     # insert a sortable order into the key to preserve file ordering
-    key_order = 0
+    key_order = itertools.count()
 
     def order_key(matchobj):
-        global key_order
-        key = '%s"__%05d__order__%s" :' % (
+        return '%s"__%05d__order__%s" :' % (
             matchobj.group(1),
-            key_order,
+            next(key_order),
             matchobj.group(2))
-        key_order = key_order + 1
-        return key
-    key_re = re.compile('^(\s*)"([^"]+)"\s*:', re.M)
-    json_str = key_re.sub(order_key, json_str)
+    json_str = _KEY_RE.sub(order_key, json_str)
 
     # parse the string as json to a python structure
-    tpl = yaml.safe_load(json_str)
+    tpl = yaml.load(json_str, Loader=yaml_loader)
 
     # dump python structure to yaml
-    yml = "HeatTemplateFormatVersion: '2012-12-12'\n" + yaml.safe_dump(tpl)
+    yml = "HeatTemplateFormatVersion: '2012-12-12'\n" + yaml.dump(
+        tpl, Dumper=yaml_dumper)
 
     # remove ordering from key names
-    yml = re.sub('__\d*__order__', '', yml)
+    yml = _KEY_ORDER_RE.sub('', yml)
     return yml
@@ -86,6 +86,18 @@ def resource_get(context, resource_id):
     return IMPL.resource_get(context, resource_id)
 
 
+def resource_metadata_get(context, resource_id):
+    return IMPL.resource_metadata_get(context, resource_id)
+
+
+def resource_metadata_version_get(context, resource_id):
+    return IMPL.resource_metadata_version_get(context, resource_id)
+
+
+def resource_metadata_set(context, resource_id, metadata):
+    return IMPL.resource_metadata_set(context, resource_id, metadata)
+
+
 def resource_get_all(context):
     return IMPL.resource_get_all(context)
 
@@ -132,6 +144,10 @@ def stack_update(context, stack_id, values):
     return IMPL.stack_update(context, stack_id, values)
 
 
+def stack_timestamp_update(context, stack_id, values):
+    return IMPL.stack_timestamp_update(context, stack_id, values)
+
+
 def stack_delete(context, stack_id):
     return IMPL.stack_delete(context, stack_id)
 
@@ -180,6 +196,14 @@ def watch_rule_get_all_by_stack(context, stack_id):
     return IMPL.watch_rule_get_all_by_stack(context, stack_id)
 
 
+def watch_rule_get_all_by_ids(context, watch_ids):
+    return IMPL.watch_rule_get_all_by_ids(context, watch_ids)
+
+
+def watch_rule_get_version_by_name(context, watch_rule_name):
+    return IMPL.watch_rule_get_version_by_name(context, watch_rule_name)
+
+
 def watch_rule_create(context, values):
     return IMPL.watch_rule_create(context, values)
 
@@ -192,13 +216,63 @@ def watch_rule_delete(context, watch_id):
     return IMPL.watch_rule_delete(context, watch_id)
 
 
-def watch_data_create(context, values):
-    return IMPL.watch_data_create(context, values)
+def metric_sample_create(context, values):
+    return IMPL.metric_sample_create(context, values)
+
+
+def metric_sample_create_all(context, values_list):
+    return IMPL.metric_sample_create_all(context, values_list)
+
 
+def metric_sample_get_all(context, namespace=None, metric_name=None,
+                          limit=None, marker=None):
+    return IMPL.metric_sample_get_all(context, namespace, metric_name,
+                                      limit, marker)
 
-def watch_data_get_all(context):
-    return IMPL.watch_data_get_all(context)
+
+def metric_sample_get_range(context, namespace, metric_name, start_time,
+                            end_time, unit=None):
+    return IMPL.metric_sample_get_range(context, namespace, metric_name,
+                                        start_time, end_time, unit)
+
+
+def metric_sample_get_all_by_watch_rule_id(context, watch_rule_id,
+                                           start_time=None):
+    return IMPL.metric_sample_get_all_by_watch_rule_id(context,
+                                                       watch_rule_id,
+                                                       start_time)
+
+
+def metric_sample_get_values(context, watch_rule_ids, start_time):
+    return IMPL.metric_sample_get_values(context, watch_rule_ids, start_time)
+
+
+def metric_sample_aggregate_by_watch_rule_id(context, watch_rule_id,
+                                             start_time=None):
+    return IMPL.metric_sample_aggregate_by_watch_rule_id(context,
+                                                         watch_rule_id,
+                                                         start_time)
+
+
+def metric_sample_count_after(context, watch_rule_id, marker=None):
+    return IMPL.metric_sample_count_after(context, watch_rule_id, marker)
 
 
 def watch_data_delete(context, watch_name):
     return IMPL.watch_data_delete(context, watch_name)
+
+
+def metric_sample_purge(context, watch_rule_id, before, resolution=None):
+    return IMPL.metric_sample_purge(context, watch_rule_id, before,
+                                    resolution)
+
+
+def metric_aggregate_get_range(context, namespace, metric_name, start_time,
+                               end_time, unit=None):
+    return IMPL.metric_aggregate_get_range(context, namespace, metric_name,
+                                           start_time, end_time, unit)
+
+
+def metric_aggregate_get_all_by_watch_rule_id(context, watch_rule_id):
+    return IMPL.metric_aggregate_get_all_by_watch_rule_id(context,
+                                                          watch_rule_id)
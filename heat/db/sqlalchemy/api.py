@@ -14,12 +14,18 @@
 #    under the License.
 
 '''Implementation of SQLAlchemy backend.'''
+import datetime
+import hashlib
+import json
+
+import sqlalchemy
 from sqlalchemy.orm.session import Session
 
 from heat.common import crypt
 from heat.common import exception
 from heat.db.sqlalchemy import models
 from heat.db.sqlalchemy.session import get_session
+from heat.openstack.common import timeutils
 
 
 def model_query(context, *args):
@@ -68,6 +74,44 @@ def resource_get(context, resource_id):
     return result
 
 
+def resource_metadata_get(context, resource_id):
+    """Return a (version, metadata) tuple for the resource."""
+    result = model_query(context, models.Resource.metadata_version,
+                         models.Resource.rsrc_metadata).\
+        filter_by(id=resource_id).first()
+
+    if not result:
+        raise exception.NotFound("resource with id %s not found" % resource_id)
+
+    version, metadata = result
+    return version or 0, metadata
+
+
+def resource_metadata_version_get(context, resource_id):
+    """Return the current metadata version of the resource."""
+    result = model_query(context, models.Resource.metadata_version).\
+        filter_by(id=resource_id).first()
+
+    if not result:
+        raise exception.NotFound("resource with id %s not found" % resource_id)
+
+    return result[0] or 0
+
+
+def resource_metadata_set(context, resource_id, metadata):
+    """
+    Store the resource metadata, incrementing its version. Returns the new
+    metadata version.
+    """
+    rs = resource_get(context, resource_id)
+    # Increment in the database, so that concurrent writers from different
+    # engines cannot end up with the same version
+    version = sqlalchemy.func.coalesce(models.Resource.metadata_version, 0)
+    rs.update_and_save({'rsrc_metadata': metadata,
+                        'metadata_version': version + 1})
+    return rs.metadata_version
+
+
 def resource_get_by_name_and_stack(context, resource_name, stack_id):
     result = model_query(context, models.Resource).\
         filter_by(name=resource_name).\
@@ -100,6 +144,8 @@ def resource_get_all(context):
 def resource_data_get(resource, key):
     """Lookup value of resource's data by key."""
     result = resource_data_get_by_key(resource.context, resource.id, key)
+    if result.redact and result.value:
+        return crypt.decrypt(result.value)
     return result.value
 
 
@@ -110,8 +156,6 @@ def resource_data_get_by_key(context, resource_id, key):
               .first())
     if not result:
         raise exception.NotFound('No resource data found')
-    if result.redact and result.value:
-        result.value = crypt.decrypt(result.value)
     return result
 
 
@@ -213,6 +257,18 @@ def stack_update(context, stack_id, values):
         session.delete(rt)
         session.flush()
 
+    return stack
+
+
+def stack_timestamp_update(context, stack_id, values):
+    """Update the timestamps of a stack with a single UPDATE statement."""
+    rows = model_query(context, models.Stack).\
+        filter_by(id=stack_id).update(values)
+
+    if not rows:
+        raise exception.NotFound('Attempt to update a stack with id: %s %s' %
+                                 (stack_id, 'that does not exist'))
+
 
 def stack_delete(context, stack_id):
     s = stack_get(context, stack_id)
@@ -318,6 +374,26 @@ def watch_rule_get_all_by_stack(context, stack_id):
     return results
 
 
+def watch_rule_get_all_by_ids(context, watch_ids):
+    if not watch_ids:
+        return []
+    results = model_query(context, models.WatchRule).\
+        filter(models.WatchRule.id.in_(watch_ids)).all()
+    return results
+
+
+def watch_rule_get_version_by_name(context, watch_rule_name):
+    """
+    Return the (id, state, updated_at, last_evaluated) of the named watch
+    rule, or None if it does not exist, without loading the rule itself.
+    """
+    wr = models.WatchRule
+    result = model_query(context, wr.id, wr.state, wr.updated_at,
+                         wr.last_evaluated).\
+        filter(wr.name == watch_rule_name).first()
+    return tuple(result) if result is not None else None
+
+
 def watch_rule_create(context, values):
     obj_ref = models.WatchRule()
     obj_ref.update(values)
@@ -334,6 +410,7 @@ def watch_rule_update(context, watch_id, values):
 
     wr.update(values)
     wr.save(_session(context))
+    return wr
 
 
 def watch_rule_delete(context, watch_id):
@@ -344,34 +421,240 @@ def watch_rule_delete(context, watch_id):
 
     session = Session.object_session(wr)
 
-    for d in wr.watch_data:
-        session.delete(d)
+    for model in (models.MetricSample, models.MetricAggregate):
+        session.query(model).filter_by(watch_rule_id=watch_id).\
+            delete(synchronize_session=False)
 
     session.delete(wr)
     session.flush()
 
 
-def watch_data_create(context, values):
-    obj_ref = models.WatchData()
+def _dimensions_hash(dimensions):
+    return hashlib.sha1(json.dumps(dimensions, sort_keys=True)).hexdigest()
+
+
+def metric_sample_create(context, values):
+    obj_ref = models.MetricSample()
     obj_ref.update(values)
+    obj_ref.dimensions_hash = _dimensions_hash(obj_ref.dimensions or [])
     obj_ref.save(_session(context))
     return obj_ref
 
 
-def watch_data_get_all(context):
-    results = model_query(context, models.WatchData).all()
+def metric_sample_create_all(context, values_list):
+    """Insert many metric samples in a single executemany INSERT."""
+    if not values_list:
+        return
+    keys = ('created_at', 'namespace', 'metric_name', 'value', 'unit',
+            'dimensions', 'watch_rule_id')
+    rows = []
+    for values in values_list:
+        row = dict((k, values.get(k)) for k in keys)
+        row['created_at'] = row['created_at'] or timeutils.utcnow()
+        row['dimensions'] = row['dimensions'] or []
+        row['dimensions_hash'] = _dimensions_hash(row['dimensions'])
+        rows.append(row)
+    _session(context).execute(models.MetricSample.__table__.insert(), rows)
+
+
+def metric_sample_get_all(context, namespace=None, metric_name=None,
+                          limit=None, marker=None):
+    """
+    Return the metric samples, optionally of one namespace and metric, in
+    the order they were stored. If a marker (the ID of a sample) is given,
+    only the samples stored after that one are returned.
+    """
+    query = model_query(context, models.MetricSample)
+    if namespace is not None:
+        query = query.filter_by(namespace=namespace)
+    if metric_name is not None:
+        query = query.filter_by(metric_name=metric_name)
+    if marker is not None:
+        query = query.filter(models.MetricSample.id > marker)
+    query = query.order_by(models.MetricSample.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def metric_sample_get_range(context, namespace, metric_name, start_time,
+                            end_time, unit=None):
+    """
+    Return the (created_at, value, unit) of the samples of a metric taken
+    from start_time up to (but not including) end_time.
+    """
+    query = model_query(context, models.MetricSample.created_at,
+                        models.MetricSample.value,
+                        models.MetricSample.unit).\
+        filter(models.MetricSample.namespace == namespace).\
+        filter(models.MetricSample.metric_name == metric_name).\
+        filter(models.MetricSample.created_at >= start_time).\
+        filter(models.MetricSample.created_at < end_time)
+    if unit is not None:
+        query = query.filter(models.MetricSample.unit == unit)
+    return query.all()
+
+
+def _metric_sample_query(context, watch_rule_id, start_time, *args):
+    query = model_query(context, *args).\
+        filter(models.MetricSample.watch_rule_id == watch_rule_id)
+    if start_time is not None:
+        query = query.filter(models.MetricSample.created_at >= start_time)
+    return query
+
+
+def metric_sample_get_all_by_watch_rule_id(context, watch_rule_id,
+                                           start_time=None):
+    results = _metric_sample_query(context, watch_rule_id, start_time,
+                                   models.MetricSample).\
+        order_by(models.MetricSample.created_at).all()
     return results
 
 
+def metric_sample_get_values(context, watch_rule_ids, start_time):
+    """
+    Return the (watch_rule_id, created_at, value) of the samples of several
+    watch rules taken since start_time.
+    """
+    if not watch_rule_ids:
+        return []
+    return model_query(context, models.MetricSample.watch_rule_id,
+                       models.MetricSample.created_at,
+                       models.MetricSample.value).\
+        filter(models.MetricSample.watch_rule_id.in_(watch_rule_ids)).\
+        filter(models.MetricSample.created_at >= start_time).all()
+
+
+def metric_sample_aggregate_by_watch_rule_id(context, watch_rule_id,
+                                             start_time=None):
+    """
+    Return a (count, sum, minimum, maximum) tuple for the values of the
+    samples of a watch rule. The sum is 0 and the minimum and maximum are
+    None if there are no samples.
+    """
+    value = models.MetricSample.value
+    count, total, minimum, maximum = _metric_sample_query(
+        context, watch_rule_id, start_time,
+        sqlalchemy.func.count(models.MetricSample.id),
+        sqlalchemy.func.sum(value),
+        sqlalchemy.func.min(value),
+        sqlalchemy.func.max(value)).one()
+    return count, total or 0, minimum, maximum
+
+
+def metric_sample_count_after(context, watch_rule_id, marker=None):
+    """
+    Return the number of samples of a watch rule stored after the one with
+    the given ID (or of all of its samples if no marker is given), and the
+    ID of the latest of them, which is None if there are none.
+    """
+    sample_id = models.MetricSample.id
+    query = model_query(context, sqlalchemy.func.count(sample_id),
+                        sqlalchemy.func.max(sample_id)).\
+        filter(models.MetricSample.watch_rule_id == watch_rule_id)
+    if marker is not None:
+        query = query.filter(sample_id > marker)
+    count, last_id = query.one()
+    return count, last_id
+
+
 def watch_data_delete(context, watch_name):
-    ds = model_query(context, models.WatchRule).\
-        filter_by(name=watch_name).all()
+    """Delete all of the metric samples of the named watch rule."""
+    wr = watch_rule_get_by_name(context, watch_name)
 
-    if not ds:
+    if not wr:
         raise exception.NotFound('Attempt to delete watch_data: %s %s' %
                                  (watch_name, 'that does not exist'))
 
-    session = Session.object_session(ds)
-    for d in ds:
-        session.delete(d)
-    session.flush()
+    return model_query(context, models.MetricSample).\
+        filter_by(watch_rule_id=wr.id).delete(synchronize_session=False)
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _rollup(samples, resolution):
+    """
+    Group samples into intervals of resolution seconds, returning a dict
+    mapping the key of each interval to a list of count, sum, minimum and
+    maximum.
+    """
+    rollups = {}
+    for s in samples:
+        if s.value is None:
+            continue
+        seconds = int((s.created_at - _EPOCH).total_seconds())
+        start = _EPOCH + datetime.timedelta(
+            seconds=seconds - seconds % resolution)
+        key = (start, s.namespace, s.metric_name, s.unit, s.dimensions_hash)
+        r = rollups.get(key)
+        if r is None:
+            rollups[key] = [1, s.value, s.value, s.value]
+        else:
+            r[0] += 1
+            r[1] += s.value
+            r[2] = min(r[2], s.value)
+            r[3] = max(r[3], s.value)
+    return rollups
+
+
+def metric_sample_purge(context, watch_rule_id, before, resolution=None):
+    """
+    Delete the samples of a watch rule taken before the given time. If a
+    resolution (in seconds) is given, the deleted samples are first rolled
+    up into metric aggregates of that resolution. Returns the number of
+    samples deleted.
+    """
+    session = _session(context)
+    with session.begin(subtransactions=True):
+        query = session.query(models.MetricSample).\
+            filter(models.MetricSample.watch_rule_id == watch_rule_id).\
+            filter(models.MetricSample.created_at < before)
+
+        if resolution:
+            rollups = _rollup(query, resolution)
+            for key, (count, total, minimum, maximum) in rollups.items():
+                start, namespace, metric_name, unit, dimensions_hash = key
+                agg = session.query(models.MetricAggregate).filter_by(
+                    watch_rule_id=watch_rule_id, created_at=start,
+                    resolution=resolution, namespace=namespace,
+                    metric_name=metric_name, unit=unit,
+                    dimensions_hash=dimensions_hash).first()
+                if agg is None:
+                    agg = models.MetricAggregate(
+                        watch_rule_id=watch_rule_id, created_at=start,
+                        resolution=resolution, namespace=namespace,
+                        metric_name=metric_name, unit=unit,
+                        dimensions_hash=dimensions_hash, sample_count=0,
+                        sum=0.0, minimum=minimum, maximum=maximum)
+                    session.add(agg)
+                agg.sample_count += count
+                agg.sum += total
+                agg.minimum = min(agg.minimum, minimum)
+                agg.maximum = max(agg.maximum, maximum)
+
+        deleted = query.delete(synchronize_session=False)
+    return deleted
+
+
+def metric_aggregate_get_range(context, namespace, metric_name, start_time,
+                               end_time, unit=None):
+    """
+    Return the metric aggregates of a metric whose intervals start from
+    start_time up to (but not including) end_time.
+    """
+    query = model_query(context, models.MetricAggregate).\
+        filter(models.MetricAggregate.namespace == namespace).\
+        filter(models.MetricAggregate.metric_name == metric_name).\
+        filter(models.MetricAggregate.created_at >= start_time).\
+        filter(models.MetricAggregate.created_at < end_time)
+    if unit is not None:
+        query = query.filter(models.MetricAggregate.unit == unit)
+    return query.all()
+
+
+def metric_aggregate_get_all_by_watch_rule_id(context, watch_rule_id):
+    results = model_query(context, models.MetricAggregate).\
+        filter_by(watch_rule_id=watch_rule_id).\
+        order_by(models.MetricAggregate.created_at).all()
+    return results
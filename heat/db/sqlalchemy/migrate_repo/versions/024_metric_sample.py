@@ -0,0 +1,165 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import json
+
+import sqlalchemy
+
+# The number of rows copied at a time
+BATCH_SIZE = 1000
+
+
+def _batches(table):
+    '''
+    Yield the rows of a table in order of ID, in batches of at most
+    BATCH_SIZE rows, so that the whole table is never loaded at once.
+    '''
+    last_id = None
+    while True:
+        query = table.select().order_by(table.c.id).limit(BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        rows = query.execute().fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _dimensions_hash(dimensions):
+    return hashlib.sha1(json.dumps(dimensions, sort_keys=True)).hexdigest()
+
+
+def _metric_sample_table(meta):
+    return sqlalchemy.Table(
+        'metric_sample', meta,
+        sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True,
+                          nullable=False),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('updated_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('namespace', sqlalchemy.String(255)),
+        sqlalchemy.Column('metric_name', sqlalchemy.String(255),
+                          nullable=False),
+        sqlalchemy.Column('value', sqlalchemy.Float),
+        sqlalchemy.Column('unit', sqlalchemy.String(255)),
+        sqlalchemy.Column('dimensions', sqlalchemy.Text),
+        sqlalchemy.Column('dimensions_hash', sqlalchemy.String(40)),
+        sqlalchemy.Column('watch_rule_id', sqlalchemy.Integer,
+                          sqlalchemy.ForeignKey('watch_rule.id'),
+                          nullable=False),
+        sqlalchemy.Index('ix_metric_sample_watch_rule_id_created_at',
+                         'watch_rule_id', 'created_at'),
+        sqlalchemy.Index('ix_metric_sample_namespace_metric_name',
+                         'namespace', 'metric_name', 'created_at'),
+        mysql_engine='InnoDB',
+    )
+
+
+def _watch_data_table(meta):
+    return sqlalchemy.Table(
+        'watch_data', meta,
+        sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True,
+                          nullable=False),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('updated_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('data', sqlalchemy.Text),
+        sqlalchemy.Column('watch_rule_id', sqlalchemy.Integer,
+                          sqlalchemy.ForeignKey('watch_rule.id'),
+                          nullable=False),
+        sqlalchemy.Index('ix_watch_data_watch_rule_id_created_at',
+                         'watch_rule_id', 'created_at'),
+        mysql_engine='InnoDB',
+    )
+
+
+def _samples(watch_data, metric_names):
+    '''
+    Convert a watch_data row, holding a JSON blob of the form
+    {"Namespace": ..., <MetricName>: {"Unit", "Value", "Dimensions"}}, to
+    metric_sample rows. Only the metric of the row's watch rule is kept,
+    since it is the only one which was ever used from the blob.
+    '''
+    try:
+        data = json.loads(watch_data.data)
+    except (TypeError, ValueError):
+        return
+
+    metric_name = metric_names.get(watch_data.watch_rule_id)
+    if metric_name is None or metric_name not in data:
+        return
+
+    metric = data[metric_name]
+    try:
+        value = float(metric['Value'])
+    except (KeyError, TypeError, ValueError):
+        return
+    dimensions = metric.get('Dimensions') or []
+    yield {'created_at': watch_data.created_at,
+           'updated_at': watch_data.updated_at,
+           'namespace': data.get('Namespace'),
+           'metric_name': metric_name,
+           'value': value,
+           'unit': metric.get('Unit', metric.get('Units')),
+           'dimensions': json.dumps(dimensions),
+           'dimensions_hash': _dimensions_hash(dimensions),
+           'watch_rule_id': watch_data.watch_rule_id}
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData(bind=migrate_engine)
+
+    watch_rule = sqlalchemy.Table('watch_rule', meta, autoload=True)
+    metric_sample = _metric_sample_table(meta)
+    metric_sample.create()
+
+    metric_names = {}
+    for rule in watch_rule.select().execute():
+        try:
+            metric_names[rule.id] = json.loads(rule.rule).get('MetricName')
+        except (TypeError, ValueError, AttributeError):
+            pass
+
+    watch_data = sqlalchemy.Table('watch_data', meta, autoload=True)
+    for rows in _batches(watch_data):
+        samples = [s for row in rows for s in _samples(row, metric_names)]
+        if samples:
+            metric_sample.insert().execute(samples)
+
+    watch_data.drop()
+
+
+def downgrade(migrate_engine):
+    meta = sqlalchemy.MetaData(bind=migrate_engine)
+
+    sqlalchemy.Table('watch_rule', meta, autoload=True)
+    metric_sample = sqlalchemy.Table('metric_sample', meta, autoload=True)
+    watch_data = _watch_data_table(meta)
+    watch_data.create()
+
+    def _watch_data(row):
+        data = {'Namespace': row.namespace,
+                row.metric_name: {'Unit': row.unit,
+                                  'Value': row.value,
+                                  'Dimensions': json.loads(row.dimensions or
+                                                           '[]')}}
+        return {'created_at': row.created_at,
+                'updated_at': row.updated_at,
+                'data': json.dumps(data),
+                'watch_rule_id': row.watch_rule_id}
+
+    for rows in _batches(metric_sample):
+        watch_data.insert().execute([_watch_data(row) for row in rows])
+
+    metric_sample.drop()
@@ -0,0 +1,53 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData(bind=migrate_engine)
+
+    metric_aggregate = sqlalchemy.Table(
+        'metric_aggregate', meta,
+        sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True,
+                          nullable=False),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('updated_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('namespace', sqlalchemy.String(255)),
+        sqlalchemy.Column('metric_name', sqlalchemy.String(255),
+                          nullable=False),
+        sqlalchemy.Column('unit', sqlalchemy.String(255)),
+        sqlalchemy.Column('dimensions_hash', sqlalchemy.String(40)),
+        sqlalchemy.Column('resolution', sqlalchemy.Integer, nullable=False),
+        sqlalchemy.Column('sample_count', sqlalchemy.Integer),
+        sqlalchemy.Column('sum', sqlalchemy.Float),
+        sqlalchemy.Column('minimum', sqlalchemy.Float),
+        sqlalchemy.Column('maximum', sqlalchemy.Float),
+        sqlalchemy.Column('watch_rule_id', sqlalchemy.Integer,
+                          sqlalchemy.ForeignKey('watch_rule.id'),
+                          nullable=False),
+        sqlalchemy.Index('ix_metric_aggregate_watch_rule_id_created_at',
+                         'watch_rule_id', 'created_at'),
+        mysql_engine='InnoDB',
+    )
+    sqlalchemy.Table('watch_rule', meta, autoload=True)
+    metric_aggregate.create()
+
+
+def downgrade(migrate_engine):
+    meta = sqlalchemy.MetaData(bind=migrate_engine)
+
+    metric_aggregate = sqlalchemy.Table('metric_aggregate', meta,
+                                        autoload=True)
+    metric_aggregate.drop()
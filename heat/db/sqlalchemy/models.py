@@ -247,6 +247,9 @@ class Resource(BASE, HeatBase):
     status_reason = sqlalchemy.Column('status_reason', sqlalchemy.String)
     # odd name as "metadata" is reserved
     rsrc_metadata = sqlalchemy.Column('rsrc_metadata', Json)
+    metadata_version = sqlalchemy.Column('metadata_version',
+                                         sqlalchemy.Integer,
+                                         default=0)
 
     stack_id = sqlalchemy.Column(sqlalchemy.String,
                                  sqlalchemy.ForeignKey('stack.id'),
@@ -275,16 +278,51 @@ class WatchRule(BASE, HeatBase):
     stack = relationship(Stack, backref=backref('watch_rule'))
 
 
-class WatchData(BASE, HeatBase):
-    """Represents a watch_data created by the heat engine."""
+class MetricSample(BASE, HeatBase):
+    """
+    Represents a sample of a metric for a watch_rule. The time of the sample
+    is its created_at time.
+    """
+
+    __tablename__ = 'metric_sample'
+
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    namespace = sqlalchemy.Column(sqlalchemy.String)
+    metric_name = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+    value = sqlalchemy.Column(sqlalchemy.Float)
+    unit = sqlalchemy.Column(sqlalchemy.String)
+    dimensions = sqlalchemy.Column('dimensions', Json)
+    dimensions_hash = sqlalchemy.Column(sqlalchemy.String)
+
+    watch_rule_id = sqlalchemy.Column(
+        sqlalchemy.Integer,
+        sqlalchemy.ForeignKey('watch_rule.id'),
+        nullable=False)
+    watch_rule = relationship(WatchRule, backref=backref('metric_samples'))
+
+
+class MetricAggregate(BASE, HeatBase):
+    """
+    Represents the aggregate of the samples of a metric for a watch_rule
+    over an interval of resolution seconds, starting at its created_at time.
+    """
 
-    __tablename__ = 'watch_data'
+    __tablename__ = 'metric_aggregate'
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    data = sqlalchemy.Column('data', Json)
+    namespace = sqlalchemy.Column(sqlalchemy.String)
+    metric_name = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+    unit = sqlalchemy.Column(sqlalchemy.String)
+    dimensions_hash = sqlalchemy.Column(sqlalchemy.String)
+    resolution = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    sample_count = sqlalchemy.Column(sqlalchemy.Integer)
+    sum = sqlalchemy.Column(sqlalchemy.Float)
+    minimum = sqlalchemy.Column(sqlalchemy.Float)
+    maximum = sqlalchemy.Column(sqlalchemy.Float)
 
     watch_rule_id = sqlalchemy.Column(
         sqlalchemy.Integer,
         sqlalchemy.ForeignKey('watch_rule.id'),
         nullable=False)
-    watch_rule = relationship(WatchRule, backref=backref('watch_data'))
+    watch_rule = relationship(WatchRule,
+                              backref=backref('metric_aggregates'))
@@ -173,24 +173,37 @@ def format_watch(watch):
 
 
 def format_watch_data(wd):
-
-    # Demangle DB format data into something more easily used in the API
-    # We are expecting a dict with exactly two items, Namespace and
-    # a metric key
-    namespace = wd.data['Namespace']
-    metric = [(k, v) for k, v in wd.data.items() if k != 'Namespace']
-    if len(metric) == 1:
-        metric_name, metric_data = metric[0]
-    else:
-        logger.error("Unexpected number of keys in watch_data.data!")
-        return
-
     result = {
+        api.WATCH_DATA_ID: wd.id,
         api.WATCH_DATA_ALARM: wd.watch_rule.name,
-        api.WATCH_DATA_METRIC: metric_name,
+        api.WATCH_DATA_METRIC: wd.metric_name,
         api.WATCH_DATA_TIME: timeutils.isotime(wd.created_at),
-        api.WATCH_DATA_NAMESPACE: namespace,
-        api.WATCH_DATA: metric_data
+        api.WATCH_DATA_NAMESPACE: wd.namespace,
+        api.WATCH_DATA: {'Unit': wd.unit,
+                         'Value': wd.value,
+                         'Dimensions': wd.dimensions or []}
+    }
+
+    return result
+
+
+def format_metric_statistics(start, unit, count, total, minimum, maximum,
+                             statistics):
+    '''
+    Format the requested statistics of one period of a metric, given the
+    count, sum, minimum and maximum of its samples.
+    '''
+    values = {api.STATISTIC_SAMPLE_COUNT: count,
+              api.STATISTIC_SUM: total,
+              api.STATISTIC_AVERAGE: total / count,
+              api.STATISTIC_MINIMUM: minimum,
+              api.STATISTIC_MAXIMUM: maximum}
+
+    result = {
+        api.METRIC_STATISTICS_TIME: timeutils.isotime(start),
+        api.METRIC_STATISTICS_UNIT: unit,
+        api.METRIC_STATISTICS: dict((s, values[s]) for s in statistics
+                                    if s in values)
     }
 
     return result
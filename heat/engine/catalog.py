@@ -0,0 +1,156 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import datetime
+import functools
+
+import eventlet
+from eventlet import semaphore
+from oslo.config import cfg
+
+from heat.openstack.common import log as logging
+from heat.openstack.common import timeutils
+
+logger = logging.getLogger(__name__)
+
+cfg.CONF.import_opt('nova_catalog_ttl', 'heat.common.config')
+cfg.CONF.import_opt('availability_zone_ttl', 'heat.common.config')
+
+KINDS = (FLAVORS, IMAGES, KEYPAIRS) = ('flavors', 'images', 'keypairs')
+
+
+class Catalog(object):
+    '''
+    A cached listing of one kind of Nova object (flavors, images or
+    keypairs) of a tenant, indexed by name. The listing is fetched again
+    once it is older than cfg.CONF.nova_catalog_ttl seconds, and whenever a
+    name is looked up which it does not contain, so that an object created
+    since the last fetch is found before it is reported missing.
+    '''
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._by_name = None
+        self._fetched = None
+        self._generation = 0
+        self._lock = semaphore.Semaphore()
+
+    def _expired(self):
+        ttl = datetime.timedelta(seconds=cfg.CONF.nova_catalog_ttl)
+        return (self._by_name is None or
+                timeutils.utcnow() >= self._fetched + ttl)
+
+    def ids(self, list_objects, name):
+        '''
+        Return the IDs of the objects with the given name, calling
+        list_objects() to fetch the listing if necessary.
+        '''
+        generation = self._generation
+        if self._expired() or name not in self._by_name:
+            self._fetch(list_objects, generation)
+        return list(self._by_name.get(name, []))
+
+    def _fetch(self, list_objects, generation):
+        with self._lock:
+            # Only fetch the listing if no other thread fetched it while we
+            # were waiting for the lock
+            if self._generation == generation:
+                by_name = collections.defaultdict(list)
+                for obj in list_objects():
+                    by_name[obj.name].append(obj.id)
+                self._by_name = dict(by_name)
+                self._fetched = timeutils.utcnow()
+                self._generation += 1
+                logger.debug('Listed %d %s' % (len(self._by_name), self.kind))
+
+
+class AvailabilityZones(object):
+    '''
+    The cached availability zones of one Nova endpoint (i.e. region). Only
+    the first lookup waits for Nova; once the zones are older than
+    cfg.CONF.availability_zone_ttl seconds, lookups keep returning them
+    while they are listed again in a background thread.
+    '''
+
+    def __init__(self):
+        self._zones = None
+        self._fetched = None
+        self._refreshing = False
+        self._lock = semaphore.Semaphore()
+
+    def _expired(self):
+        ttl = datetime.timedelta(seconds=cfg.CONF.availability_zone_ttl)
+        return timeutils.utcnow() >= self._fetched + ttl
+
+    def zones(self, list_zones):
+        '''
+        Return the names of the availability zones, calling list_zones() to
+        list them if necessary.
+        '''
+        if self._zones is None:
+            with self._lock:
+                if self._zones is None:
+                    self._fetch(list_zones)
+        elif not self._refreshing and self._expired():
+            self._refreshing = True
+            eventlet.spawn_n(self._refresh, list_zones)
+        return list(self._zones)
+
+    def _fetch(self, list_zones):
+        self._zones = [zone.zoneName for zone in list_zones()]
+        self._fetched = timeutils.utcnow()
+
+    def _refresh(self, list_zones):
+        try:
+            self._fetch(list_zones)
+        except Exception as ex:
+            logger.warning('Refreshing availability zones failed: %s' %
+                           str(ex))
+        finally:
+            self._refreshing = False
+
+
+_catalogs = {}
+
+
+def ids(context, nova_client, kind, name):
+    '''
+    Return the IDs of the Nova objects of the given kind (one of KINDS) with
+    the given name, from the catalog of the context's tenant and the
+    client's endpoint. Keypairs belong to a user rather than a tenant, so
+    they are catalogued for each user.
+    '''
+    endpoint = getattr(nova_client.client, 'management_url', None)
+    key = (kind, getattr(context, 'tenant_id', None), endpoint)
+    if kind == KEYPAIRS:
+        key += (getattr(context, 'username', None),)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        catalog = _catalogs[key] = Catalog(kind)
+    return catalog.ids(getattr(nova_client, kind).list, name)
+
+
+def availability_zones(nova_client):
+    '''
+    Return the names of the availability zones of the client's endpoint.
+    '''
+    endpoint = getattr(nova_client.client, 'management_url', None)
+    key = ('availability_zones', endpoint)
+    zones = _catalogs.get(key)
+    if zones is None:
+        zones = _catalogs[key] = AvailabilityZones()
+    return zones.zones(functools.partial(
+        nova_client.availability_zones.list, detailed=False))
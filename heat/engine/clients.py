@@ -13,6 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import functools
+import hashlib
+import random
+import time
+
+import eventlet
 from oslo.config import cfg
 
 from heat.openstack.common import importutils
@@ -43,11 +50,149 @@ except ImportError:
 cloud_opts = [
     cfg.StrOpt('cloud_backend',
                default=None,
-               help="Cloud module to use as a backend. Defaults to OpenStack.")
+               help="Cloud module to use as a backend. Defaults to "
+                    "OpenStack."),
+    cfg.IntOpt('client_pool_size',
+               default=64,
+               help="Number of sets of authenticated clients, keyed by "
+                    "credentials, kept for reuse across stacks, or 0 to "
+                    "disable pooling."),
+    cfg.FloatOpt('backend_rate_limit',
+                 default=0.0,
+                 help="Maximum sustained rate, in requests per second, of "
+                      "calls to each Nova, Cinder or Quantum endpoint, or 0 "
+                      "for no limit."),
+    cfg.IntOpt('backend_rate_burst',
+               default=10,
+               help="Number of calls to an endpoint which may be made at "
+                    "once before backend_rate_limit applies."),
+    cfg.IntOpt('backend_overlimit_retries',
+               default=5,
+               help="Number of times an idempotent call rejected by the "
+                    "backend as over its rate limit (HTTP 413 or 429) is "
+                    "retried."),
+    cfg.IntOpt('backend_retry_max_delay',
+               default=60,
+               help="Maximum number of seconds to wait before retrying a "
+                    "call rejected as over the rate limit.")
 ]
 cfg.CONF.register_opts(cloud_opts)
 
 
+OVERLIMIT_STATUSES = (413, 429)
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+
+class RateLimiter(object):
+    '''
+    Limits the rate of calls to one backend endpoint with a token bucket
+    shared by every client of the endpoint in the engine, and retries
+    idempotent calls which the backend rejects as over its limit, honouring
+    the Retry-After time it returns and otherwise backing off exponentially
+    with jitter.
+    '''
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self._tokens = float(cfg.CONF.backend_rate_burst)
+        self._updated = time.time()
+        self.calls = 0
+        self.throttled = 0
+        self.queue_time = 0.0
+
+    def _wait(self):
+        rate = cfg.CONF.backend_rate_limit
+        if rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            now = time.time()
+            self._tokens = min(float(cfg.CONF.backend_rate_burst),
+                               self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return waited
+            delay = (1 - self._tokens) / rate
+            eventlet.sleep(delay)
+            waited += delay
+
+    @staticmethod
+    def _retry_after(ex):
+        '''
+        Return the number of seconds the backend asked us to wait before
+        retrying, or None if the exception does not mean that we were over
+        the rate limit.
+        '''
+        status = (getattr(ex, 'code', None) or
+                  getattr(ex, 'http_status', None) or
+                  getattr(ex, 'status_code', None))
+        if status not in OVERLIMIT_STATUSES:
+            return None
+        try:
+            return max(int(getattr(ex, 'retry_after', 0) or 0), 0)
+        except ValueError:
+            return 0
+
+    def call(self, method, func, *args, **kwargs):
+        '''
+        Call func(*args, **kwargs), which makes an HTTP request with the
+        given method to the endpoint.
+        '''
+        retries = 0
+        while True:
+            waited = self._wait()
+            self.calls += 1
+            self.queue_time += waited
+            try:
+                return func(*args, **kwargs)
+            except Exception as ex:
+                retry_after = self._retry_after(ex)
+                if (retry_after is None or
+                        method.upper() not in IDEMPOTENT_METHODS or
+                        retries >= cfg.CONF.backend_overlimit_retries):
+                    raise
+
+                self.throttled += 1
+                delay = retry_after or random.uniform(1, 2) * 2 ** retries
+                delay = min(delay, cfg.CONF.backend_retry_max_delay)
+                retries += 1
+                logger.warning('%s %s over limit, retrying in %.1fs '
+                               '(%d throttled, %.1fs queued of %d calls)' %
+                               (method, self.endpoint, delay, self.throttled,
+                                self.queue_time, self.calls))
+                eventlet.sleep(delay)
+
+
+_rate_limiters = {}
+
+
+def rate_limiter(endpoint):
+    '''Return the rate limiter for a backend endpoint.'''
+    limiter = _rate_limiters.get(endpoint)
+    if limiter is None:
+        limiter = _rate_limiters[endpoint] = RateLimiter(endpoint)
+    return limiter
+
+
+def _rate_limit(obj, attr, endpoint, method_arg):
+    '''
+    Route the request method obj.<attr> through the rate limiter of the
+    endpoint. method_arg is the position of the HTTP method among the
+    method's arguments.
+    '''
+    request = getattr(obj, attr)
+    limiter = rate_limiter(endpoint)
+
+    @functools.wraps(request)
+    def limited(*args, **kwargs):
+        return limiter.call(args[method_arg], request, *args, **kwargs)
+
+    setattr(obj, attr, limited)
+
+
 class OpenStackClients(object):
     '''
     Convenience class to create and cache client instances.
@@ -74,6 +219,15 @@ class OpenStackClients(object):
         self._keystone = hkc.KeystoneClient(self.context)
         return self._keystone
 
+    def expires_soon(self):
+        '''
+        Return True if the token which Keystone issued to these clients is
+        about to expire.
+        '''
+        client = getattr(self._keystone, 'client', None)
+        auth_ref = getattr(client, 'auth_ref', None)
+        return auth_ref is not None and auth_ref.will_expire_soon()
+
     def url_for(self, **kwargs):
         return self.keystone().url_for(**kwargs)
 
@@ -99,6 +253,7 @@ class OpenStackClients(object):
         management_url = self.url_for(service_type=service_type)
         client.client.auth_token = self.auth_token
         client.client.management_url = management_url
+        _rate_limit(client.client, '_cs_request', management_url, 1)
 
         self._nova[service_type] = client
         return client
@@ -145,6 +300,7 @@ class OpenStackClients(object):
         }
 
         self._quantum = quantumclient.Client(**args)
+        _rate_limit(self._quantum, 'do_request', args['endpoint_url'], 0)
 
         return self._quantum
 
@@ -171,6 +327,7 @@ class OpenStackClients(object):
         management_url = self.url_for(service_type='volume')
         self._cinder.client.auth_token = self.auth_token
         self._cinder.client.management_url = management_url
+        _rate_limit(self._cinder.client, '_cs_request', management_url, 1)
 
         return self._cinder
 
@@ -181,3 +338,68 @@ else:
     Clients = OpenStackClients
 
 logger.debug('Using backend %s' % Clients)
+
+
+class ClientPool(object):
+    '''
+    A process-wide pool of Clients objects, keyed by the credentials,
+    tenant and Keystone endpoint of the context they were created for, so
+    that every Stack loaded with the same credentials shares authenticated
+    clients (and their HTTP connections) instead of authenticating again.
+    The least recently used clients are dropped once the pool is full, and
+    clients whose Keystone token is about to expire are replaced.
+    '''
+
+    def __init__(self):
+        self._pool = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._pool)
+
+    @staticmethod
+    def _key(context):
+        if context is None:
+            return None
+        if context.auth_token is not None:
+            secret = context.auth_token
+        elif context.password is not None:
+            secret = hashlib.sha1(context.password).hexdigest()
+        else:
+            return None
+        return (secret, context.username, context.tenant_id,
+                context.auth_url)
+
+    def get(self, context):
+        '''Return the pooled clients for a context, creating them if needed.'''
+        key = self._key(context)
+        if key is None or cfg.CONF.client_pool_size <= 0:
+            return Clients(context)
+
+        clients = self._pool.pop(key, None)
+        if clients is not None and getattr(clients, 'expires_soon',
+                                           lambda: False)():
+            self.expired += 1
+            clients = None
+
+        if clients is None:
+            self.misses += 1
+            clients = Clients(context)
+        else:
+            self.hits += 1
+
+        self._pool[key] = clients
+        while len(self._pool) > cfg.CONF.client_pool_size:
+            self._pool.popitem(last=False)
+
+        logger.debug('Client pool: %d hits, %d misses, %d expired' %
+                     (self.hits, self.misses, self.expired))
+        return clients
+
+    def clear(self):
+        self._pool.clear()
+
+
+pool = ClientPool()
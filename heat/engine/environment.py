@@ -52,6 +52,63 @@
 #  LinuxDistribution: F17
 
 
+class ResourceRegistry(object):
+    """A compiled form of the resource_registry section of an environment.
+
+    Plain mappings are held in a dict and wildcard ("OS::*") mappings in a
+    prefix trie, so that the cost of a lookup depends only on the length of
+    the resource type and not on the number of entries in the registry.
+    """
+
+    _VALUE = None  # key of the mapping stored at a trie node
+
+    def __init__(self, registry):
+        self.resources = registry.get('resources', {})
+        self._exact = {}
+        self._trie = {}
+        for k, v in registry.iteritems():
+            if k == 'resources' or not v:
+                continue
+            self._exact[k] = v
+            if k.endswith('*'):
+                node = self._trie
+                for c in k[:-1]:
+                    node = node.setdefault(c, {})
+                node[self._VALUE] = v[:-1]
+
+    def _match_prefix(self, resource_type):
+        """Return the longest wildcard prefix matching resource_type and the
+        replacement for it, or (None, None) if no wildcard matches.
+        """
+        node = self._trie
+        match = (None, None)
+        for i, c in enumerate(resource_type):
+            if self._VALUE in node:
+                match = (i, node[self._VALUE])
+            node = node.get(c)
+            if node is None:
+                return match
+        if self._VALUE in node:
+            match = (len(resource_type), node[self._VALUE])
+        return match
+
+    def get_resource_type(self, resource_type, resource_name):
+        impl = self.resources.get(resource_name)
+        if impl and resource_type in impl:
+            return impl[resource_type]
+
+        # handle: "OS::Compute::Server" -> "Rackspace::Compute::Server"
+        impl = self._exact.get(resource_type)
+        if impl:
+            return impl
+        # handle: "OS::*" -> "Dreamhost::*"
+        prefix_len, replacement = self._match_prefix(resource_type)
+        if replacement is not None:
+            return replacement + resource_type[prefix_len:]
+        # no special handling, just return what we were given.
+        return resource_type
+
+
 class Environment(object):
 
     def __init__(self, env=None):
@@ -71,27 +128,35 @@ class Environment(object):
         else:
             self.params = dict((k, v) for (k, v) in env.iteritems()
                                if k != 'resource_registry')
+        self.registry = ResourceRegistry(self.resource_registry)
+        self._class_cache = {}
 
     def get_resource_type(self, resource_type, resource_name):
         """Get the specific resource type that the user wants to implement
         'resource_type'.
         """
-        impl = self.resource_registry['resources'].get(resource_name)
-        if impl and resource_type in impl:
-            return impl[resource_type]
+        return self.registry.get_resource_type(resource_type, resource_name)
 
-        # handle: "OS::Compute::Server" -> "Rackspace::Compute::Server"
-        impl = self.resource_registry.get(resource_type)
-        if impl:
-            return impl
-        # handle: "OS::*" -> "Dreamhost::*"
-        for k, v in iter(self.resource_registry.items()):
-            if k.endswith('*'):
-                orig_prefix = k[:-1]
-                if resource_type.startswith(orig_prefix):
-                    return v[:-1] + resource_type[len(orig_prefix):]
-        # no special handling, just return what we were given.
-        return resource_type
+    def get_class(self, resource_type, resource_name):
+        """Get the Resource class that implements 'resource_type' for the
+        named resource, caching the result.
+        """
+        # Only resources with their own mappings need a cache entry per name
+        if resource_name in self.registry.resources:
+            key = (resource_type, resource_name)
+        else:
+            key = (resource_type, None)
+
+        try:
+            return self._class_cache[key]
+        except KeyError:
+            # deferred import of resource module to avoid circular dependency
+            # at load time
+            from heat.engine import resource
+            cls = resource.get_class(self.get_resource_type(resource_type,
+                                                            resource_name))
+            self._class_cache[key] = cls
+            return cls
 
     def user_env_as_dict(self):
         """Get the environment as a dict, ready for storing in the db."""
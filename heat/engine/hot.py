@@ -13,6 +13,7 @@
 #    under the License.
 
 from heat.common import exception
+from heat.engine import references
 from heat.engine import template
 from heat.openstack.common import log as logging
 
@@ -147,6 +148,20 @@ class HOTemplate(template.Template):
 
         return cfn_outputs
 
+    def parse_reference(self, key, value):
+        """
+        Parse references of the form { get_attr: [my_resource, my_attr] } as
+        well as the CFN-style references to resources.
+        """
+        if key == 'get_attr':
+            if isinstance(value, list) and len(value) == 2:
+                resource, att = value
+                return resource, att
+            return None
+        if key in ('Ref', references.DEPENDS_ON):
+            return value, None
+        return None
+
     @staticmethod
     def resolve_param_refs(s, parameters):
         """
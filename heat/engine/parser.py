@@ -16,6 +16,9 @@
 import functools
 import re
 
+from eventlet import greenpool
+from oslo.config import cfg
+
 from heat.engine import environment
 from heat.common import exception
 from heat.engine import dependencies
@@ -28,7 +31,8 @@ from heat.engine import timestamp
 from heat.engine import update
 from heat.engine.parameters import Parameters
 from heat.engine.template import Template
-from heat.engine.clients import Clients
+from heat.engine import catalog
+from heat.engine import clients
 from heat.db import api as db_api
 
 from heat.openstack.common import log as logging
@@ -39,6 +43,8 @@ from heat.common.exception import StackValidationFailed
 
 logger = logging.getLogger(__name__)
 
+cfg.CONF.import_opt('validation_pool_size', 'heat.common.config')
+
 (PARAM_STACK_NAME, PARAM_REGION) = ('AWS::StackName', 'AWS::Region')
 
 
@@ -52,7 +58,8 @@ class Stack(object):
                 ) = ('IN_PROGRESS', 'FAILED', 'COMPLETE')
 
     created_time = timestamp.Timestamp(db_api.stack_get, 'created_at')
-    updated_time = timestamp.Timestamp(db_api.stack_get, 'updated_at')
+    updated_time = timestamp.Timestamp(db_api.stack_get, 'updated_at',
+                                       db_api.stack_timestamp_update)
 
     _zones = None
 
@@ -74,7 +81,7 @@ class Stack(object):
 
         self.id = stack_id
         self.context = context
-        self.clients = Clients(context)
+        self.clients = clients.pool.get(context)
         self.t = tmpl
         self.name = stack_name
         self.action = action
@@ -131,18 +138,21 @@ class Stack(object):
     def load(cls, context, stack_id=None, stack=None, resolve_data=True,
              parent_resource=None):
         '''Retrieve a Stack from the database.'''
-        if stack is None:
-            stack = db_api.stack_get(context, stack_id)
-        if stack is None:
+        db_stack = stack
+        if db_stack is None:
+            db_stack = db_api.stack_get(context, stack_id)
+        if db_stack is None:
             message = 'No stack exists with id "%s"' % str(stack_id)
             raise exception.NotFound(message)
 
-        template = Template.load(context, stack.raw_template_id)
-        env = environment.Environment(stack.parameters)
-        stack = cls(context, stack.name, template, env,
-                    stack.id, stack.action, stack.status, stack.status_reason,
-                    stack.timeout, resolve_data, stack.disable_rollback,
+        template = Template.load(context, db_stack.raw_template_id)
+        env = environment.Environment(db_stack.parameters)
+        stack = cls(context, db_stack.name, template, env,
+                    db_stack.id, db_stack.action, db_stack.status,
+                    db_stack.status_reason, db_stack.timeout, resolve_data,
+                    db_stack.disable_rollback,
                     parent_resource)
+        timestamp.load(stack, db_stack)
 
         return stack
 
@@ -168,10 +178,11 @@ class Stack(object):
             'disable_rollback': self.disable_rollback,
         }
         if self.id:
-            db_api.stack_update(self.context, self.id, s)
+            new_s = db_api.stack_update(self.context, self.id, s)
         else:
             new_s = db_api.stack_create(self.context, s)
             self.id = new_s.id
+        timestamp.load(self, new_s)
 
         self._set_param_stackid()
 
@@ -250,15 +261,20 @@ class Stack(object):
             raise StackValidationFailed(message="Duplicate names %s" %
                                         dup_names)
 
-        for res in self:
+        def validate_resource(res):
             try:
-                result = res.validate()
+                return res.validate()
             except ServerError as ex:
                 logger.exception(ex)
                 raise ex
             except Exception as ex:
                 logger.exception(ex)
                 raise StackValidationFailed(message=str(ex))
+
+        # Resources are validated concurrently, so that their lookups in
+        # the backends overlap, but failures are reported in order.
+        pool = greenpool.GreenPool(max(cfg.CONF.validation_pool_size, 1))
+        for result in pool.imap(validate_resource, self):
             if result:
                 raise StackValidationFailed(message=result)
 
@@ -281,6 +297,7 @@ class Stack(object):
         stack.update_and_save({'action': action,
                                'status': status,
                                'status_reason': reason})
+        timestamp.load(self, stack)
 
     @property
     def state(self):
@@ -529,9 +546,7 @@ class Stack(object):
 
     def get_availability_zones(self):
         if self._zones is None:
-            self._zones = [
-                zone.zoneName for zone in
-                self.clients.nova().availability_zones.list(detailed=False)]
+            self._zones = catalog.availability_zones(self.clients.nova())
         return self._zones
 
     def resolve_static_data(self, snippet):
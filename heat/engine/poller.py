@@ -0,0 +1,235 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import datetime
+import weakref
+
+from heat.openstack.common import log as logging
+from heat.openstack.common import timeutils
+
+logger = logging.getLogger(__name__)
+
+
+class BatchPoller(object):
+    '''
+    Keeps the status of a set of backend objects which are being waited on
+    up to date. The first object to be refreshed after a round of polling
+    fetches the status of all of the waiting objects in one request, and the
+    others then pick up their status from that result instead of making a
+    request of their own. While only one object is waiting, it is fetched on
+    its own.
+
+    Objects are held weakly, so that an object stops being polled as soon as
+    nothing is waiting on it any more.
+    '''
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._waiting = weakref.WeakValueDictionary()
+        self._fresh = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def refresh(self, obj):
+        '''Bring the status of an object up to date.'''
+        key = id(obj)
+        if key not in self._waiting:
+            if not self._waiting:
+                self.start()
+            self._waiting[key] = obj
+
+        if self._fresh.pop(key, None) is not None:
+            return
+
+        if len(self._waiting) > 1:
+            waiting = self._waiting.values()
+            try:
+                missed = set(id(o) for o in self.fetch_all(waiting) or [])
+            except Exception as ex:
+                logger.warning('Polling %d objects together failed: %s' %
+                               (len(waiting), str(ex)))
+            else:
+                for other in waiting:
+                    if other is not obj and id(other) not in missed:
+                        self._fresh[id(other)] = other
+                if id(obj) not in missed:
+                    return
+
+        self.fetch(obj)
+
+    def discard(self, obj):
+        '''Stop polling an object which is no longer being waited on.'''
+        self._waiting.pop(id(obj), None)
+        self._fresh.pop(id(obj), None)
+
+    @staticmethod
+    def endpoint(manager):
+        '''Return the endpoint of the backend which the manager calls.'''
+        return getattr(manager.api.client, 'management_url', None)
+
+    def start(self):
+        '''Called when the first object starts to be waited on.'''
+        pass
+
+    def fetch(self, obj):
+        '''Fetch the status of a single object.'''
+        obj.get()
+
+    def fetch_all(self, objs):
+        '''
+        Fetch the status of all of the given objects in one go. Any objects
+        whose status could not be fetched may be returned, to be fetched on
+        their own instead.
+        '''
+        raise NotImplementedError
+
+
+class ServerPoller(BatchPoller):
+    '''
+    Polls the status of Nova servers, listing only the servers which have
+    changed since the last poll.
+    '''
+
+    PAGE_SIZE = 1000
+
+    # Allow for the clocks of the engine and of Nova being out of step
+    CHANGES_MARGIN = datetime.timedelta(seconds=60)
+
+    def start(self):
+        self._since = timeutils.utcnow()
+
+    def _changed(self, since):
+        search_opts = {'changes-since': timeutils.isotime(since),
+                       'limit': self.PAGE_SIZE}
+        while True:
+            page = self.manager.list(detailed=True, search_opts=search_opts)
+            for server in page:
+                yield server
+            if len(page) < self.PAGE_SIZE:
+                break
+            search_opts['marker'] = page[-1].id
+
+    def fetch_all(self, servers):
+        started = timeutils.utcnow()
+        waiting = collections.defaultdict(list)
+        for server in servers:
+            waiting[server.id].append(server)
+
+        # Servers which are not listed have not changed
+        for changed in self._changed(self._since - self.CHANGES_MARGIN):
+            for server in waiting.get(changed.id, []):
+                server._add_details(changed._info)
+
+        self._since = started
+
+
+class VolumePoller(BatchPoller):
+    '''
+    Polls the status of Cinder volumes. The volume API cannot filter by ID,
+    so all of the tenant's volumes are listed at once; volumes which are
+    missing from the listing are fetched on their own, so that the caller
+    sees the volume being reported as not found.
+    '''
+
+    def fetch_all(self, volumes):
+        listed = dict((v.id, v) for v in self.manager.list(detailed=True))
+        missing = []
+        for volume in volumes:
+            if volume.id in listed:
+                volume._add_details(listed[volume.id]._info)
+            else:
+                missing.append(volume)
+        return missing
+
+
+class QuantumPoller(BatchPoller):
+    '''
+    Polls the status of Quantum objects of one kind (e.g. ports), listing
+    all of the waiting objects in one request filtered by their IDs.
+
+    The waiting objects are the resources which own the Quantum objects.
+    Each stores the attributes of its object in polled_attributes (None once
+    the object has been deleted), and refreshes them on its own with
+    refresh_attributes().
+    '''
+
+    def __init__(self, manager, collection):
+        super(QuantumPoller, self).__init__(manager)
+        self.collection = collection
+
+    @staticmethod
+    def endpoint(manager):
+        return getattr(manager.httpclient, 'endpoint_url', None)
+
+    def fetch(self, resource):
+        resource.refresh_attributes()
+
+    def fetch_all(self, resources):
+        ids = sorted(set(r.resource_id for r in resources))
+        list_objects = getattr(self.manager, 'list_%s' % self.collection)
+
+        # Objects which are not listed have been deleted
+        by_id = dict((attributes['id'], attributes) for attributes in
+                     list_objects(id=ids)[self.collection])
+        for resource in resources:
+            resource.polled_attributes = by_id.get(resource.resource_id)
+
+
+_pollers = {}
+
+
+def _poller(poller_class, context, manager, *args):
+    '''
+    Return the poller of the given class for the tenant of the context and
+    the endpoint of the client manager, using the manager for its requests.
+    Any further arguments are passed to the constructor of the poller, and
+    distinguish it from others of the same class.
+    '''
+    endpoint = poller_class.endpoint(manager)
+    key = (poller_class, getattr(context, 'tenant_id', None),
+           endpoint) + args
+    poller = _pollers.get(key)
+    if poller is None:
+        poller = _pollers[key] = poller_class(manager, *args)
+    else:
+        # The most recent caller's client holds the freshest token
+        poller.manager = manager
+    return poller
+
+
+def refresh_server(context, server):
+    '''
+    Bring the status of a Nova server which is being waited on up to date,
+    polling together with the other servers of the same tenant.
+    '''
+    _poller(ServerPoller, context, server.manager).refresh(server)
+
+
+def refresh_volume(context, volume_manager, volume):
+    '''
+    Bring the status of a Cinder volume which is being waited on up to date,
+    polling together with the other volumes of the same tenant.
+    '''
+    _poller(VolumePoller, context, volume_manager).refresh(volume)
+
+
+def quantum_poller(context, quantum_client, collection):
+    '''
+    Return the poller of the Quantum objects in the given collection (e.g.
+    "ports") of the context's tenant.
+    '''
+    return _poller(QuantumPoller, context, quantum_client, collection)
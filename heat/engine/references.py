@@ -0,0 +1,172 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+
+DEPENDS_ON = 'DependsOn'
+
+PROPERTIES = 'Properties'
+
+
+class Reference(collections.namedtuple('Reference',
+                                       'function resource attribute path')):
+    '''
+    A single reference from a template snippet to a resource.
+
+    function  -- the template function making the reference, e.g. "Ref"
+    resource  -- the name of the referenced resource
+    attribute -- the referenced attribute, or None for a plain reference
+    path      -- the tuple of template keys leading to the reference
+    '''
+
+    @property
+    def explicit(self):
+        '''Return True if this is an explicit DependsOn reference.'''
+        return self.function == DEPENDS_ON
+
+    @property
+    def section(self):
+        '''The top-level key of the snippet containing the reference.'''
+        return self.path[0] if self.path else self.function
+
+    @property
+    def key(self):
+        '''The template key the reference was found under.'''
+        return self.path[-1] if self.path else None
+
+
+class References(object):
+    '''
+    The references from one snippet of a template (a resource definition or
+    an output) to the resources of the template.
+    '''
+
+    def __init__(self, references=None):
+        self._references = list(references or [])
+
+    def __iter__(self):
+        return iter(self._references)
+
+    def __len__(self):
+        return len(self._references)
+
+    def resources(self):
+        '''Return the set of names of all referenced resources.'''
+        return set(r.resource for r in self)
+
+    def attributes(self):
+        '''Return the set of (resource, attribute) pairs referenced.'''
+        return set((r.resource, r.attribute) for r in self
+                   if r.attribute is not None)
+
+    def section(self, section):
+        '''Return the References found in one section of the snippet.'''
+        return References(r for r in self if r.section == section)
+
+    def properties(self):
+        '''
+        Return a dict mapping each property name to the set of names of the
+        resources which that property references.
+        '''
+        props = collections.defaultdict(set)
+        for r in self.section(PROPERTIES):
+            if len(r.path) > 1:
+                props[r.path[1]].add(r.resource)
+        return dict(props)
+
+
+def find_references(parse_reference, snippet):
+    '''
+    Walk a template snippet and return a References object for it. The
+    supplied parse_reference function is called with each key-value pair and
+    should return a (resource, attribute) tuple if the pair references a
+    resource, or None otherwise. References whose target is not a string
+    are not indexed.
+    '''
+    found = []
+
+    def walk(path, fragment):
+        if isinstance(fragment, dict):
+            for key, value in fragment.items():
+                ref = parse_reference(key, value)
+                if ref is not None and not isinstance(ref[0], basestring):
+                    # Not a resource name (e.g. a function resolved only
+                    # later), so look for references within it instead
+                    ref = None
+                if ref is None:
+                    walk(path + (key,), value)
+                else:
+                    resource, attribute = ref
+                    found.append(Reference(key, resource, attribute, path))
+        elif isinstance(fragment, list):
+            for item in fragment:
+                walk(path, item)
+
+    walk((), snippet)
+    return References(found)
+
+
+class ReferenceIndex(object):
+    '''
+    An index of the references made by each resource and output of a
+    template, built once so that the snippets need not be walked again each
+    time the dependencies of a stack are calculated.
+    '''
+
+    def __init__(self, parse_reference, resources, outputs):
+        self._parse_reference = parse_reference
+        self._snippets = resources
+        self.resources = dict((name, find_references(parse_reference, snip))
+                              for name, snip in resources.items())
+        self.outputs = dict((name, find_references(parse_reference, snip))
+                            for name, snip in outputs.items())
+
+        self._required_by = collections.defaultdict(set)
+        for name, refs in self.resources.items():
+            for target in refs.resources():
+                self._required_by[target].add(name)
+
+    def for_snippet(self, name, snippet):
+        '''
+        Return the References for the named resource, provided that the
+        snippet matches the indexed one. Snippets which are not part of the
+        template (or differ from it) are walked on demand.
+        '''
+        indexed = self._snippets.get(name)
+        if indexed is not None and (indexed is snippet or indexed == snippet):
+            return self.resources[name]
+        return find_references(self._parse_reference, snippet)
+
+    def required_by(self, name):
+        '''
+        Return the set of names of resources which directly reference the
+        named resource.
+        '''
+        return set(self._required_by.get(name, ()))
+
+    def dependents(self, names):
+        '''
+        Return the set of names of resources which reference any of the
+        named resources, either directly or through other resources.
+        '''
+        result = set()
+        pending = list(names)
+        while pending:
+            for name in self._required_by.get(pending.pop(), ()):
+                if name not in result:
+                    result.add(name)
+                    pending.append(name)
+        return result
@@ -14,6 +14,8 @@
 #    under the License.
 
 import base64
+import collections
+import copy
 from datetime import datetime
 
 from heat.engine import event
@@ -45,8 +47,7 @@ def get_types():
 def get_class(resource_type, resource_name=None, environment=None):
     '''Return the Resource class for a given resource type.'''
     if environment:
-        resource_type = environment.get_resource_type(resource_type,
-                                                      resource_name)
+        return environment.get_class(resource_type, resource_name)
 
     if resource_type.endswith(('.yaml', '.template')):
         cls = _template_class
@@ -89,6 +90,55 @@ class UpdateReplace(Exception):
         super(Exception, self).__init__(msg)
 
 
+# The number of resources whose metadata is cached by each engine
+METADATA_CACHE_SIZE = 1000
+
+
+class MetadataCache(object):
+    '''
+    An engine-local cache of resource metadata, keyed by resource ID. Each
+    entry records the metadata version it was read at, so only a cheap
+    version check is needed to find out whether the metadata was changed
+    (possibly by another engine) since it was cached. Only the most
+    recently used max_entries entries are kept, since the resources of
+    stacks deleted by other engines are never removed explicitly.
+    '''
+
+    def __init__(self, max_entries=METADATA_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, resource_id, entry):
+        self._entries.pop(resource_id, None)
+        self._entries[resource_id] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, context, resource_id):
+        '''Return a copy of the current metadata for a resource.'''
+        version = db_api.resource_metadata_version_get(context, resource_id)
+        entry = self._entries.get(resource_id)
+        if entry is None or entry[0] != version:
+            entry = db_api.resource_metadata_get(context, resource_id)
+        self._store(resource_id, entry)
+        return copy.deepcopy(entry[1])
+
+    def set(self, context, resource_id, metadata):
+        '''Store new metadata for a resource and cache it.'''
+        version = db_api.resource_metadata_set(context, resource_id, metadata)
+        self._store(resource_id, (version, copy.deepcopy(metadata)))
+
+    def remove(self, resource_id):
+        '''Drop the cached metadata for a resource.'''
+        self._entries.pop(resource_id, None)
+
+
+metadata_cache = MetadataCache()
+
+
 class Metadata(object):
     '''
     A descriptor for accessing the metadata of a resource while ensuring the
@@ -101,16 +151,15 @@ class Metadata(object):
             return None
         if resource.id is None:
             return resource.parsed_template('Metadata')
-        rs = db_api.resource_get(resource.stack.context, resource.id)
-        rs.refresh(attrs=['rsrc_metadata'])
-        return rs.rsrc_metadata
+        return metadata_cache.get(resource.stack.context, resource.id)
 
     def __set__(self, resource, metadata):
         '''Update the metadata for the owning resource.'''
         if resource.id is None:
             raise exception.ResourceNotAvailable(resource_name=resource.name)
-        rs = db_api.resource_get(resource.stack.context, resource.id)
-        rs.update_and_save({'rsrc_metadata': metadata})
+        metadata_cache.set(resource.stack.context, resource.id, metadata)
+        # Storing the metadata also changes the resource's updated_at time
+        timestamp.expire(resource)
 
 
 class Resource(object):
@@ -162,6 +211,7 @@ class Resource(object):
         self.context = stack.context
         self.name = name
         self.json_snippet = json_snippet
+        self._references = None
         self.t = stack.resolve_static_data(json_snippet)
         self.properties = Properties(self.properties_schema,
                                      self.t.get('Properties', {}),
@@ -180,6 +230,7 @@ class Resource(object):
             self.status_reason = resource.status_reason
             self.id = resource.id
             self.data = resource.data
+            timestamp.load(self, resource)
         else:
             self.resource_id = None
             self.action = self.INIT
@@ -279,29 +330,31 @@ class Resource(object):
     def __str__(self):
         return '%s "%s"' % (self.__class__.__name__, self.name)
 
-    def _add_dependencies(self, deps, head, fragment):
-        if isinstance(fragment, dict):
-            for key, value in fragment.items():
-                if key in ('DependsOn', 'Ref', 'Fn::GetAtt'):
-                    if key == 'Fn::GetAtt':
-                        value, head = value
-
-                    try:
-                        target = self.stack.resources[value]
-                    except KeyError:
-                        raise exception.InvalidTemplateReference(
-                            resource=value,
-                            key=head)
-                    if key == 'DependsOn' or target.strict_dependency:
-                        deps += (self, target)
-                else:
-                    self._add_dependencies(deps, key, value)
-        elif isinstance(fragment, list):
-            for item in fragment:
-                self._add_dependencies(deps, head, item)
+    @property
+    def references(self):
+        '''
+        Return the References from this resource's template snippet to other
+        resources, looked up in the template's reference index.
+        '''
+        if self._references is None:
+            index = self.stack.t.references
+            self._references = index.for_snippet(self.name, self.json_snippet)
+        return self._references
+
+    @references.setter
+    def references(self, refs):
+        self._references = refs
 
     def add_dependencies(self, deps):
-        self._add_dependencies(deps, None, self.t)
+        for ref in self.references:
+            try:
+                target = self.stack.resources[ref.resource]
+            except KeyError:
+                raise exception.InvalidTemplateReference(
+                    resource=ref.resource,
+                    key=ref.attribute or ref.key)
+            if ref.explicit or target.strict_dependency:
+                deps += (self, target)
         deps += (self, None)
 
     def required_by(self):
@@ -546,6 +599,7 @@ class Resource(object):
             # not been created yet.
             pass
 
+        metadata_cache.remove(self.id)
         self.id = None
 
     def resource_id_set(self, inst):
@@ -554,9 +608,30 @@ class Resource(object):
             try:
                 rs = db_api.resource_get(self.context, self.id)
                 rs.update_and_save({'nova_instance': self.resource_id})
+                timestamp.load(self, rs)
             except Exception as ex:
                 logger.warn('db error %s' % str(ex))
 
+    def _data_get(self, key):
+        '''
+        Return the value stored with the resource under the given key, or
+        None if there is none.
+        '''
+        if self.id is None:
+            return None
+        try:
+            return db_api.resource_data_get(self, key)
+        except exception.NotFound:
+            return None
+
+    def _data_set(self, key, value, redact=False):
+        '''
+        Store a value with the resource under the given key, encrypted if
+        redact is True.
+        '''
+        if self.id is not None:
+            db_api.resource_data_set(self, key, value, redact)
+
     def _store(self):
         '''Create the resource in the database.'''
         try:
@@ -571,6 +646,7 @@ class Resource(object):
 
             new_rs = db_api.resource_create(self.context, rs)
             self.id = new_rs.id
+            timestamp.load(self, new_rs)
 
             self.stack.updated_time = datetime.utcnow()
 
@@ -600,6 +676,7 @@ class Resource(object):
                                     'status': self.status,
                                     'status_reason': reason,
                                     'nova_instance': self.resource_id})
+                timestamp.load(self, rs)
 
                 self.stack.updated_time = datetime.utcnow()
             except Exception as ex:
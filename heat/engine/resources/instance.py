@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import json
@@ -22,7 +23,9 @@ from urlparse import urlparse
 
 from oslo.config import cfg
 
+from heat.engine import catalog
 from heat.engine import clients
+from heat.engine import poller
 from heat.engine import resource
 from heat.engine import scheduler
 from heat.engine.resources import volume
@@ -36,6 +39,111 @@ from heat.openstack.common import uuidutils
 
 logger = logging.getLogger(__name__)
 
+# The number of assembled userdata blobs kept for reuse, e.g. by the
+# identical members of an AutoScalingGroup
+USERDATA_CACHE_SIZE = 64
+
+_cloudinit_parts = {}
+_userdata_cache = collections.OrderedDict()
+
+
+def _make_subpart(content, filename, subtype=None):
+    if subtype is None:
+        subtype = os.path.splitext(filename)[0]
+    msg = MIMEText(content, _subtype=subtype)
+    msg.add_header('Content-Disposition', 'attachment',
+                   filename=filename)
+    return msg
+
+
+def _read_cloudinit_file(fn):
+    data = pkgutil.get_data('heat', 'cloudinit/%s' % fn)
+    data = data.replace('@INSTANCE_USER@',
+                        cfg.CONF.instance_user)
+    return data
+
+
+def _config_key():
+    return (cfg.CONF.instance_user,
+            cfg.CONF.heat_watch_server_url,
+            cfg.CONF.heat_metadata_server_url,
+            cfg.CONF.instance_connection_is_secure,
+            cfg.CONF.instance_connection_https_validate_certificates)
+
+
+def _static_parts(key):
+    '''
+    Return the attachments of the userdata which depend only on the
+    configuration, as the lists of those preceding the user's userdata,
+    preceding the metadata and following the metadata. These are read from
+    disk only once per process and configuration.
+    '''
+    parts = _cloudinit_parts.get(key)
+    if parts is not None:
+        return parts
+
+    head = [(_read_cloudinit_file('config'), 'cloud-config'),
+            (_read_cloudinit_file('boothook.sh'), 'boothook.sh',
+             'cloud-boothook'),
+            (_read_cloudinit_file('part_handler.py'), 'part-handler.py')]
+
+    middle = [(_read_cloudinit_file('loguserdata.py'),
+               'loguserdata.py', 'x-shellscript')]
+
+    tail = [(cfg.CONF.heat_watch_server_url,
+             'cfn-watch-server', 'x-cfninitdata'),
+            (cfg.CONF.heat_metadata_server_url,
+             'cfn-metadata-server', 'x-cfninitdata')]
+
+    # Create a boto config which the cfntools on the host use to know
+    # where the cfn and cw API's are to be accessed
+    cfn_url = urlparse(cfg.CONF.heat_metadata_server_url)
+    cw_url = urlparse(cfg.CONF.heat_watch_server_url)
+    is_secure = cfg.CONF.instance_connection_is_secure
+    vcerts = cfg.CONF.instance_connection_https_validate_certificates
+    boto_cfg = "\n".join(["[Boto]",
+                          "debug = 0",
+                          "is_secure = %s" % is_secure,
+                          "https_validate_certificates = %s" % vcerts,
+                          "cfn_region_name = heat",
+                          "cfn_region_endpoint = %s" %
+                          cfn_url.hostname,
+                          "cloudwatch_region_name = heat",
+                          "cloudwatch_region_endpoint = %s" %
+                          cw_url.hostname])
+    tail.append((boto_cfg, 'cfn-boto-cfg', 'x-cfninitdata'))
+
+    parts = _cloudinit_parts[key] = (head, middle, tail)
+    return parts
+
+
+def build_userdata(userdata, metadata=None):
+    '''
+    Return the MIME multipart cloud-init userdata for a server with the
+    given user-supplied userdata and (JSON-serialised) metadata. The result
+    is reused for servers with identical userdata and metadata, and only
+    the per-server parts are assembled again for a new server.
+    '''
+    key = _config_key()
+    cache_key = (key, userdata, metadata)
+    mime_string = _userdata_cache.pop(cache_key, None)
+
+    if mime_string is None:
+        head, middle, tail = _static_parts(key)
+        attachments = head + [(userdata, 'cfn-userdata', 'x-cfninitdata')]
+        attachments += middle
+        if metadata is not None:
+            attachments.append((metadata, 'cfn-init-data', 'x-cfninitdata'))
+        attachments += tail
+
+        subparts = [_make_subpart(*args) for args in attachments]
+        mime_string = MIMEMultipart(_subparts=subparts).as_string()
+
+    _userdata_cache[cache_key] = mime_string
+    while len(_userdata_cache) > USERDATA_CACHE_SIZE:
+        _userdata_cache.popitem(last=False)
+    return mime_string
+
 
 class Restarter(resource.Resource):
     properties_schema = {'InstanceId': {'Type': 'String',
@@ -179,63 +287,10 @@ class Instance(resource.Resource):
     def _build_userdata(self, userdata):
         if not self.mime_string:
             # Build mime multipart data blob for cloudinit userdata
-
-            def make_subpart(content, filename, subtype=None):
-                if subtype is None:
-                    subtype = os.path.splitext(filename)[0]
-                msg = MIMEText(content, _subtype=subtype)
-                msg.add_header('Content-Disposition', 'attachment',
-                               filename=filename)
-                return msg
-
-            def read_cloudinit_file(fn):
-                data = pkgutil.get_data('heat', 'cloudinit/%s' % fn)
-                data = data.replace('@INSTANCE_USER@',
-                                    cfg.CONF.instance_user)
-                return data
-
-            attachments = [(read_cloudinit_file('config'), 'cloud-config'),
-                           (read_cloudinit_file('boothook.sh'), 'boothook.sh',
-                            'cloud-boothook'),
-                           (read_cloudinit_file('part_handler.py'),
-                            'part-handler.py'),
-                           (userdata, 'cfn-userdata', 'x-cfninitdata'),
-                           (read_cloudinit_file('loguserdata.py'),
-                            'loguserdata.py', 'x-shellscript')]
-
+            metadata = None
             if 'Metadata' in self.t:
-                attachments.append((json.dumps(self.metadata),
-                                    'cfn-init-data', 'x-cfninitdata'))
-
-            attachments.append((cfg.CONF.heat_watch_server_url,
-                                'cfn-watch-server', 'x-cfninitdata'))
-
-            attachments.append((cfg.CONF.heat_metadata_server_url,
-                                'cfn-metadata-server', 'x-cfninitdata'))
-
-            # Create a boto config which the cfntools on the host use to know
-            # where the cfn and cw API's are to be accessed
-            cfn_url = urlparse(cfg.CONF.heat_metadata_server_url)
-            cw_url = urlparse(cfg.CONF.heat_watch_server_url)
-            is_secure = cfg.CONF.instance_connection_is_secure
-            vcerts = cfg.CONF.instance_connection_https_validate_certificates
-            boto_cfg = "\n".join(["[Boto]",
-                                  "debug = 0",
-                                  "is_secure = %s" % is_secure,
-                                  "https_validate_certificates = %s" % vcerts,
-                                  "cfn_region_name = heat",
-                                  "cfn_region_endpoint = %s" %
-                                  cfn_url.hostname,
-                                  "cloudwatch_region_name = heat",
-                                  "cloudwatch_region_endpoint = %s" %
-                                  cw_url.hostname])
-            attachments.append((boto_cfg,
-                                'cfn-boto-cfg', 'x-cfninitdata'))
-
-            subparts = [make_subpart(*args) for args in attachments]
-            mime_blob = MIMEMultipart(_subparts=subparts)
-
-            self.mime_string = mime_blob.as_string()
+                metadata = json.dumps(self.metadata)
+            self.mime_string = build_userdata(userdata, metadata)
 
         return self.mime_string
 
@@ -286,16 +341,16 @@ class Instance(resource.Resource):
             security_groups = None
         return security_groups
 
+    def _keypair_exists(self, key_name):
+        return bool(catalog.ids(self.context, self.nova(), catalog.KEYPAIRS,
+                                key_name))
+
     def _get_flavor_id(self, flavor):
-        flavor_id = None
-        flavor_list = self.nova().flavors.list()
-        for o in flavor_list:
-            if o.name == flavor:
-                flavor_id = o.id
-                break
-        if flavor_id is None:
+        flavor_ids = catalog.ids(self.context, self.nova(), catalog.FLAVORS,
+                                 flavor)
+        if not flavor_ids:
             raise exception.FlavorMissing(flavor_id=flavor)
-        return flavor_id
+        return flavor_ids[0]
 
     def handle_create(self):
         security_groups = self._get_security_groups()
@@ -305,8 +360,7 @@ class Instance(resource.Resource):
         key_name = self.properties['KeyName']
         availability_zone = self.properties['AvailabilityZone']
 
-        keypairs = [k.name for k in self.nova().keypairs.list()]
-        if key_name not in keypairs and key_name is not None:
+        if key_name is not None and not self._keypair_exists(key_name):
             raise exception.UserKeyPairMissing(key_name=key_name)
 
         image_name = self.properties['ImageId']
@@ -370,7 +424,7 @@ class Instance(resource.Resource):
 
         if not volume_attach.started():
             if server.status != 'ACTIVE':
-                server.get()
+                poller.refresh_server(self.context, server)
 
             # Some clouds append extra (STATUS) strings to the status
             short_server_status = server.status.split('(')[0]
@@ -450,8 +504,7 @@ class Instance(resource.Resource):
         # check validity of key
         key_name = self.properties.get('KeyName', None)
         if key_name:
-            keypairs = self.nova().keypairs.list()
-            if not any(k.name == key_name for k in keypairs):
+            if not self._keypair_exists(key_name):
                 return {'Error':
                         'Provided KeyName is not registered with nova'}
 
@@ -486,9 +539,11 @@ class Instance(resource.Resource):
             yield
 
             try:
-                server.get()
+                poller.refresh_server(self.context, server)
             except clients.novaclient.exceptions.NotFound:
                 break
+            if server.status == 'DELETED':
+                break
 
     def _detach_volumes_task(self):
         '''
@@ -530,21 +585,19 @@ class Instance(resource.Resource):
                 raise exception.ImageNotFound(image_name=image_identifier)
         else:
             try:
-                image_list = self.nova().images.list()
+                image_ids = catalog.ids(self.context, self.nova(),
+                                        catalog.IMAGES, image_identifier)
             except clients.novaclient.exceptions.ClientException as ex:
                 raise exception.ServerError(message=str(ex))
-            image_names = dict(
-                (o.id, o.name)
-                for o in image_list if o.name == image_identifier)
-            if len(image_names) == 0:
+            if len(image_ids) == 0:
                 logger.info("Image %s was not found in glance" %
                             image_identifier)
                 raise exception.ImageNotFound(image_name=image_identifier)
-            elif len(image_names) > 1:
+            elif len(image_ids) > 1:
                 logger.info("Mulitple images %s were found in glance with name"
                             % image_identifier)
                 raise exception.NoUniqueImageFound(image_name=image_identifier)
-            image_id = image_names.popitem()[0]
+            image_id = image_ids[0]
         return image_id
 
     def handle_suspend(self):
@@ -584,7 +637,7 @@ class Instance(resource.Resource):
                 if server.status == 'SUSPENDED':
                     return True
 
-                server.get()
+                poller.refresh_server(self.context, server)
                 logger.debug("%s check_suspend_complete status = %s" %
                              (self.name, server.status))
                 if server.status in list(self._deferred_server_statuses +
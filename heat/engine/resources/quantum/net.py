@@ -25,6 +25,8 @@ logger = logging.getLogger(__name__)
 
 
 class Net(quantum.QuantumResource):
+    quantum_collection = 'networks'
+
     properties_schema = {'name': {'Type': 'String'},
                          'value_specs': {'Type': 'Map',
                                          'Default': {}},
@@ -51,8 +53,7 @@ class Net(quantum.QuantumResource):
             self.resource_id)['network']
 
     def check_create_complete(self, *args):
-        attributes = self._show_resource()
-        return self.is_built(attributes)
+        return self._check_built()
 
     def handle_delete(self):
         client = self.quantum()
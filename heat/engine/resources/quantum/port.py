@@ -25,6 +25,7 @@ logger = logging.getLogger(__name__)
 
 
 class Port(quantum.QuantumResource):
+    quantum_collection = 'ports'
 
     fixed_ip_schema = {'subnet_id': {'Type': 'String',
                                      'Required': True},
@@ -82,8 +83,7 @@ class Port(quantum.QuantumResource):
             self.resource_id)['port']
 
     def check_create_complete(self, *args):
-        attributes = self._show_resource()
-        return self.is_built(attributes)
+        return self._check_built()
 
     def handle_delete(self):
         client = self.quantum()
@@ -16,6 +16,7 @@
 from quantumclient.common.exceptions import QuantumClientException
 
 from heat.common import exception
+from heat.engine import poller
 from heat.engine import resource
 
 from heat.openstack.common import log as logging
@@ -25,6 +26,12 @@ logger = logging.getLogger(__name__)
 
 class QuantumResource(resource.Resource):
 
+    # The collection of Quantum objects (e.g. "ports") the resource belongs
+    # to, if its status can be polled
+    quantum_collection = None
+
+    polled_attributes = None
+
     def validate(self):
         '''
         Validate any of the provided params
@@ -102,14 +109,54 @@ class QuantumResource(resource.Resource):
             return None
         return self.handle_get_attributes(self.name, name, attributes)
 
+    def _poller(self):
+        return poller.quantum_poller(self.context, self.quantum(),
+                                     self.quantum_collection)
+
+    def refresh_attributes(self):
+        '''
+        Fetch the attributes of the Quantum object into polled_attributes,
+        or None if it has been deleted.
+        '''
+        try:
+            self.polled_attributes = self._show_resource()
+        except QuantumClientException as ex:
+            if ex.status_code != 404:
+                raise ex
+            self.polled_attributes = None
+
+    def _poll_resource(self):
+        '''
+        Return the attributes of the Quantum object, polling together with
+        the other objects of the same kind which are being waited on, or
+        None if it has been deleted.
+        '''
+        self._poller().refresh(self)
+        return self.polled_attributes
+
+    def _stop_polling(self):
+        self._poller().discard(self)
+
+    def _check_built(self):
+        # Polling stops once the resource is built or has failed, so that a
+        # failed resource does not stay in the batch of those waited on
+        finished = True
+        try:
+            attributes = self._poll_resource()
+            if attributes is None:
+                raise exception.Error('%s resource[%s] not found' %
+                                      ('quantum reported', self.resource_id))
+            finished = self.is_built(attributes)
+            return finished
+        finally:
+            if finished:
+                self._stop_polling()
+
     def _confirm_delete(self):
         while True:
-            try:
-                yield
-                self._show_resource()
-            except QuantumClientException as ex:
-                if ex.status_code != 404:
-                    raise ex
+            yield
+            if self._poll_resource() is None:
+                self._stop_polling()
                 return
 
     def FnGetRefId(self):
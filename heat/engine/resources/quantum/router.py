@@ -26,6 +26,8 @@ logger = logging.getLogger(__name__)
 
 
 class Router(quantum.QuantumResource):
+    quantum_collection = 'routers'
+
     properties_schema = {'name': {'Type': 'String'},
                          'value_specs': {'Type': 'Map',
                                          'Default': {}},
@@ -52,8 +54,7 @@ class Router(quantum.QuantumResource):
             self.resource_id)['router']
 
     def check_create_complete(self, *args):
-        attributes = self._show_resource()
-        return self.is_built(attributes)
+        return self._check_built()
 
     def handle_delete(self):
         client = self.quantum()
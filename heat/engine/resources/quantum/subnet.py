@@ -25,6 +25,7 @@ logger = logging.getLogger(__name__)
 
 
 class Subnet(quantum.QuantumResource):
+    quantum_collection = 'subnets'
 
     allocation_schema = {'start': {'Type': 'String',
                                    'Required': True},
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+
 from heat.common import exception
 from heat.engine import clients
 from heat.engine import resource
@@ -37,6 +39,9 @@ class User(resource.Resource):
                                           }},
                          'Policies': {'Type': 'List'}}
 
+    # The thread creating the user, while the create is in progress
+    _creator = None
+
     def _validate_policies(self, policies):
         for policy in (policies or []):
             # When we support AWS IAM style policies, we will have to accept
@@ -77,11 +82,33 @@ class User(resource.Resource):
                 raise exception.InvalidTemplateAttribute(resource=self.name,
                                                          key='Policies')
 
-        uid = self.keystone().create_stack_user(self.physical_resource_name(),
-                                                passwd)
-        self.resource_id_set(uid)
+        # Create the keystone user in a separate thread, so that the users of
+        # the other resources being created alongside this one are created
+        # concurrently.
+        self._creator = eventlet.spawn(self.keystone().create_stack_user,
+                                       self.physical_resource_name(), passwd)
+        return self._creator
+
+    def check_create_complete(self, creator):
+        self._creator = None
+        self.resource_id_set(creator.wait())
+        return True
+
+    def _finish_create(self):
+        '''
+        Wait for a user creation that was abandoned before it completed (e.g.
+        because the create timed out or was cancelled) and record the user it
+        created, so that the user can be deleted.
+        '''
+        creator, self._creator = self._creator, None
+        if creator is not None:
+            try:
+                self.resource_id_set(creator.wait())
+            except Exception:
+                logger.exception('Error creating user %s' % str(self))
 
     def handle_delete(self):
+        self._finish_create()
         if self.resource_id is None:
             logger.error("Cannot delete User resource before user created!")
             return
@@ -163,6 +190,7 @@ class AccessKey(resource.Resource):
 
         self.resource_id_set(kp.access)
         self._secret = kp.secret
+        self._data_set('secret_key', kp.secret, redact=True)
 
     def handle_delete(self):
         self._secret = None
@@ -184,8 +212,11 @@ class AccessKey(resource.Resource):
 
     def _secret_accesskey(self):
         '''
-        Return the user's access key, fetching it from keystone if necessary
+        Return the user's access key, fetching it from keystone if it was not
+        stored when the key was created
         '''
+        if self._secret is None:
+            self._secret = self._data_get('secret_key')
         if self._secret is None:
             if not self.resource_id:
                 logger.warn('could not get secret for %s Error:%s' %
@@ -202,6 +233,7 @@ class AccessKey(resource.Resource):
                 else:
                     if kp.access == self.resource_id:
                         self._secret = kp.secret
+                        self._data_set('secret_key', kp.secret, redact=True)
                     else:
                         msg = ("Unexpected ec2 keypair, for %s access %s" %
                                (user_id, kp.access))
@@ -20,6 +20,7 @@ from heat.openstack.common.importutils import try_import
 
 from heat.common import exception
 from heat.engine import clients
+from heat.engine import poller
 from heat.engine import resource
 from heat.engine import scheduler
 
@@ -27,6 +28,22 @@ volume_backups = try_import('cinderclient.v1.volume_backups')
 
 logger = logging.getLogger(__name__)
 
+# The most scheduler steps to wait between polls of the status of a volume
+# which is being attached or detached
+MAX_POLL_STEPS = 4
+
+
+def _poll_steps():
+    """
+    Generate the number of scheduler steps to wait before each poll of a
+    volume which is being attached or detached, backing off for as long as
+    the operation remains in progress.
+    """
+    steps = 1
+    while True:
+        yield steps
+        steps = min(steps * 2, MAX_POLL_STEPS)
+
 
 class Volume(resource.Resource):
 
@@ -125,6 +142,7 @@ class VolumeAttachTask(object):
         Initialise with the stack (for obtaining the clients), ID of the
         server and volume, and the device name on the server.
         """
+        self.context = stack.context
         self.clients = stack.clients
         self.server_id = server_id
         self.volume_id = volume_id
@@ -155,11 +173,14 @@ class VolumeAttachTask(object):
         self.attachment_id = va.id
         yield
 
-        vol = self.clients.cinder().volumes.get(self.volume_id)
+        volumes = self.clients.cinder().volumes
+        vol = volumes.get(self.volume_id)
+        poll_steps = _poll_steps()
         while vol.status == 'available' or vol.status == 'attaching':
             logger.debug('%s - volume status: %s' % (str(self), vol.status))
-            yield
-            vol.get()
+            for step in range(next(poll_steps)):
+                yield
+            poller.refresh_volume(self.context, volumes, vol)
 
         if vol.status != 'in-use':
             raise exception.Error(vol.status)
@@ -175,6 +196,7 @@ class VolumeDetachTask(object):
         Initialise with the stack (for obtaining the clients), and the IDs of
         the server and volume.
         """
+        self.context = stack.context
         self.clients = stack.clients
         self.server_id = server_id
         self.volume_id = volume_id
@@ -194,8 +216,9 @@ class VolumeDetachTask(object):
         """Return a co-routine which runs the task."""
         logger.debug(str(self))
 
+        volumes = self.clients.cinder().volumes
         try:
-            vol = self.clients.cinder().volumes.get(self.volume_id)
+            vol = volumes.get(self.volume_id)
         except clients.cinderclient.exceptions.NotFound:
             logger.warning('%s - volume not found' % str(self))
             return
@@ -210,17 +233,19 @@ class VolumeDetachTask(object):
         yield
 
         try:
-            vol.get()
+            poller.refresh_volume(self.context, volumes, vol)
+            poll_steps = _poll_steps()
             while vol.status in ('in-use', 'detaching'):
                 logger.debug('%s - volume still in use' % str(self))
-                yield
+                for step in range(next(poll_steps)):
+                    yield
 
                 try:
                     server_api.delete_server_volume(self.server_id,
                                                     self.volume_id)
                 except clients.novaclient.exceptions.NotFound:
                     pass
-                vol.get()
+                poller.refresh_volume(self.context, volumes, vol)
 
             logger.info('%s - status: %s' % (str(self), vol.status))
             if vol.status != 'available':
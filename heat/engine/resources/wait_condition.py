@@ -88,8 +88,8 @@ class WaitConditionHandle(signal_responder.SignalResponder):
         '''
         Return a list of the Status values for the handle signals
         '''
-        return [self.metadata[s]['Status']
-                for s in self.metadata]
+        metadata = self.metadata
+        return [metadata[s]['Status'] for s in metadata]
 
     def get_status_reason(self, status):
         '''
@@ -97,9 +97,10 @@ class WaitConditionHandle(signal_responder.SignalResponder):
         If there is more than one handle signal matching the specified status
         then return a semicolon delimited string containing all reasons
         '''
-        return ';'.join([self.metadata[s]['Reason']
-                        for s in self.metadata
-                        if self.metadata[s]['Status'] == status])
+        metadata = self.metadata
+        return ';'.join([metadata[s]['Reason']
+                        for s in metadata
+                        if metadata[s]['Status'] == status])
 
 
 WAIT_STATUSES = (
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import datetime
 import functools
 import json
 
@@ -34,7 +36,9 @@ from heat.engine import parser
 from heat.engine import properties
 from heat.engine import resource
 from heat.engine import resources
+from heat.engine import watchbatch
 from heat.engine import watchrule
+from heat.engine import watchscheduler
 
 from heat.openstack.common import log as logging
 from heat.openstack.common import threadgroup
@@ -69,6 +73,11 @@ class EngineService(service.Service):
         super(EngineService, self).__init__(host, topic)
         # stg == "Stack Thread Groups"
         self.stg = {}
+        self._next_metric_purge = None
+        self._alarm_dispatched = {}
+        self.watch_scheduler = watchscheduler.WatchScheduler()
+        self.metric_samples = watchrule.MetricSampleBuffer(
+            cfg.CONF.metric_flush_samples)
         resources.initialise()
 
     def _start_in_thread(self, stack_id, func, *args, **kwargs):
@@ -88,13 +97,32 @@ class EngineService(service.Service):
 
     def _service_task(self):
         """
-        This is a dummy task which gets queued on the service.Service
-        threadgroup.  Without this service.Service sees nothing running
-        i.e has nothing to wait() on, so the process exits..
-        This could also be used to trigger periodic non-stack-specific
-        housekeeping tasks
+        This task gets queued on the service.Service threadgroup.  Without
+        it service.Service sees nothing running i.e has nothing to wait()
+        on, so the process exits..
+        It is also used to trigger periodic non-stack-specific housekeeping
+        tasks, currently the purging of old metric samples once every
+        cfg.CONF.metric_purge_interval seconds.
         """
-        pass
+        if cfg.CONF.metric_purge_interval <= 0:
+            return
+
+        now = timeutils.utcnow()
+        if self._next_metric_purge is not None and \
+                now < self._next_metric_purge:
+            return
+        self._next_metric_purge = now + datetime.timedelta(
+            seconds=cfg.CONF.metric_purge_interval)
+
+        try:
+            deleted = watchrule.purge_metric_samples(
+                context.get_admin_context(),
+                cfg.CONF.metric_retention_grace_period,
+                cfg.CONF.metric_rollup, now)
+        except Exception as ex:
+            logger.exception('Purging metric samples failed: %s' % str(ex))
+        else:
+            logger.debug('Purged %d metric samples' % deleted)
 
     def _start_watch_task(self, stack_id, cnxt):
         wrs = db_api.watch_rule_get_all_by_stack(cnxt,
@@ -105,10 +133,21 @@ class EngineService(service.Service):
         now = timeutils.utcnow()
         for wr in wrs:
             db_api.watch_rule_update(cnxt, wr.id, {'last_evaluated': now})
+            watchrule.invalidate(wr.name)
+            self.watch_scheduler.schedule(
+                wr.id, watchscheduler.due_time(wr.rule, now, now))
 
-        if len(wrs) > 0:
-            self._timer_in_thread(stack_id, self._periodic_watcher_task,
-                                  sid=stack_id)
+    def _schedule_new_watch_rules(self, stack_id, cnxt):
+        """
+        Add any watch rules of the stack which are not yet scheduled (e.g.
+        because they were created by a stack update) to the watch scheduler
+        """
+        now = timeutils.utcnow()
+        for wr in db_api.watch_rule_get_all_by_stack(cnxt, stack_id):
+            if wr.id not in self.watch_scheduler:
+                self.watch_scheduler.schedule(
+                    wr.id, watchscheduler.due_time(wr.rule,
+                                                   wr.last_evaluated, now))
 
     def start(self):
         super(EngineService, self).start()
@@ -118,12 +157,35 @@ class EngineService(service.Service):
         self.tg.add_timer(cfg.CONF.periodic_interval,
                           self._service_task)
 
-        # Create a periodic_watcher_task per-stack
+        # A single periodic_watcher_task evaluates the watch rules of all
+        # stacks as they fall due
+        self.tg.add_timer(cfg.CONF.periodic_interval,
+                          self._periodic_watcher_task)
+
+        # Write buffered metric data to the database in bulk
+        self.tg.add_timer(cfg.CONF.metric_flush_interval,
+                          self._flush_metric_samples)
+
+        # Schedule the watch rules of every stack
         admin_context = context.get_admin_context()
         stacks = db_api.stack_get_all(admin_context)
         for s in stacks:
             self._start_watch_task(s.id, admin_context)
 
+    def stop(self):
+        self._flush_metric_samples()
+        super(EngineService, self).stop()
+
+    def _flush_metric_samples(self):
+        """
+        Periodic task which writes the buffered metric samples to the
+        database
+        """
+        try:
+            self.metric_samples.flush(context.get_admin_context())
+        except Exception as ex:
+            logger.exception('Storing metric samples failed: %s' % str(ex))
+
     @request_context
     def identify_stack(self, cnxt, stack_name):
         """
@@ -286,7 +348,12 @@ class EngineService(service.Service):
 
         updated_stack.validate()
 
-        self._start_in_thread(db_stack.id, current_stack.update, updated_stack)
+        def _stack_update(stack, updated_stack):
+            stack.update(updated_stack)
+            self._schedule_new_watch_rules(stack.id, cnxt)
+
+        self._start_in_thread(db_stack.id, _stack_update,
+                              current_stack, updated_stack)
 
         return dict(current_stack.identifier())
 
@@ -559,27 +626,81 @@ class EngineService(service.Service):
         stack_context = context.RequestContext.from_dict(user_creds)
         refresh_stack = parser.Stack.load(stack_context, stack=s)
 
-        # Refresh the metadata for all other resources, since we expect
-        # resource_name to be a WaitCondition resource, and other
-        # resources may refer to WaitCondition Fn::GetAtt Data, which
+        # Refresh the metadata for the other resources which refer to it,
+        # since we expect resource_name to be a WaitCondition resource, and
+        # other resources may refer to WaitCondition Fn::GetAtt Data, which
         # is updated here.
+        dependents = refresh_stack.t.references.dependents([resource_name])
         for res in refresh_stack:
-            if res.name != resource_name and res.id is not None:
+            if (res.name != resource_name and res.name in dependents and
+                    res.id is not None):
                 res.metadata_update()
 
         return resource.metadata
 
-    def _periodic_watcher_task(self, sid):
+    def _periodic_watcher_task(self):
         """
-        Periodic task, created for each stack, triggers watch-rule
-        evaluation for all rules defined for the stack
+        Periodic task, created once for all stacks, which evaluates the
+        watch rules that are due according to the watch scheduler. The due
+        rules are loaded in a single query and evaluated stack by stack.
+        """
+        now = timeutils.utcnow()
+        due = self.watch_scheduler.pop_due(now)
+        if not due:
+            return
+
+        logger.debug("Periodic watcher task: %d watch rules due" % len(due))
+        admin_context = context.get_admin_context()
+        try:
+            wrs = db_api.watch_rule_get_all_by_ids(admin_context, due)
+        except Exception as ex:
+            logger.warn('periodic_task db error %s' % str(ex))
+            # Try again on the next run
+            for wid in due:
+                self.watch_scheduler.schedule(wid, now)
+            return
+
+        states = {}
+        if cfg.CONF.bulk_watch_evaluation and watchbatch.available():
+            try:
+                states = watchbatch.alarm_states(admin_context, wrs, now)
+            except Exception as ex:
+                logger.exception('Bulk watch evaluation failed: %s' %
+                                 str(ex))
+
+        # Rules which were not found have been deleted, and are simply
+        # dropped from the schedule
+        stack_wrs = collections.defaultdict(list)
+        for wr in wrs:
+            stack_wrs[wr.stack_id].append(wr)
+
+        for sid, rules in stack_wrs.items():
+            try:
+                self._evaluate_watch_rules(admin_context, sid, rules, now,
+                                           states)
+            except Exception as ex:
+                logger.exception('Evaluating the watch rules of stack %s '
+                                 'failed: %s' % (sid, str(ex)))
+            finally:
+                # Rules which were not evaluated are due again one Period
+                # later, so that they are not lost from the schedule
+                for wr in rules:
+                    if wr.id not in self.watch_scheduler:
+                        self.watch_scheduler.schedule(
+                            wr.id, watchscheduler.due_time(
+                                wr.rule, wr.last_evaluated, now))
+
+    def _evaluate_watch_rules(self, admin_context, sid, wrs, now,
+                              states=None):
+        """
+        Evaluate the due watch rules of one stack, with the stack's stored
+        credentials, and reschedule them. Any states already calculated
+        for the rules, keyed by rule ID, are used as they are.
         sid = stack ID
         """
         # Retrieve the stored credentials & create context
         # Require admin=True to the stack_get to defeat tenant
         # scoping otherwise we fail to retrieve the stack
-        logger.debug("Periodic watcher task for stack %s" % sid)
-        admin_context = context.get_admin_context()
         stack = db_api.stack_get(admin_context, sid, admin=True)
         if not stack:
             logger.error("Unable to retrieve stack %s for periodic task" %
@@ -588,38 +709,120 @@ class EngineService(service.Service):
         user_creds = db_api.user_creds_get(stack.user_creds_id)
         stack_context = context.RequestContext.from_dict(user_creds)
 
-        # Get all watchrules for this stack and evaluate them
-        try:
-            wrs = db_api.watch_rule_get_all_by_stack(stack_context, sid)
-        except Exception as ex:
-            logger.warn('periodic_task db error (%s) %s' %
-                        ('watch rule removed?', str(ex)))
-            return
-
-        def run_alarm_action(actions):
-            for action in actions:
-                action()
-
-            stk = parser.Stack.load(stack_context, stack=stack)
-            for res in stk:
-                res.metadata_update()
-
+        actions = []
         for wr in wrs:
             rule = watchrule.WatchRule.load(stack_context, watch=wr)
-            actions = rule.evaluate()
-            if actions:
-                self._start_in_thread(sid, run_alarm_action, actions)
+            try:
+                actions.extend(rule.evaluate((states or {}).get(wr.id)))
+            except Exception as ex:
+                logger.exception('Evaluating watch %s failed: %s' %
+                                 (rule.name, str(ex)))
+            self.watch_scheduler.schedule(
+                wr.id, watchscheduler.due_time(rule.rule,
+                                               rule.last_evaluated, now))
+
+        self._dispatch_alarm_actions(stack_context, sid, actions)
+
+    def _dispatch_alarm_actions(self, cnxt, sid, actions, coalesce=True):
+        """
+        Schedule the alarm actions (names of resources whose alarm() is to
+        be called) of one stack in the stack's thread group. Unless
+        coalesce is False (e.g. for an explicit override of a watch's
+        state), an action on a resource which was already dispatched within
+        the last cfg.CONF.alarm_coalesce_window seconds is dropped, so that
+        several alarms firing on the same scaling policy only trigger it
+        once.
+        sid = stack ID
+        """
+        now = timeutils.utcnow()
+        window = datetime.timedelta(seconds=cfg.CONF.alarm_coalesce_window)
+        for key, dispatched in self._alarm_dispatched.items():
+            if dispatched + window <= now:
+                del self._alarm_dispatched[key]
+
+        names = []
+        for name in actions:
+            if name in names:
+                continue
+            if coalesce and (sid, name) in self._alarm_dispatched:
+                logger.info('Coalescing alarm action %s of stack %s' %
+                            (name, sid))
+                continue
+            self._alarm_dispatched[(sid, name)] = now
+            names.append(name)
+
+        if names:
+            self._start_in_thread(sid, self._run_alarm_actions,
+                                  cnxt, sid, names)
+
+    def _run_alarm_actions(self, cnxt, sid, names):
+        """
+        Run the alarm actions of the named resources of a stack, then
+        refresh the metadata of only those resources which reference the
+        resources changed by the actions: the action resources themselves
+        and the resources they act upon.
+        """
+        stack = parser.Stack.load(cnxt, stack_id=sid)
+        index = stack.t.references
+
+        changed = set()
+        for name in names:
+            if name not in stack:
+                logger.warning('Alarm action %s not found in stack %s' %
+                               (name, stack.name))
+                continue
+            stack[name].alarm()
+            changed.add(name)
+            if name in index.resources:
+                changed |= index.resources[name].resources()
+
+        dependents = index.dependents(changed)
+        for res in stack:
+            if res.name in dependents and res.id is not None:
+                res.metadata_update()
 
     @request_context
     def create_watch_data(self, cnxt, watch_name, stats_data):
         '''
         This could be used by CloudWatch and WaitConditions
         and treat HA service events like any other CloudWatch.
+        The data is buffered, and written to the database in bulk.
         '''
-        rule = watchrule.WatchRule.load(cnxt, watch_name)
-        rule.create_watch_data(stats_data)
+        watch = watchrule.lookup(cnxt, watch_name)
+        if watch.state == watchrule.WatchRule.SUSPENDED:
+            logger.debug('Ignoring metric data for %s, SUSPENDED state'
+                         % watch_name)
+            return
+
+        # Only the metric the alarm is on is stored, any other metrics
+        # pushed with it (e.g by cfn-push-stats --haproxy) are ignored
+        metric_name = watch.rule.get('MetricName')
+        sample = watchrule.metric_sample(watch.id, metric_name, stats_data)
+        if sample is None:
+            logger.debug('Ignoring metric data (only accept %s) : %s' %
+                         (metric_name, stats_data))
+            return
+
+        self.metric_samples.add(cnxt, sample)
         logger.debug('new watch:%s data:%s' % (watch_name, str(stats_data)))
-        return stats_data
+
+    @request_context
+    def create_watch_data_all(self, cnxt, watch_data):
+        '''
+        Buffer the metric data for several watches which was sent together,
+        e.g. in a single CloudWatch PutMetricData request. Data for watches
+        which do not exist, or which is invalid, is ignored.
+        arg1 -> RPC context.
+        arg2 -> List of (watch name, metric data) pairs
+        '''
+        for watch_name, stats_data in watch_data:
+            try:
+                self.create_watch_data(cnxt, watch_name, stats_data)
+            except exception.WatchRuleNotFound as ex:
+                logger.warning(str(ex))
+            except (TypeError, ValueError) as ex:
+                logger.warning('Ignoring invalid metric data for %s: %s' %
+                               (watch_name, str(ex)))
 
     @request_context
     def show_watch(self, cnxt, watch_name):
@@ -629,36 +832,34 @@ class EngineService(service.Service):
         arg2 -> Name of the watch you want to see, or None to see all
         '''
         if watch_name:
-            wrn = [watch_name]
+            wrs = [watchrule.lookup(cnxt, watch_name)]
         else:
             try:
-                wrn = [w.name for w in db_api.watch_rule_get_all(cnxt)]
+                wrs = watchrule.lookup_all(cnxt)
             except Exception as ex:
                 logger.warn('show_watch (all) db error %s' % str(ex))
                 return
 
-        wrs = [watchrule.WatchRule.load(cnxt, w) for w in wrn]
         result = [api.format_watch(w) for w in wrs]
         return result
 
     @request_context
-    def show_watch_metric(self, cnxt, metric_namespace=None, metric_name=None):
+    def show_watch_metric(self, cnxt, metric_namespace=None, metric_name=None,
+                          limit=None, marker=None):
         '''
         The show_watch method returns the datapoints for a metric
         arg1 -> RPC context.
         arg2 -> Name of the namespace you want to see, or None to see all
         arg3 -> Name of the metric you want to see, or None to see all
+        arg4 -> Maximum number of datapoints to return, or None for all
+        arg5 -> ID of the datapoint after which to start, or None
         '''
 
-        # DB API and schema does not yet allow us to easily query by
-        # namespace/metric, but we will want this at some point
-        # for now, the API can query all metric data and filter locally
-        if metric_namespace is not None or metric_name is not None:
-            logger.error("Filtering by namespace/metric not yet supported")
-            return
-
         try:
-            wds = db_api.watch_data_get_all(cnxt)
+            wds = db_api.metric_sample_get_all(cnxt,
+                                               namespace=metric_namespace,
+                                               metric_name=metric_name,
+                                               limit=limit, marker=marker)
         except Exception as ex:
             logger.warn('show_metric (all) db error %s' % str(ex))
             return
@@ -666,6 +867,32 @@ class EngineService(service.Service):
         result = [api.format_watch_data(w) for w in wds]
         return result
 
+    @request_context
+    def show_watch_metric_statistics(self, cnxt, metric_namespace,
+                                     metric_name, start_time, end_time,
+                                     period, statistics, unit=None):
+        '''
+        The show_watch_metric_statistics method returns statistics of a
+        metric for each period between two times
+        arg1 -> RPC context.
+        arg2 -> Namespace of the metric
+        arg3 -> Name of the metric
+        arg4 -> Start of the first period (ISO 8601 format)
+        arg5 -> End of the time range (ISO 8601 format)
+        arg6 -> Length of each period in seconds
+        arg7 -> List of statistics to calculate, from
+                rpc_api.METRIC_STATISTICS_TYPES
+        arg8 -> Unit of the samples to include, or None for all
+        '''
+        start = timeutils.normalize_time(timeutils.parse_isotime(start_time))
+        end = timeutils.normalize_time(timeutils.parse_isotime(end_time))
+
+        periods = watchrule.metric_statistics(cnxt, metric_namespace,
+                                              metric_name, start, end,
+                                              int(period), unit)
+        return [api.format_metric_statistics(*(p + (statistics,)))
+                for p in periods]
+
     @request_context
     def set_watch_state(self, cnxt, watch_name, state):
         '''
@@ -674,10 +901,11 @@ class EngineService(service.Service):
         arg2 -> Name of the watch
         arg3 -> State (must be one defined in WatchRule class
         '''
-        wr = watchrule.WatchRule.load(cnxt, watch_name)
+        wr = watchrule.WatchRule.load(cnxt,
+                                      watch=watchrule.lookup(cnxt, watch_name))
         actions = wr.set_watch_state(state)
-        for action in actions:
-            self._start_in_thread(wr.stack_id, action)
+        self._dispatch_alarm_actions(cnxt, wr.stack_id, actions,
+                                     coalesce=False)
 
         # Return the watch with the state overriden to indicate success
         # We do not update the timestamps as we are not modifying the DB
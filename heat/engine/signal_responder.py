@@ -16,6 +16,7 @@
 import urllib
 import urlparse
 
+import eventlet
 from oslo.config import cfg
 
 from keystoneclient.contrib.ec2 import utils as ec2_utils
@@ -35,22 +36,81 @@ SIGNAL_TYPES = (
 
 class SignalResponder(resource.Resource):
 
-    def handle_create(self):
-        # Create a keystone user so we can create a signed URL via FnGetRefId
+    # The thread creating the user, while the create is in progress
+    _creator = None
+    # The ID of the user, as soon as it has been created by the thread
+    _created_user_id = None
+
+    def _create_user(self):
         user_id = self.keystone().create_stack_user(
             self.physical_resource_name())
+        # Remember the user straight away, so that it is deleted even if the
+        # create is abandoned before check_create_complete() records it.
+        self._created_user_id = user_id
         kp = self.keystone().get_ec2_keypair(user_id)
         if not kp:
             raise exception.Error("Error creating ec2 keypair for user %s" %
                                   user_id)
-        else:
-            self.resource_id_set(user_id)
+        return user_id, kp
+
+    def _record_user(self):
+        if self.resource_id is None and self._created_user_id is not None:
+            self.resource_id_set(self._created_user_id)
+
+    def _finish_create(self):
+        '''
+        Wait for a user creation that was abandoned before it completed (e.g.
+        because the create timed out or was cancelled) and record the user it
+        created, so that the user can be deleted.
+        '''
+        creator, self._creator = self._creator, None
+        if creator is not None:
+            try:
+                creator.wait()
+            except Exception:
+                LOG.exception('Error creating user for %s' % str(self))
+        self._record_user()
+
+    def handle_create(self):
+        # Create a keystone user so we can create a signed URL via FnGetRefId.
+        # The Keystone calls are made in a separate thread, so that those of
+        # the other resources being created alongside this one are made
+        # concurrently.
+        self._creator = eventlet.spawn(self._create_user)
+        return self._creator
+
+    def check_create_complete(self, creator):
+        try:
+            user_id, kp = creator.wait()
+        finally:
+            self._creator = None
+            self._record_user()
+        self._store_credentials(kp.access, kp.secret)
+        return True
 
     def handle_delete(self):
+        self._finish_create()
         if self.resource_id is None:
             return
         self.keystone().delete_stack_user(self.resource_id)
 
+    def _store_credentials(self, access, secret):
+        self._data_set('access_key', access, redact=True)
+        self._data_set('secret_key', secret, redact=True)
+
+    def _credentials(self):
+        '''
+        Return the access and secret keys of the user's ec2 keypair, which
+        are fetched from Keystone only if they were not stored on creation.
+        '''
+        access = self._data_get('access_key')
+        secret = self._data_get('secret_key')
+        if access is None or secret is None:
+            kp = self.keystone().get_ec2_keypair(self.resource_id)
+            access, secret = kp.access, kp.secret
+            self._store_credentials(access, secret)
+        return access, secret
+
     def _get_signed_url(self, signal_type=SIGNAL):
         """Create properly formatted and pre-signed URL.
 
@@ -60,14 +120,22 @@ class SignalResponder(resource.Resource):
         restarter-signature.html
         Also see boto/auth.py::QuerySignatureV2AuthHandler
 
+        The URL is stored with the resource the first time it is created,
+        since it does not change for the lifetime of the resource.
+
         :param signal_type: either WAITCONDITION or SIGNAL.
         """
+        url_key = '%s_signed_url' % signal_type.lstrip('/')
+        stored_url = self._data_get(url_key)
+        if stored_url is not None:
+            return stored_url
+
         waitcond_url = cfg.CONF.heat_waitcondition_server_url
         signal_url = waitcond_url.replace('/waitcondition', signal_type)
         host_url = urlparse.urlparse(signal_url)
 
         path = self.identifier().arn_url_path()
-        credentials = self.keystone().get_ec2_keypair(self.resource_id)
+        access, secret = self._credentials()
 
         # Note the WSGI spec apparently means that the webob request we end up
         # prcessing in the CFN API (ec2token.py) has an unquoted path, so we
@@ -79,15 +147,16 @@ class SignalResponder(resource.Resource):
                    'path': unquoted_path,
                    'params': {'SignatureMethod': 'HmacSHA256',
                               'SignatureVersion': '2',
-                              'AWSAccessKeyId': credentials.access,
+                              'AWSAccessKeyId': access,
                               'Timestamp':
                               self.created_time.strftime("%Y-%m-%dT%H:%M:%SZ")
                               }}
         # Sign the requested
-        signer = ec2_utils.Ec2Signer(credentials.secret)
+        signer = ec2_utils.Ec2Signer(secret)
         request['params']['Signature'] = signer.generate(request)
 
         qs = urllib.urlencode(request['params'])
         url = "%s%s?%s" % (signal_url.lower(),
                            path, qs)
+        self._data_set(url_key, url, redact=True)
         return url
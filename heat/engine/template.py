@@ -18,6 +18,7 @@ import json
 
 from heat.db import api as db_api
 from heat.common import exception
+from heat.engine import references
 
 
 SECTIONS = (VERSION, DESCRIPTION, MAPPINGS,
@@ -49,6 +50,7 @@ class Template(collections.Mapping):
         self.t = template
         self.files = files or {}
         self.maps = self[MAPPINGS]
+        self._references = None
 
     @classmethod
     def load(cls, context, template_id):
@@ -86,6 +88,41 @@ class Template(collections.Mapping):
         '''Return the number of sections.'''
         return len(SECTIONS)
 
+    @property
+    def references(self):
+        '''
+        Return the ReferenceIndex of the resources and attributes referenced
+        by each resource and output in the template, building it on first
+        access.
+        '''
+        if self._references is None:
+            self._references = references.ReferenceIndex(
+                self.parse_reference, self[RESOURCES], self[OUTPUTS])
+        return self._references
+
+    def parse_reference(self, key, value):
+        '''
+        If a key-value pair in the template is a reference to a resource,
+        return a tuple of the resource name and the referenced attribute
+        (None for plain references). Otherwise return None.
+        '''
+        if key == 'Ref':
+            # deferred import to avoid circular dependency at load time
+            from heat.engine import parameters
+            if isinstance(value, basestring) and (
+                    value in self[PARAMETERS] or
+                    value in parameters.PSEUDO_PARAMETERS):
+                return None
+            return value, None
+        if key == references.DEPENDS_ON:
+            return value, None
+        if key == 'Fn::GetAtt':
+            if isinstance(value, list) and len(value) == 2:
+                resource, att = value
+                return resource, att
+            return None
+        return None
+
     def resolve_find_in_map(self, s):
         '''
         Resolve constructs of the form { "Fn::FindInMap" : [ "mapping",
@@ -19,16 +19,25 @@ from heat.common import exception
 class Timestamp(object):
     '''
     A descriptor for writing a timestamp to the database.
+
+    The value is cached on the object, so that it is only fetched from the
+    database if it was not already loaded together with the object's row
+    (see load()).
     '''
 
-    def __init__(self, db_fetch, attribute):
+    def __init__(self, db_fetch, attribute, db_update=None):
         '''
         Initialise with a function to fetch the database representation of an
         object (given a context and ID) and the name of the attribute to
-        retrieve.
+        retrieve. An optional function to update the attribute in the
+        database (given a context, ID and dict of values) may also be
+        supplied, which allows the timestamp to be written without first
+        fetching the row.
         '''
         self.db_fetch = db_fetch
         self.attribute = attribute
+        self.db_update = db_update
+        self.cache_key = '_timestamp_%s' % attribute
 
     def __get__(self, obj, obj_class):
         '''
@@ -37,12 +46,50 @@ class Timestamp(object):
         if obj is None or obj.id is None:
             return None
 
-        o = self.db_fetch(obj.context, obj.id)
-        return getattr(o, self.attribute)
+        try:
+            return obj.__dict__[self.cache_key]
+        except KeyError:
+            o = self.db_fetch(obj.context, obj.id)
+            return self.cache(obj, getattr(o, self.attribute))
 
     def __set__(self, obj, timestamp):
         '''Update the timestamp for the given object.'''
         if obj.id is None:
             raise exception.ResourceNotAvailable(resource_name=obj.name)
-        o = self.db_fetch(obj.context, obj.id)
-        o.update_and_save({self.attribute: timestamp})
+        if self.db_update is not None:
+            self.db_update(obj.context, obj.id, {self.attribute: timestamp})
+        else:
+            o = self.db_fetch(obj.context, obj.id)
+            o.update_and_save({self.attribute: timestamp})
+        self.cache(obj, timestamp)
+
+    def cache(self, obj, timestamp):
+        '''Cache a timestamp value for the given object.'''
+        obj.__dict__[self.cache_key] = timestamp
+        return timestamp
+
+
+def _timestamps(obj):
+    for cls in type(obj).__mro__:
+        for attr in vars(cls).values():
+            if isinstance(attr, Timestamp):
+                yield attr
+
+
+def load(obj, db_obj):
+    '''
+    Cache all of the timestamps of an object from its database
+    representation. This should be called whenever the row has been fetched
+    or written, since writing the row may change its timestamps.
+    '''
+    for ts in _timestamps(obj):
+        ts.cache(obj, getattr(db_obj, ts.attribute))
+
+
+def expire(obj):
+    '''
+    Discard the cached timestamps of an object, so that they will be fetched
+    from the database on next access.
+    '''
+    for ts in _timestamps(obj):
+        obj.__dict__.pop(ts.cache_key, None)
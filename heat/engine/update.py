@@ -103,5 +103,8 @@ class StackUpdate(object):
             except resource.UpdateReplace:
                 yield self._replace_resource(new_res)
             else:
+                # The updated resource now references whatever its new
+                # definition references
+                self.existing_stack[res_name].references = new_res.references
                 logger.info("Resource %s for stack %s updated" %
                             (res_name, self.existing_stack.name))
@@ -0,0 +1,139 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from heat.db import api as db_api
+from heat.engine import watchrule
+from heat.openstack.common import log as logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+    logger.info('numpy not available')
+
+
+WatchRule = watchrule.WatchRule
+
+STATISTICS = WatchRule.AGGREGATE_STATISTICS + WatchRule.PERCENTILE_STATISTICS
+
+COMPARISONS = ('GreaterThanThreshold', 'GreaterThanOrEqualToThreshold',
+               'LessThanThreshold', 'LessThanOrEqualToThreshold')
+
+
+def available():
+    '''Return True if watch rules can be evaluated in bulk.'''
+    return numpy is not None
+
+
+def _percentiles(keys, values, counts, pcts):
+    '''
+    Return, for each rule, the pcts percentile of its values, interpolated
+    as by watchrule.percentile(). Rules without values get NaN.
+    '''
+    result = numpy.empty(len(counts))
+    result.fill(numpy.nan)
+    if not len(values):
+        return result
+
+    # Sort by rule, then by value, so that each rule's values are contiguous
+    ordered = values[numpy.lexsort((values, keys))]
+    starts = numpy.cumsum(counts) - counts
+    pos = pcts / 100.0 * numpy.maximum(counts - 1, 0)
+    lower = numpy.floor(pos)
+    upper = numpy.ceil(pos)
+
+    has_data = counts > 0
+    last = len(ordered) - 1
+    lo = ordered[numpy.minimum(starts + lower.astype(int), last)]
+    hi = ordered[numpy.minimum(starts + upper.astype(int), last)]
+    result[has_data] = (lo + (hi - lo) * (pos - lower))[has_data]
+    return result
+
+
+def alarm_states(context, watches, now):
+    '''
+    Calculate the alarm states of a batch of watch rules (DB objects or
+    WatchRules) at the given time, loading the samples of all of them in a
+    single query and working out each statistic for all the rules at once.
+    Return a dict mapping each rule ID to its state. The result matches
+    WatchRule.get_alarm_state(), since the samples counted are those in the
+    same evaluation window (see watchrule.window_start()); rules with an
+    unknown statistic are left out.
+    '''
+    watches = [w for w in watches
+               if w.id is not None and w.rule.get('Statistic') in STATISTICS]
+    if numpy is None or not watches:
+        return {}
+
+    index = dict((w.id, k) for k, w in enumerate(watches))
+    statistic = numpy.array([w.rule['Statistic'] for w in watches])
+    operator = numpy.array([w.rule['ComparisonOperator'] for w in watches])
+    threshold = numpy.array([float(w.rule['Threshold']) for w in watches])
+    pcts = numpy.array([float(s[1:]) if s in WatchRule.PERCENTILE_STATISTICS
+                        else 0.0 for s in statistic])
+    starts = [watchrule.window_start(now, float(w.rule['Period']))
+              for w in watches]
+
+    rows = db_api.metric_sample_get_values(context, list(index), min(starts))
+
+    keys = numpy.array([index[r[0]] for r in rows], dtype=int)
+    values = numpy.array([r[2] for r in rows], dtype=float)
+
+    # Keep the samples in each rule's own window
+    in_window = numpy.array([r[1] >= starts[index[r[0]]] for r in rows],
+                            dtype=bool)
+    keep = ~numpy.isnan(values) & in_window
+    keys = keys[keep]
+    values = values[keep]
+
+    n = len(watches)
+    counts = numpy.bincount(keys, minlength=n)
+    sums = numpy.bincount(keys, weights=values, minlength=n)
+    minimums = numpy.empty(n)
+    minimums.fill(numpy.inf)
+    numpy.minimum.at(minimums, keys, values)
+    maximums = numpy.empty(n)
+    maximums.fill(-numpy.inf)
+    numpy.maximum.at(maximums, keys, values)
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        data = numpy.select(
+            [statistic == 'SampleCount', statistic == 'Sum',
+             statistic == 'Average', statistic == 'Minimum',
+             statistic == 'Maximum'],
+            [counts, sums, sums / counts, minimums, maximums],
+            default=_percentiles(keys, values, counts, pcts))
+
+        alarm = numpy.select(
+            [operator == op for op in COMPARISONS],
+            [data > threshold, data >= threshold,
+             data < threshold, data <= threshold],
+            default=False)
+
+    nodata = (counts == 0) & (statistic != 'SampleCount') & \
+        (statistic != 'Sum')
+
+    states = {}
+    for w in watches:
+        k = index[w.id]
+        if nodata[k]:
+            states[w.id] = WatchRule.NODATA
+        elif alarm[k]:
+            states[w.id] = WatchRule.ALARM
+        else:
+            states[w.id] = WatchRule.NORMAL
+    return states
@@ -14,7 +14,9 @@
 #    under the License.
 
 
+import collections
 import datetime
+import math
 from heat.common import exception
 from heat.openstack.common import log as logging
 from heat.openstack.common import timeutils
@@ -25,6 +27,171 @@ from heat.rpc import api as rpc_api
 
 logger = logging.getLogger(__name__)
 
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+BUCKETS_PER_PERIOD = 60
+
+
+def _microseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+
+
+def _span(period):
+    '''Return a period in seconds as a whole number of microseconds.'''
+    return int(round(float(period) * 10 ** 6))
+
+
+def _slot(when, span, buckets):
+    '''
+    Return the index, counted from the epoch, of the bucket of span/buckets
+    microseconds containing the given time.
+    '''
+    return _microseconds(when - _EPOCH) * buckets // span
+
+
+def window_start(now, period, buckets=BUCKETS_PER_PERIOD):
+    '''
+    Return the start of the evaluation window of the given period (in
+    seconds) ending at the given time. The window is made up of whole
+    buckets of period/buckets, the latest of them containing the given time,
+    so it starts up to one bucket later than period seconds ago. The
+    samples taken at or after this time are the ones in the window, however
+    a rule is evaluated.
+    '''
+    span = _span(period)
+    oldest = _slot(now, span, buckets) - buckets + 1
+    # The first microsecond in the oldest bucket
+    start = -(-oldest * span // buckets)
+    return _EPOCH + datetime.timedelta(microseconds=start)
+
+
+class Aggregates(object):
+    '''
+    The count, sum, minimum and maximum of the samples of a metric, kept up
+    to date as samples arrive in a ring of buckets which together cover one
+    evaluation period. Statistics for the window ending at a given time
+    (see window_start()) are calculated from the buckets alone.
+
+    The aggregates only see the samples stored by this engine, so they also
+    record a high-water mark: the ID of the latest sample stored in the
+    database when they were last known to be complete, and the number of
+    samples added since. They are complete as long as the database has no
+    other samples for the metric after the mark.
+    '''
+
+    BUCKETS_PER_PERIOD = BUCKETS_PER_PERIOD
+
+    def __init__(self, period, buckets=BUCKETS_PER_PERIOD):
+        self._span = _span(period)
+        self._ring = [None] * buckets
+        self.marker = None
+        self.added = 0
+
+    def _slot(self, when):
+        return _slot(when, self._span, len(self._ring))
+
+    def add(self, when, value):
+        '''Add a sample taken at the given time.'''
+        self.added += 1
+        slot = self._slot(when)
+        index = slot % len(self._ring)
+        bucket = self._ring[index]
+        if bucket is None or bucket[0] < slot:
+            self._ring[index] = [slot, 1, value, value, value]
+        elif bucket[0] == slot:
+            bucket[1] += 1
+            bucket[2] += value
+            bucket[3] = min(bucket[3], value)
+            bucket[4] = max(bucket[4], value)
+        # otherwise the sample is too old to be in any period kept
+
+    def statistics(self, now):
+        '''
+        Return a (count, sum, minimum, maximum) tuple for the samples in the
+        window ending at the given time. The minimum and maximum are None if
+        there are no samples.
+        '''
+        oldest = self._slot(now) - len(self._ring)
+        count, total, minimum, maximum = 0, 0, None, None
+        for bucket in self._ring:
+            if bucket is None or bucket[0] <= oldest:
+                continue
+            count += bucket[1]
+            total += bucket[2]
+            if minimum is None or bucket[3] < minimum:
+                minimum = bucket[3]
+            if maximum is None or bucket[4] > maximum:
+                maximum = bucket[4]
+        return count, total, minimum, maximum
+
+
+def percentile(values, pct):
+    '''
+    Return the pct percentile of a sorted, non-empty list of values,
+    interpolating linearly between the nearest two.
+    '''
+    pos = pct / 100.0 * (len(values) - 1)
+    lower = int(math.floor(pos))
+    upper = int(math.ceil(pos))
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+# Aggregates for each watch rule evaluated by this engine, keyed by rule ID
+_aggregates = {}
+
+# The metadata (but not the samples) of each watch rule known to this
+# engine, keyed by rule name
+_watches = {}
+
+
+class WatchInfo(collections.namedtuple('WatchInfo',
+                                       'id name rule state stack_id '
+                                       'last_evaluated created_at '
+                                       'updated_at')):
+    '''
+    The cached metadata of a watch rule. This can be formatted with
+    api.format_watch() or passed to WatchRule.load() in place of a DB object.
+    '''
+
+    @classmethod
+    def of(cls, watch):
+        '''Return the metadata of a watch rule (a DB object or WatchRule).'''
+        return cls(watch.id, watch.name, watch.rule, watch.state,
+                   watch.stack_id, watch.last_evaluated, watch.created_at,
+                   watch.updated_at)
+
+    def version(self):
+        '''
+        Return the fields compared with the database to tell whether the
+        cached metadata is still current.
+        '''
+        return (self.id, self.state, self.updated_at, self.last_evaluated)
+
+
+def _cache_watch(watch):
+    '''Cache and return the metadata of a watch rule.'''
+    info = WatchInfo.of(watch)
+    _watches[info.name] = info
+    return info
+
+
+def invalidate(watch_name):
+    '''
+    Forget the cached metadata of the named watch rule, e.g. after writing
+    the rule other than with WatchRule.store().
+    '''
+    _watches.pop(watch_name, None)
+
+
+def _aggregate_sample(watch, created_at, value):
+    '''
+    Add a newly stored sample to the Aggregates of its watch rule (a DB
+    object or WatchRule), if this engine has them.
+    '''
+    entry = _aggregates.get(watch.id)
+    if entry is not None and entry[:2] == (watch.created_at, watch.rule):
+        entry[2].add(created_at, value)
+
 
 class WatchRule(object):
     WATCH_STATES = (
@@ -42,11 +209,16 @@ class WatchRule(object):
                   NORMAL: 'OKActions',
                   NODATA: 'InsufficientDataActions'}
 
+    AGGREGATE_STATISTICS = ('SampleCount', 'Sum', 'Average', 'Minimum',
+                            'Maximum')
+
+    PERCENTILE_STATISTICS = ('p50', 'p90', 'p99')
+
     created_at = timestamp.Timestamp(db_api.watch_rule_get, 'created_at')
     updated_at = timestamp.Timestamp(db_api.watch_rule_get, 'updated_at')
 
     def __init__(self, context, watch_name, rule, stack_id=None,
-                 state=NODATA, wid=None, watch_data=[],
+                 state=NODATA, wid=None, watch_data=None,
                  last_evaluated=timeutils.utcnow()):
         self.context = context
         self.now = timeutils.utcnow()
@@ -73,14 +245,15 @@ class WatchRule(object):
         if watch is None:
             raise exception.WatchRuleNotFound(watch_name=watch_name)
         else:
-            return cls(context=context,
-                       watch_name=watch.name,
-                       rule=watch.rule,
-                       stack_id=watch.stack_id,
-                       state=watch.state,
-                       wid=watch.id,
-                       watch_data=watch.watch_data,
-                       last_evaluated=watch.last_evaluated)
+            wr = cls(context=context,
+                     watch_name=watch.name,
+                     rule=watch.rule,
+                     stack_id=watch.stack_id,
+                     state=watch.state,
+                     wid=watch.id,
+                     last_evaluated=watch.last_evaluated)
+            timestamp.load(wr, watch)
+            return wr
 
     def store(self):
         '''
@@ -99,7 +272,9 @@ class WatchRule(object):
             wr = db_api.watch_rule_create(self.context, wr_values)
             self.id = wr.id
         else:
-            db_api.watch_rule_update(self.context, self.id, wr_values)
+            wr = db_api.watch_rule_update(self.context, self.id, wr_values)
+        timestamp.load(self, wr)
+        _cache_watch(wr)
 
     def destroy(self):
         '''
@@ -107,6 +282,8 @@ class WatchRule(object):
         '''
         if self.id:
             db_api.watch_rule_delete(self.context, self.id)
+            _aggregates.pop(self.id, None)
+            invalidate(self.name)
 
     def do_data_cmp(self, data, threshold):
         op = self.rule['ComparisonOperator']
@@ -121,20 +298,57 @@ class WatchRule(object):
         else:
             return False
 
-    def do_Maximum(self):
-        data = 0
-        have_data = False
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                continue
-            if not have_data:
-                data = float(d.data[self.rule['MetricName']]['Value'])
-                have_data = True
-            if float(d.data[self.rule['MetricName']]['Value']) > data:
-                data = float(d.data[self.rule['MetricName']]['Value'])
+    def _window_start(self):
+        return window_start(self.now, self.timeperiod.total_seconds())
 
-        if not have_data:
+    def _window_data(self):
+        '''
+        Return the samples within the evaluation window. Unless samples were
+        supplied explicitly, only the samples in the window are retrieved
+        from the database.
+        '''
+        start_time = self._window_start()
+        if self.watch_data is None:
+            if self.id is None:
+                return []
+            return db_api.metric_sample_get_all_by_watch_rule_id(self.context,
+                                                                 self.id,
+                                                                 start_time)
+        return [d for d in self.watch_data if d.created_at >= start_time]
+
+    def _statistics(self):
+        '''
+        Return a (count, sum, minimum, maximum) tuple for the samples within
+        the evaluation window, calculated by the database unless samples
+        were supplied explicitly.
+        '''
+        if self.watch_data is None:
+            if self.id is None:
+                return 0, 0, None, None
+            return db_api.metric_sample_aggregate_by_watch_rule_id(
+                self.context, self.id, self._window_start())
+
+        values = [d.value for d in self._window_data()]
+        if not values:
+            return 0, 0, None, None
+        return len(values), sum(values), min(values), max(values)
+
+    def _alarm_state(self, statistics):
+        count, total, minimum, maximum = statistics
+
+        statistic = self.rule['Statistic']
+        if statistic == 'SampleCount':
+            data = count
+        elif statistic == 'Sum':
+            data = total
+        elif not count:
             return self.NODATA
+        elif statistic == 'Average':
+            data = float(total) / count
+        elif statistic == 'Minimum':
+            data = minimum
+        else:
+            data = maximum
 
         if self.do_data_cmp(data,
                             float(self.rule['Threshold'])):
@@ -142,91 +356,117 @@ class WatchRule(object):
         else:
             return self.NORMAL
 
-    def do_Minimum(self):
-        data = 0
-        have_data = False
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                continue
-            if not have_data:
-                data = float(d.data[self.rule['MetricName']]['Value'])
-                have_data = True
-            elif float(d.data[self.rule['MetricName']]['Value']) < data:
-                data = float(d.data[self.rule['MetricName']]['Value'])
-
-        if not have_data:
-            return self.NODATA
+    def do_Maximum(self):
+        return self._alarm_state(self._statistics())
 
-        if self.do_data_cmp(data,
-                            float(self.rule['Threshold'])):
-            return self.ALARM
-        else:
-            return self.NORMAL
+    def do_Minimum(self):
+        return self._alarm_state(self._statistics())
 
     def do_SampleCount(self):
         '''
         count all samples within the specified period
         '''
-        data = 0
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                continue
-            data = data + 1
-
-        if self.do_data_cmp(data,
-                            float(self.rule['Threshold'])):
-            return self.ALARM
-        else:
-            return self.NORMAL
+        return self._alarm_state(self._statistics())
 
     def do_Average(self):
-        data = 0
-        samples = 0
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                continue
-            samples = samples + 1
-            data = data + float(d.data[self.rule['MetricName']]['Value'])
+        return self._alarm_state(self._statistics())
 
-        if samples == 0:
+    def do_Sum(self):
+        return self._alarm_state(self._statistics())
+
+    def do_percentile(self):
+        '''
+        Compare a percentile (e.g. p90) of the samples in the period, as
+        interpolated linearly between the nearest samples, to the threshold
+        '''
+        values = sorted(d.value for d in self._window_data()
+                        if d.value is not None)
+        if not values:
             return self.NODATA
+        data = percentile(values, float(self.rule['Statistic'][1:]))
 
-        data = data / samples
         if self.do_data_cmp(data,
                             float(self.rule['Threshold'])):
             return self.ALARM
         else:
             return self.NORMAL
 
-    def do_Sum(self):
-        data = 0
-        for d in self.watch_data:
-            if d.created_at < self.now - self.timeperiod:
-                logger.debug('ignoring %s' % str(d.data))
-                continue
-            data = data + float(d.data[self.rule['MetricName']]['Value'])
+    def _aggregates_complete(self, aggregates):
+        '''
+        Return True if no samples other than those added to the aggregates
+        have been stored since their high-water mark, moving the mark up to
+        the latest sample if so. Samples stored by other engines are only
+        seen here.
+        '''
+        count, last_id = db_api.metric_sample_count_after(self.context,
+                                                          self.id,
+                                                          aggregates.marker)
+        if count != aggregates.added:
+            return False
+        if last_id is not None:
+            aggregates.marker = last_id
+            aggregates.added = 0
+        return True
 
-        if self.do_data_cmp(data,
-                            float(self.rule['Threshold'])):
-            return self.ALARM
-        else:
-            return self.NORMAL
+    def aggregates(self):
+        '''
+        Return the rolling Aggregates for this rule, populating them from
+        the samples stored in the database if this engine does not already
+        have them or if samples have been stored that they are missing.
+        '''
+        entry = _aggregates.get(self.id)
+        if (entry is None or entry[:2] != (self.created_at, self.rule) or
+                not self._aggregates_complete(entry[2])):
+            aggregates = Aggregates(self.timeperiod.total_seconds())
+            marker = db_api.metric_sample_count_after(self.context,
+                                                      self.id)[1]
+            data = self._window_data()
+            for d in data:
+                aggregates.add(d.created_at, d.value)
+            aggregates.marker = marker
+            aggregates.added = len([d for d in data
+                                    if marker is None or d.id > marker])
+            entry = (self.created_at, self.rule, aggregates)
+            _aggregates[self.id] = entry
+        return entry[2]
+
+    def do_aggregates(self):
+        '''
+        Calculate the alarm state from the rolling aggregates, in O(buckets)
+        time rather than by reading every sample in the window.
+        '''
+        return self._alarm_state(self.aggregates().statistics(self.now))
 
     def get_alarm_state(self):
+        '''
+        Return the alarm state for the current period. Rules loaded from the
+        database are evaluated from their rolling aggregates; the do_<stat>
+        methods calculate the same state from the raw samples.
+        '''
+        if (self.watch_data is None and self.id is not None and
+                self.rule['Statistic'] in self.AGGREGATE_STATISTICS):
+            return self.do_aggregates()
+        if self.rule['Statistic'] in self.PERCENTILE_STATISTICS:
+            return self.do_percentile()
         fn = getattr(self, 'do_%s' % self.rule['Statistic'])
         return fn()
 
-    def evaluate(self):
+    def evaluate(self, new_state=None):
+        '''
+        Run the rule if it is due, returning the actions to take. The new
+        state may be supplied if it has already been calculated.
+        '''
         if self.state == self.SUSPENDED:
             return []
         # has enough time progressed to run the rule
         self.now = timeutils.utcnow()
         if self.now < (self.last_evaluated + self.timeperiod):
             return []
-        return self.run_rule()
+        return self.run_rule(new_state)
 
-    def run_rule(self):
-        new_state = self.get_alarm_state()
+    def run_rule(self, new_state=None):
+        if new_state is None:
+            new_state = self.get_alarm_state()
         actions = self.rule_actions(new_state)
         self.state = new_state
 
@@ -235,6 +475,11 @@ class WatchRule(object):
         return actions
 
     def rule_actions(self, new_state):
+        '''
+        Return the names of the stack resources whose alarm() should be
+        called for the new state. Only the stack's own record is checked
+        here; the stack itself is loaded when the actions are run.
+        '''
         logger.info('WATCH: stack:%s, watch_name:%s %s',
                     self.stack_id, self.name, new_state)
         actions = []
@@ -243,11 +488,9 @@ class WatchRule(object):
                         new_state)
         else:
             s = db_api.stack_get(self.context, self.stack_id)
-            stack = parser.Stack.load(self.context, stack=s)
-            if (stack.action != stack.DELETE
-                    and stack.status == stack.COMPLETE):
-                for a in self.rule[self.ACTION_MAP[new_state]]:
-                    actions.append(stack[a].alarm)
+            if (s is not None and s.action != parser.Stack.DELETE
+                    and s.status == parser.Stack.COMPLETE):
+                actions = list(self.rule[self.ACTION_MAP[new_state]])
             else:
                 logger.warning("Could not process watch state %s for stack" %
                                new_state)
@@ -269,12 +512,10 @@ class WatchRule(object):
                         (self.rule['MetricName'], data))
             return
 
-        watch_data = {
-            'data': data,
-            'watch_rule_id': self.id
-        }
-        wd = db_api.watch_data_create(None, watch_data)
-        logger.debug('new watch:%s data:%s' % (self.name, str(wd.data)))
+        sample = metric_sample(self.id, self.rule['MetricName'], data)
+        wd = db_api.metric_sample_create(None, sample)
+        logger.debug('new watch:%s data:%s' % (self.name, wd.value))
+        _aggregate_sample(self, wd.created_at, wd.value)
 
     def state_set(self, state):
         '''
@@ -288,8 +529,8 @@ class WatchRule(object):
 
     def set_watch_state(self, state):
         '''
-        Temporarily set the watch state, returns list of functions to be
-        scheduled in the stack ThreadGroup for the specified state
+        Temporarily set the watch state, returns the names of the resources
+        whose alarm actions should be run for the specified state
         '''
 
         if state not in self.WATCH_STATES:
@@ -305,3 +546,175 @@ class WatchRule(object):
                 logger.warning("Unable to override state %s for watch %s" %
                               (self.state, self.name))
         return actions
+
+
+def lookup(context, watch_name):
+    '''
+    Return the WatchInfo of the named watch rule. This is cached as rules
+    are stored and destroyed, so that metric data can be accepted and rules
+    shown without loading them. As other engines may have changed the rule,
+    the cached metadata is only used if a query of the rule's ID, state and
+    timestamps (but not the rule itself) still matches it.
+    '''
+    info = _watches.get(watch_name)
+    if info is not None:
+        version = db_api.watch_rule_get_version_by_name(context, watch_name)
+        if version != info.version():
+            invalidate(watch_name)
+            if version is None:
+                raise exception.WatchRuleNotFound(watch_name=watch_name)
+            info = None
+    if info is None:
+        watch = db_api.watch_rule_get_by_name(context, watch_name)
+        if watch is None:
+            raise exception.WatchRuleNotFound(watch_name=watch_name)
+        info = _cache_watch(watch)
+    return info
+
+
+def lookup_all(context):
+    '''
+    Return the WatchInfo of every watch rule, fetched in a single query and
+    used to refresh the cache.
+    '''
+    return [_cache_watch(w) for w in db_api.watch_rule_get_all(context)]
+
+
+def metric_sample(watch_id, metric_name, data):
+    '''
+    Return the values of a metric sample for a watch rule from metric data
+    of the form {"Namespace": ..., <MetricName>: {"Unit", "Value",
+    "Dimensions"}}, or None if the data does not contain the metric.
+    '''
+    if metric_name not in data:
+        return None
+    metric = data[metric_name]
+    return {
+        'namespace': data.get('Namespace'),
+        'metric_name': metric_name,
+        'value': float(metric['Value']),
+        'unit': metric.get('Unit'),
+        'dimensions': metric.get('Dimensions') or [],
+        'watch_rule_id': watch_id
+    }
+
+
+class MetricSampleBuffer(object):
+    '''
+    Metric samples waiting to be written to the database. The samples are
+    inserted in bulk when flush() is called, or as soon as max_samples of
+    them are waiting.
+    '''
+
+    def __init__(self, max_samples):
+        self.max_samples = max_samples
+        self._samples = []
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, context, sample):
+        '''Buffer a sample, timestamped with its time of arrival.'''
+        sample.setdefault('created_at', timeutils.utcnow())
+        self._samples.append(sample)
+        if len(self._samples) >= self.max_samples:
+            self.flush(context)
+
+    def flush(self, context):
+        '''
+        Write all of the buffered samples of rules which still exist and
+        are not suspended to the database, and return the number written.
+        '''
+        samples, self._samples = self._samples, []
+        if not samples:
+            return 0
+
+        watch_ids = set(s['watch_rule_id'] for s in samples)
+        watches = dict((w.id, w) for w in
+                       db_api.watch_rule_get_all_by_ids(context, watch_ids))
+
+        missing = watch_ids - set(watches)
+        if missing:
+            # Rules deleted behind our back; forget their names
+            for name, info in _watches.items():
+                if info.id in missing:
+                    invalidate(name)
+
+        samples = [s for s in samples if s['watch_rule_id'] in watches and
+                   watches[s['watch_rule_id']].state != WatchRule.SUSPENDED]
+        db_api.metric_sample_create_all(context, samples)
+        for s in samples:
+            _aggregate_sample(watches[s['watch_rule_id']],
+                              s['created_at'], s['value'])
+        logger.debug('Stored %d metric samples' % len(samples))
+        return len(samples)
+
+
+def metric_statistics(context, namespace, metric_name, start_time, end_time,
+                      period, unit=None):
+    '''
+    Divide the time from start_time to end_time into intervals of period
+    seconds and return the (start, unit, count, sum, minimum, maximum) of
+    the samples of a metric in each interval that has any, in time order.
+    The aggregates of samples which have been purged are included.
+    '''
+    buckets = {}
+
+    def add(when, unit, count, total, minimum, maximum):
+        index = int((when - start_time).total_seconds() // period)
+        bucket = buckets.get(index)
+        if bucket is None:
+            buckets[index] = [unit, count, total, minimum, maximum]
+        else:
+            bucket[1] += count
+            bucket[2] += total
+            bucket[3] = min(bucket[3], minimum)
+            bucket[4] = max(bucket[4], maximum)
+
+    for created_at, value, sample_unit in db_api.metric_sample_get_range(
+            context, namespace, metric_name, start_time, end_time, unit):
+        if value is not None:
+            add(created_at, sample_unit, 1, value, value, value)
+
+    for agg in db_api.metric_aggregate_get_range(
+            context, namespace, metric_name, start_time, end_time, unit):
+        add(agg.created_at, agg.unit, agg.sample_count, agg.sum,
+            agg.minimum, agg.maximum)
+
+    return [(start_time + datetime.timedelta(seconds=index * period),) +
+            tuple(bucket) for index, bucket in sorted(buckets.items())]
+
+
+ROLLUP_RESOLUTIONS = {'minute': 60, 'hour': 3600}
+
+
+def purge_metric_samples(context, grace_period, rollup=None, now=None):
+    '''
+    Delete the metric samples of every watch rule which are older than the
+    rule's evaluation periods plus a grace period (in seconds). If rollup is
+    "minute" or "hour", the samples are first rolled up into aggregates of
+    that resolution. Returns the number of samples deleted.
+    '''
+    resolution = None
+    if rollup:
+        if rollup not in ROLLUP_RESOLUTIONS:
+            raise ValueError('Invalid metric rollup %s' % rollup)
+        resolution = ROLLUP_RESOLUTIONS[rollup]
+
+    if now is None:
+        now = timeutils.utcnow()
+
+    deleted = 0
+    for wr in db_api.watch_rule_get_all(context):
+        try:
+            retention = (int(wr.rule['Period']) *
+                         int(wr.rule.get('EvaluationPeriods', 1)) +
+                         grace_period)
+        except (KeyError, TypeError, ValueError):
+            logger.warning('Not purging samples of watch %s: invalid rule' %
+                           wr.name)
+            continue
+        before = now - datetime.timedelta(seconds=retention)
+        deleted += db_api.metric_sample_purge(context, wr.id, before,
+                                              resolution)
+    return deleted
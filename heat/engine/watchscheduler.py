@@ -0,0 +1,72 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import heapq
+
+
+def due_time(rule, last_evaluated, now):
+    '''
+    Return the time at which a watch rule is next due for evaluation: one
+    Period after it was last evaluated, or one Period from now if that time
+    has already passed (or the rule has never been evaluated).
+    '''
+    period = datetime.timedelta(seconds=int(rule['Period']))
+    if last_evaluated is not None and last_evaluated + period > now:
+        return last_evaluated + period
+    return now + period
+
+
+class WatchScheduler(object):
+    '''
+    The watch rules of all stacks, kept in a min-heap ordered by the time at
+    which each rule is next due for evaluation, so that a single periodic
+    task need only look at the rules which are actually due.
+
+    Rescheduling or unscheduling a rule leaves its old heap entry in place;
+    stale entries are discarded when they reach the top of the heap.
+    '''
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, watch_id):
+        return watch_id in self._due
+
+    def schedule(self, watch_id, due):
+        '''Schedule (or reschedule) a watch rule to be evaluated at due.'''
+        self._due[watch_id] = due
+        heapq.heappush(self._heap, (due, watch_id))
+
+    def unschedule(self, watch_id):
+        '''Stop evaluating a watch rule.'''
+        self._due.pop(watch_id, None)
+
+    def pop_due(self, now):
+        '''
+        Remove all of the watch rules which are due at the given time from
+        the schedule and return their IDs, earliest first.
+        '''
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            due, watch_id = heapq.heappop(self._heap)
+            if self._due.get(watch_id) == due:
+                del self._due[watch_id]
+                due_ids.append(watch_id)
+        return due_ids
@@ -124,13 +124,27 @@ WATCH_STATES = (
 )
 
 WATCH_DATA_KEYS = (
-    WATCH_DATA_ALARM, WATCH_DATA_METRIC, WATCH_DATA_TIME,
+    WATCH_DATA_ID, WATCH_DATA_ALARM, WATCH_DATA_METRIC, WATCH_DATA_TIME,
     WATCH_DATA_NAMESPACE, WATCH_DATA
 ) = (
-    'watch_name', 'metric_name', 'timestamp',
+    'id', 'watch_name', 'metric_name', 'timestamp',
     'namespace', 'data'
 )
 
+METRIC_STATISTICS_KEYS = (
+    METRIC_STATISTICS_TIME, METRIC_STATISTICS_UNIT, METRIC_STATISTICS
+) = (
+    'timestamp', 'unit', 'statistics'
+)
+
+METRIC_STATISTICS_TYPES = (
+    STATISTIC_SAMPLE_COUNT, STATISTIC_AVERAGE, STATISTIC_SUM,
+    STATISTIC_MINIMUM, STATISTIC_MAXIMUM
+) = (
+    'SampleCount', 'Average', 'Sum',
+    'Minimum', 'Maximum'
+)
+
 VALIDATE_PARAM_KEYS = (
     PARAM_TYPE, PARAM_DEFAULT, PARAM_NO_ECHO,
     PARAM_ALLOWED_VALUES, PARAM_ALLOWED_PATTERN, PARAM_MAX_LENGTH,
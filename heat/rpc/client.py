@@ -238,10 +238,19 @@ class EngineClient(heat.openstack.common.rpc.proxy.RpcProxy):
         :param watch_name: Name of the watch/alarm
         :param stats_data: The data to post.
         '''
-        return self.call(ctxt, self.make_msg('create_watch_data',
+        return self.cast(ctxt, self.make_msg('create_watch_data',
                                              watch_name=watch_name,
                                              stats_data=stats_data))
 
+    def create_watch_data_all(self, ctxt, watch_data):
+        '''
+        Post the metric data for several watches/alarms in a single message.
+        :param ctxt: RPC context.
+        :param watch_data: List of (watch name, data to post) pairs.
+        '''
+        return self.cast(ctxt, self.make_msg('create_watch_data_all',
+                                             watch_data=watch_data))
+
     def show_watch(self, ctxt, watch_name):
         """
         The show_watch method returns the attributes of one watch
@@ -254,7 +263,8 @@ class EngineClient(heat.openstack.common.rpc.proxy.RpcProxy):
         return self.call(ctxt, self.make_msg('show_watch',
                                              watch_name=watch_name))
 
-    def show_watch_metric(self, ctxt, metric_namespace=None, metric_name=None):
+    def show_watch_metric(self, ctxt, metric_namespace=None, metric_name=None,
+                          limit=None, marker=None):
         """
         The show_watch_metric method returns the datapoints associated
         with a specified metric, or all metrics if no metric_name is passed
@@ -264,10 +274,38 @@ class EngineClient(heat.openstack.common.rpc.proxy.RpcProxy):
                            or None to see all
         :param metric_name: Name of the metric you want to see,
                            or None to see all
+        :param limit: Maximum number of datapoints to return, or None for all
+        :param marker: ID of the datapoint after which to start, or None
         """
         return self.call(ctxt, self.make_msg('show_watch_metric',
                                              metric_namespace=metric_namespace,
-                                             metric_name=metric_name))
+                                             metric_name=metric_name,
+                                             limit=limit, marker=marker))
+
+    def show_watch_metric_statistics(self, ctxt, metric_namespace,
+                                     metric_name, start_time, end_time,
+                                     period, statistics, unit=None):
+        """
+        The show_watch_metric_statistics method returns statistics of a
+        metric for each period between two times
+
+        :param ctxt: RPC context.
+        :param metric_namespace: Namespace of the metric
+        :param metric_name: Name of the metric
+        :param start_time: Start of the first period (ISO 8601 format)
+        :param end_time: End of the time range (ISO 8601 format)
+        :param period: Length of each period in seconds
+        :param statistics: List of statistics to calculate
+        :param unit: Unit of the samples to include, or None for all
+        """
+        return self.call(ctxt, self.make_msg('show_watch_metric_statistics',
+                                             metric_namespace=metric_namespace,
+                                             metric_name=metric_name,
+                                             start_time=start_time,
+                                             end_time=end_time,
+                                             period=period,
+                                             statistics=statistics,
+                                             unit=unit))
 
     def set_watch_state(self, ctxt, watch_name, state):
         '''
@@ -17,6 +17,9 @@ import fixtures
 import logging
 import mox
 import testtools
+import heat.engine.catalog as catalog
+import heat.engine.clients as clients
+import heat.engine.poller as poller
 import heat.engine.scheduler as scheduler
 
 
@@ -33,3 +36,7 @@ class HeatTestCase(testtools.TestCase):
             scheduler.ENABLE_SLEEP = True
 
         self.addCleanup(enable_sleep)
+        self.addCleanup(poller._pollers.clear)
+        self.addCleanup(catalog._catalogs.clear)
+        self.addCleanup(clients.pool.clear)
+        self.addCleanup(clients._rate_limiters.clear)
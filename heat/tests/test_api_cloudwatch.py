@@ -197,11 +197,136 @@ class WatchControllerTest(HeatTestCase):
         self.assert_(type(result) == exception.HeatAPINotImplementedError)
 
     def test_get_metric_statistics(self):
-        # Not yet implemented, should raise HeatAPINotImplementedError
-        params = {'Action': 'GetMetricStatistics'}
+        params = {'Action': 'GetMetricStatistics',
+                  'Namespace': 'system/linux',
+                  'MetricName': 'ServiceFailure',
+                  'StartTime': '2012-08-30T15:00:00Z',
+                  'EndTime': '2012-08-30T16:00:00Z',
+                  'Period': '600',
+                  'Statistics.member.1': 'Average',
+                  'Statistics.member.2': 'Maximum'}
+        dummy_req = self._dummy_GET_request(params)
+
+        engine_resp = [{u'timestamp': u'2012-08-30T15:10:00Z',
+                        u'unit': u'Count',
+                        u'statistics': {u'Average': 1.5,
+                                        u'Maximum': 2.0}}]
+
+        self.m.StubOutWithMock(rpc, 'call')
+        rpc.call(dummy_req.context, self.topic,
+                 {'args': {'metric_namespace': 'system/linux',
+                           'metric_name': 'ServiceFailure',
+                           'start_time': '2012-08-30T15:00:00Z',
+                           'end_time': '2012-08-30T16:00:00Z',
+                           'period': 600,
+                           'statistics': ['Average', 'Maximum'],
+                           'unit': None},
+                  'namespace': None,
+                  'method': 'show_watch_metric_statistics',
+                  'version': self.api_version},
+                 None).AndReturn(engine_resp)
+
+        self.m.ReplayAll()
+
+        response = self.controller.get_metric_statistics(dummy_req)
+        expected = {'GetMetricStatisticsResponse':
+                    {'GetMetricStatisticsResult':
+                     {'Label': 'ServiceFailure',
+                      'Datapoints': [{'Timestamp': u'2012-08-30T15:10:00Z',
+                                      'Unit': u'Count',
+                                      u'Average': 1.5,
+                                      u'Maximum': 2.0}]}}}
+        self.assertEqual(expected, response)
+        self.m.VerifyAll()
+
+    def test_get_metric_statistics_next_token(self):
+        params = {'Action': 'GetMetricStatistics',
+                  'Namespace': 'system/linux',
+                  'MetricName': 'ServiceFailure',
+                  'StartTime': '2012-08-01T00:00:00Z',
+                  'EndTime': '2012-08-03T00:00:00Z',
+                  'NextToken': '2012-08-01T12:00:00Z',
+                  'Period': '60',
+                  'Statistics.member.1': 'SampleCount'}
+        dummy_req = self._dummy_GET_request(params)
+
+        self.m.StubOutWithMock(rpc, 'call')
+        rpc.call(dummy_req.context, self.topic,
+                 {'args': {'metric_namespace': 'system/linux',
+                           'metric_name': 'ServiceFailure',
+                           'start_time': '2012-08-01T12:00:00Z',
+                           'end_time': '2012-08-02T12:00:00Z',
+                           'period': 60,
+                           'statistics': ['SampleCount'],
+                           'unit': None},
+                  'namespace': None,
+                  'method': 'show_watch_metric_statistics',
+                  'version': self.api_version},
+                 None).AndReturn([])
+
+        self.m.ReplayAll()
+
+        response = self.controller.get_metric_statistics(dummy_req)
+        result = response['GetMetricStatisticsResponse'][
+            'GetMetricStatisticsResult']
+        self.assertEqual([], result['Datapoints'])
+        self.assertEqual('2012-08-02T12:00:00Z', result['NextToken'])
+        self.m.VerifyAll()
+
+    def test_get_metric_statistics_invalid(self):
+        params = {'Action': 'GetMetricStatistics',
+                  'Namespace': 'system/linux',
+                  'MetricName': 'ServiceFailure',
+                  'StartTime': '2012-08-30T15:00:00Z',
+                  'EndTime': '2012-08-30T16:00:00Z',
+                  'Period': '600'}
+
         dummy_req = self._dummy_GET_request(params)
         result = self.controller.get_metric_statistics(dummy_req)
-        self.assert_(type(result) == exception.HeatAPINotImplementedError)
+        self.assertTrue(isinstance(result,
+                                   exception.HeatMissingParameterError))
+
+        for key, value in (('Statistics.member.1', 'Median'),
+                           ('Period', '0'),
+                           ('StartTime', 'yesterday')):
+            bad = dict(params)
+            bad['Statistics.member.1'] = 'Sum'
+            bad[key] = value
+            dummy_req = self._dummy_GET_request(bad)
+            result = self.controller.get_metric_statistics(dummy_req)
+            self.assertTrue(isinstance(
+                result, exception.HeatInvalidParameterValueError))
+
+    def test_list_metrics_next_token(self):
+        params = {'Action': 'ListMetrics',
+                  'NextToken': '42'}
+        dummy_req = self._dummy_GET_request(params)
+
+        engine_resp = [{u'id': 43 + i,
+                        u'timestamp': u'2012-08-30T15:09:02Z',
+                        u'watch_name': u'HttpFailureAlarm',
+                        u'namespace': u'system/linux',
+                        u'metric_name': u'ServiceFailure',
+                        u'data': {u'Units': u'Counter', u'Value': 1}}
+                       for i in range(2)]
+
+        self.m.StubOutWithMock(rpc, 'call')
+        rpc.call(dummy_req.context, self.topic,
+                 {'args': {'metric_namespace': None, 'metric_name': None,
+                           'limit': 2, 'marker': 42},
+                  'namespace': None,
+                  'method': 'show_watch_metric',
+                  'version': self.api_version},
+                 None).AndReturn(engine_resp)
+
+        self.m.ReplayAll()
+
+        self.controller.MAX_METRICS = 2
+        response = self.controller.list_metrics(dummy_req)
+        result = response['ListMetricsResponse']['ListMetricsResult']
+        self.assertEqual(2, len(result['Metrics']))
+        self.assertEqual('44', result['NextToken'])
+        self.m.VerifyAll()
 
     def test_list_metrics_all(self):
         params = {'Action': 'ListMetrics'}
@@ -229,12 +354,10 @@ class WatchControllerTest(HeatTestCase):
                         u'data': {u'Units': u'Counter', u'Value': 1}}]
 
         self.m.StubOutWithMock(rpc, 'call')
-        # Current engine implementation means we filter in the API
-        # and pass None/None for namespace/watch_name which returns
-        # all metric data which we post-process in the API
         rpc.call(dummy_req.context, self.topic,
                  {'namespace': None,
-                  'args': {'metric_namespace': None, 'metric_name': None},
+                  'args': {'metric_namespace': None, 'metric_name': None,
+                           'limit': 500, 'marker': None},
                   'method': 'show_watch_metric',
                   'version': self.api_version},
                  None).AndReturn(engine_resp)
@@ -288,33 +411,18 @@ class WatchControllerTest(HeatTestCase):
         dummy_req = self._dummy_GET_request(params)
 
         # Stub out the RPC call to the engine with a pre-canned response
-        # We dummy three different metrics and namespaces to test
-        # filtering by parameter
+        # The engine does the filtering by metric name
         engine_resp = [{u'timestamp': u'2012-08-30T15:09:02Z',
                         u'watch_name': u'HttpFailureAlarm',
                         u'namespace': u'system/linux',
                         u'metric_name': u'ServiceFailure',
-                        u'data': {u'Units': u'Counter', u'Value': 1}},
-
-                       {u'timestamp': u'2012-08-30T15:10:03Z',
-                        u'watch_name': u'HttpFailureAlarm2',
-                        u'namespace': u'system/linux2',
-                        u'metric_name': u'ServiceFailure2',
-                        u'data': {u'Units': u'Counter', u'Value': 1}},
-
-                       {u'timestamp': u'2012-08-30T15:16:03Z',
-                        u'watch_name': u'HttpFailureAlar3m',
-                        u'namespace': u'system/linux3',
-                        u'metric_name': u'ServiceFailure3',
                         u'data': {u'Units': u'Counter', u'Value': 1}}]
 
         self.m.StubOutWithMock(rpc, 'call')
-        # Current engine implementation means we filter in the API
-        # and pass None/None for namespace/watch_name which returns
-        # all metric data which we post-process in the API
         rpc.call(dummy_req.context, self.topic, {'args':
                  {'metric_namespace': None,
-                  'metric_name': None},
+                  'metric_name': 'ServiceFailure',
+                  'limit': 500, 'marker': None},
                  'namespace': None,
                  'method': 'show_watch_metric',
                  'version': self.api_version},
@@ -322,7 +430,6 @@ class WatchControllerTest(HeatTestCase):
 
         self.m.ReplayAll()
 
-        # First pass no query paramters filtering, should get all three
         response = self.controller.list_metrics(dummy_req)
         expected = {'ListMetricsResponse':
                     {'ListMetricsResult':
@@ -342,15 +449,13 @@ class WatchControllerTest(HeatTestCase):
 
     def test_list_metrics_filter_namespace(self):
 
-        # Add a Namespace filter and change the engine response so
-        # we should get two reponses
+        # Add a Namespace filter, so the engine should return only the two
+        # matching metrics
         params = {'Action': 'ListMetrics',
                   'Namespace': 'atestnamespace/foo'}
         dummy_req = self._dummy_GET_request(params)
 
         # Stub out the RPC call to the engine with a pre-canned response
-        # We dummy three different metrics and namespaces to test
-        # filtering by parameter
         engine_resp = [{u'timestamp': u'2012-08-30T15:09:02Z',
                         u'watch_name': u'HttpFailureAlarm',
                         u'namespace': u'atestnamespace/foo',
@@ -361,20 +466,13 @@ class WatchControllerTest(HeatTestCase):
                         u'watch_name': u'HttpFailureAlarm2',
                         u'namespace': u'atestnamespace/foo',
                         u'metric_name': u'ServiceFailure2',
-                        u'data': {u'Units': u'Counter', u'Value': 1}},
-
-                       {u'timestamp': u'2012-08-30T15:16:03Z',
-                        u'watch_name': u'HttpFailureAlar3m',
-                        u'namespace': u'system/linux3',
-                        u'metric_name': u'ServiceFailure3',
                         u'data': {u'Units': u'Counter', u'Value': 1}}]
 
         self.m.StubOutWithMock(rpc, 'call')
-        # Current engine implementation means we filter in the API
-        # and pass None/None for namespace/watch_name which returns
-        # all metric data which we post-process in the API
         rpc.call(dummy_req.context, self.topic,
-                 {'args': {'metric_namespace': None, 'metric_name': None},
+                 {'args': {'metric_namespace': 'atestnamespace/foo',
+                           'metric_name': None,
+                           'limit': 500, 'marker': None},
                   'namespace': None,
                   'method': 'show_watch_metric',
                   'version': self.api_version},
@@ -434,20 +532,19 @@ class WatchControllerTest(HeatTestCase):
         # Stub out the RPC call to verify the engine call parameters
         engine_resp = {}
 
-        self.m.StubOutWithMock(rpc, 'call')
-        rpc.call(dummy_req.context, self.topic,
+        self.m.StubOutWithMock(rpc, 'cast')
+        rpc.cast(dummy_req.context, self.topic,
                  {'args':
-                  {'stats_data':
-                  {'Namespace': u'system/linux',
-                  u'ServiceFailure':
-                  {'Value': u'1',
-                   'Unit': u'Count',
-                   'Dimensions': []}},
-                 'watch_name': u'HttpFailureAlarm'},
+                  {'watch_data':
+                   [[u'HttpFailureAlarm',
+                     {'Namespace': u'system/linux',
+                      u'ServiceFailure':
+                      {'Value': u'1',
+                       'Unit': u'Count',
+                       'Dimensions': []}}]]},
                  'namespace': None,
-                 'method': 'create_watch_data',
-                 'version': self.api_version},
-                 None).AndReturn(engine_resp)
+                 'method': 'create_watch_data_all',
+                 'version': self.api_version}).AndReturn(engine_resp)
 
         self.m.ReplayAll()
 
@@ -455,6 +552,86 @@ class WatchControllerTest(HeatTestCase):
         expected = {'PutMetricDataResponse': {'PutMetricDataResult':
                     {'ResponseMetadata': None}}}
         self.assert_(response == expected)
+        self.m.VerifyAll()
+
+    def test_put_metric_data_multiple(self):
+
+        params = {u'Namespace': u'system/linux',
+                  u'MetricData.member.1.Unit': u'Count',
+                  u'MetricData.member.1.Value': u'1',
+                  u'MetricData.member.1.MetricName': u'ServiceFailure',
+                  u'MetricData.member.1.Dimensions.member.1.Name':
+                  u'AlarmName',
+                  u'MetricData.member.1.Dimensions.member.1.Value':
+                  u'HttpFailureAlarm',
+                  u'MetricData.member.2.Unit': u'Percent',
+                  u'MetricData.member.2.Value': u'42',
+                  u'MetricData.member.2.MetricName': u'MemoryUtilization',
+                  u'MetricData.member.2.Dimensions.member.1.Name':
+                  u'InstanceId',
+                  u'MetricData.member.2.Dimensions.member.1.Value':
+                  u'i-123',
+                  u'MetricData.member.3.Unit': u'Count',
+                  u'MetricData.member.3.Value': u'0',
+                  u'MetricData.member.3.MetricName': u'ServiceFailure',
+                  u'MetricData.member.3.Dimensions.member.1.Name':
+                  u'AlarmName',
+                  u'MetricData.member.3.Dimensions.member.1.Value':
+                  u'OtherAlarm',
+                  u'Action': u'PutMetricData'}
+
+        dummy_req = self._dummy_GET_request(params)
+
+        # All of the entries are sent to the engine in a single message
+        watch_data = [[watch_name, {'Namespace': u'system/linux',
+                                    metric: {'Value': value,
+                                             'Unit': unit,
+                                             'Dimensions': dimensions}}]
+                      for watch_name, metric, unit, value, dimensions in (
+                          (u'HttpFailureAlarm', u'ServiceFailure', u'Count',
+                           u'1', []),
+                          (u'HttpFailureAlarm', u'MemoryUtilization',
+                           u'Percent', u'42', [{u'InstanceId': u'i-123'}]),
+                          (u'OtherAlarm', u'ServiceFailure', u'Count', u'0',
+                           []))]
+        self.m.StubOutWithMock(rpc, 'cast')
+        rpc.cast(dummy_req.context, self.topic,
+                 {'args': {'watch_data': watch_data},
+                  'namespace': None,
+                  'method': 'create_watch_data_all',
+                  'version': self.api_version})
+
+        self.m.ReplayAll()
+
+        response = self.controller.put_metric_data(dummy_req)
+        expected = {'PutMetricDataResponse': {'PutMetricDataResult':
+                    {'ResponseMetadata': None}}}
+        self.assertEqual(expected, response)
+        self.m.VerifyAll()
+
+    def test_put_metric_data_bad_value(self):
+        params = {u'Namespace': u'system/linux',
+                  u'MetricData.member.1.Unit': u'Count',
+                  u'MetricData.member.1.Value': u'1',
+                  u'MetricData.member.1.MetricName': u'ServiceFailure',
+                  u'MetricData.member.1.Dimensions.member.1.Name':
+                  u'AlarmName',
+                  u'MetricData.member.1.Dimensions.member.1.Value':
+                  u'HttpFailureAlarm',
+                  u'MetricData.member.2.Unit': u'Count',
+                  u'MetricData.member.2.Value': u'lots',
+                  u'MetricData.member.2.MetricName': u'ServiceFailure',
+                  u'Action': u'PutMetricData'}
+        dummy_req = self._dummy_GET_request(params)
+
+        # Nothing is sent to the engine
+        self.m.StubOutWithMock(rpc, 'cast')
+        self.m.ReplayAll()
+
+        result = self.controller.put_metric_data(dummy_req)
+        self.assertTrue(isinstance(result,
+                                   exception.HeatInvalidParameterValueError))
+        self.m.VerifyAll()
 
     def test_set_alarm_state(self):
         state_map = {'OK': engine_api.WATCH_STATE_OK,
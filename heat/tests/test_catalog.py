@@ -0,0 +1,180 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import eventlet
+import mox
+from oslo.config import cfg
+
+from heat.engine import catalog
+from heat.openstack.common import timeutils
+from heat.tests.common import HeatTestCase
+from heat.tests import utils
+from heat.tests.v1_1 import fakes
+
+
+class CatalogTest(HeatTestCase):
+
+    def setUp(self):
+        super(CatalogTest, self).setUp()
+        self.fc = fakes.FakeClient()
+        self.ctx = utils.dummy_context()
+
+    def _list_calls(self, kind):
+        return len([c for c in self.fc.client.callstack
+                    if c[1].startswith('/%s' % kind)])
+
+    def test_cached(self):
+        self.assertEqual([1], catalog.ids(self.ctx, self.fc, catalog.FLAVORS,
+                                          '256 MB Server'))
+        self.assertEqual([2], catalog.ids(self.ctx, self.fc, catalog.FLAVORS,
+                                          'm1.small'))
+        self.assertEqual(1, self._list_calls('flavors'))
+
+        self.assertEqual(['test'], catalog.ids(self.ctx, self.fc,
+                                               catalog.KEYPAIRS, 'test'))
+        self.assertEqual(1, self._list_calls('os-keypairs'))
+
+    def test_duplicate_names(self):
+        self.m.StubOutWithMock(self.fc.client, 'get_images_detail')
+        self.fc.client.get_images_detail().AndReturn((
+            200, {'images': [{'id': 1, 'name': 'CentOS 5.2'},
+                             {'id': 4, 'name': 'CentOS 5.2'}]}))
+        self.m.ReplayAll()
+
+        self.assertEqual([1, 4], catalog.ids(self.ctx, self.fc,
+                                             catalog.IMAGES, 'CentOS 5.2'))
+        self.m.VerifyAll()
+
+    def test_miss_refreshes(self):
+        self.assertEqual([], catalog.ids(self.ctx, self.fc, catalog.FLAVORS,
+                                         'm1.huge'))
+        self.assertEqual(1, self._list_calls('flavors'))
+        self.assertEqual([], catalog.ids(self.ctx, self.fc, catalog.FLAVORS,
+                                         'm1.huge'))
+        self.assertEqual(2, self._list_calls('flavors'))
+
+    def test_expiry(self):
+        cfg.CONF.set_override('nova_catalog_ttl', 60)
+        self.addCleanup(cfg.CONF.clear_override, 'nova_catalog_ttl')
+
+        now = datetime.datetime(2013, 1, 1)
+        self.m.StubOutWithMock(timeutils, 'utcnow')
+        timeutils.utcnow().AndReturn(now)
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=59))
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=60))
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=60))
+        self.m.ReplayAll()
+
+        for expected_calls in (1, 1, 2):
+            catalog.ids(self.ctx, self.fc, catalog.FLAVORS, '256 MB Server')
+            self.assertEqual(expected_calls, self._list_calls('flavors'))
+        self.m.VerifyAll()
+
+    def test_per_tenant(self):
+        other_ctx = utils.dummy_context(tenant_id='other_tenant')
+        catalog.ids(self.ctx, self.fc, catalog.FLAVORS, '256 MB Server')
+        catalog.ids(other_ctx, self.fc, catalog.FLAVORS, '256 MB Server')
+        self.assertEqual(2, self._list_calls('flavors'))
+
+    def test_keypairs_per_user(self):
+        other_ctx = utils.dummy_context(user='other_user')
+        self.m.StubOutWithMock(self.fc.client, 'get_os_keypairs')
+        self.fc.client.get_os_keypairs().AndReturn((
+            200, {'keypairs': [{'name': 'mine'}]}))
+        self.fc.client.get_os_keypairs().AndReturn((
+            200, {'keypairs': []}))
+        self.m.ReplayAll()
+
+        self.assertEqual(['mine'], catalog.ids(self.ctx, self.fc,
+                                               catalog.KEYPAIRS, 'mine'))
+        # Another user of the same tenant does not see the keypair
+        self.assertEqual([], catalog.ids(other_ctx, self.fc,
+                                         catalog.KEYPAIRS, 'mine'))
+        self.m.VerifyAll()
+
+    def test_fetched_while_waiting(self):
+        fetches = []
+
+        def list_objects():
+            fetches.append(None)
+            return self.fc.flavors.list()
+
+        cat = catalog.Catalog(catalog.FLAVORS)
+        generation = cat._generation
+        cat.ids(list_objects, '256 MB Server')
+
+        # A thread which was waiting for the lock uses the new listing
+        cat._fetch(list_objects, generation)
+        self.assertEqual(1, len(fetches))
+
+
+class AvailabilityZonesTest(HeatTestCase):
+
+    def setUp(self):
+        super(AvailabilityZonesTest, self).setUp()
+        self.fc = fakes.FakeClient()
+        cfg.CONF.set_override('availability_zone_ttl', 60)
+        self.addCleanup(cfg.CONF.clear_override, 'availability_zone_ttl')
+
+    def _list_calls(self):
+        return len([c for c in self.fc.client.callstack
+                    if c[1].startswith('/os-availability-zone')])
+
+    def test_cached(self):
+        self.assertEqual(['nova1'], catalog.availability_zones(self.fc))
+        self.assertEqual(['nova1'], catalog.availability_zones(self.fc))
+        self.assertEqual(1, self._list_calls())
+
+    def test_refreshed_in_background(self):
+        now = datetime.datetime(2013, 1, 1)
+        self.m.StubOutWithMock(timeutils, 'utcnow')
+        timeutils.utcnow().AndReturn(now)
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=60))
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=61))
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=62))
+        refreshes = []
+        self.m.StubOutWithMock(eventlet, 'spawn_n')
+        eventlet.spawn_n(mox.IgnoreArg(), mox.IgnoreArg()).WithSideEffects(
+            lambda func, *args: refreshes.append((func, args)))
+        self.m.ReplayAll()
+
+        catalog.availability_zones(self.fc)
+        self.fc.client.get_os_availability_zone = lambda *kw: (
+            200, {'availabilityZoneInfo': [{'zoneName': 'nova2'}]})
+
+        # An expired listing is still returned while it is being refreshed,
+        # and only one refresh is started at a time
+        self.assertEqual(['nova1'], catalog.availability_zones(self.fc))
+        self.assertEqual(['nova1'], catalog.availability_zones(self.fc))
+        self.assertEqual(1, self._list_calls())
+        self.assertEqual(1, len(refreshes))
+
+        func, args = refreshes[0]
+        func(*args)
+        self.assertEqual(['nova2'], catalog.availability_zones(self.fc))
+        self.m.VerifyAll()
+
+    def test_refresh_failure(self):
+        zones = catalog.AvailabilityZones()
+        zones.zones(lambda: self.fc.availability_zones.list(detailed=False))
+
+        def fail():
+            raise Exception('overLimit')
+
+        zones._refreshing = True
+        zones._refresh(fail)
+        self.assertFalse(zones._refreshing)
+        self.assertEqual(['nova1'], zones.zones(fail))
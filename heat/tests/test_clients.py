@@ -0,0 +1,206 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mox
+import time
+
+from novaclient import exceptions as nova_exceptions
+from oslo.config import cfg
+
+from heat.common import context
+from heat.engine import clients
+from heat.engine import parser
+from heat.tests.common import HeatTestCase
+from heat.tests import utils
+
+
+class ClientPoolTest(HeatTestCase):
+
+    def setUp(self):
+        super(ClientPoolTest, self).setUp()
+        self.pool = clients.ClientPool()
+
+    def _context(self, **kwargs):
+        creds = {'username': 'user', 'tenant_id': 'tenant',
+                 'auth_url': 'http://localhost:5000/v2.0',
+                 'auth_token': 'token', 'password': None}
+        creds.update(kwargs)
+        return context.RequestContext.from_dict(creds)
+
+    def test_reused(self):
+        first = self.pool.get(self._context())
+        self.assertTrue(first is self.pool.get(self._context()))
+        self.assertEqual((1, 1), (self.pool.hits, self.pool.misses))
+
+    def test_keyed_by_credentials(self):
+        first = self.pool.get(self._context())
+        for creds in ({'auth_token': 'other'},
+                      {'tenant_id': 'other'},
+                      {'auth_url': 'http://other:5000/v2.0'},
+                      {'auth_token': None, 'password': 'secret'},
+                      {'auth_token': None, 'password': 'other'}):
+            self.assertFalse(first is self.pool.get(self._context(**creds)))
+        self.assertEqual(6, len(self.pool))
+
+    def test_no_credentials(self):
+        ctx = self._context(auth_token=None)
+        self.assertFalse(self.pool.get(ctx) is self.pool.get(ctx))
+        self.assertEqual(0, len(self.pool))
+
+    def test_least_recently_used_dropped(self):
+        cfg.CONF.set_override('client_pool_size', 2)
+        self.addCleanup(cfg.CONF.clear_override, 'client_pool_size')
+
+        first = self.pool.get(self._context(auth_token='1'))
+        self.pool.get(self._context(auth_token='2'))
+        self.pool.get(self._context(auth_token='1'))
+        self.pool.get(self._context(auth_token='3'))
+        self.assertEqual(2, len(self.pool))
+        self.assertTrue(first is self.pool.get(self._context(auth_token='1')))
+        self.assertEqual(3, self.pool.misses)
+
+    def test_disabled(self):
+        cfg.CONF.set_override('client_pool_size', 0)
+        self.addCleanup(cfg.CONF.clear_override, 'client_pool_size')
+
+        ctx = self._context()
+        self.assertFalse(self.pool.get(ctx) is self.pool.get(ctx))
+
+    def test_expiring_token_replaced(self):
+        first = self.pool.get(self._context())
+        self.m.StubOutWithMock(first, 'expires_soon')
+        first.expires_soon().AndReturn(True)
+        self.m.ReplayAll()
+
+        self.assertFalse(first is self.pool.get(self._context()))
+        self.assertEqual(1, self.pool.expired)
+        self.m.VerifyAll()
+
+    def test_stacks_share_clients(self):
+        tmpl = parser.Template({})
+        ctx = utils.dummy_context()
+        stack = parser.Stack(ctx, 'stack', tmpl)
+        other = parser.Stack(utils.dummy_context(), 'other', tmpl)
+        self.assertTrue(stack.clients is other.clients)
+
+
+class RateLimiterTest(HeatTestCase):
+
+    def setUp(self):
+        super(RateLimiterTest, self).setUp()
+        self.m.StubOutWithMock(eventlet, 'sleep')
+        self.limiter = clients.rate_limiter('http://nova:8774/v2/tenant')
+
+    def _set(self, **kwargs):
+        for name, value in kwargs.items():
+            cfg.CONF.set_override(name, value)
+            self.addCleanup(cfg.CONF.clear_override, name)
+
+    def _overlimit(self, retry_after=0):
+        return nova_exceptions.OverLimit(413, retry_after=retry_after)
+
+    def test_shared_per_endpoint(self):
+        self.assertTrue(
+            self.limiter is clients.rate_limiter('http://nova:8774/v2/tenant'))
+        self.assertFalse(
+            self.limiter is clients.rate_limiter('http://cinder:8776/v1'))
+
+    def test_token_bucket(self):
+        self._set(backend_rate_limit=2.0, backend_rate_burst=2)
+        self.m.StubOutWithMock(time, 'time')
+        time.time().AndReturn(100.0)
+        time.time().AndReturn(100.0)
+        time.time().AndReturn(100.0)
+        time.time().AndReturn(100.0)
+        eventlet.sleep(0.5)
+        time.time().AndReturn(100.5)
+        self.m.ReplayAll()
+
+        limiter = clients.RateLimiter('http://nova:8774/v2/tenant')
+        for i in range(3):
+            self.assertEqual('ok', limiter.call('GET', lambda: 'ok'))
+        self.m.VerifyAll()
+        self.assertEqual(3, limiter.calls)
+        self.assertEqual(0.5, limiter.queue_time)
+
+    def test_retry_after(self):
+        calls = []
+
+        def request():
+            calls.append(None)
+            if len(calls) < 3:
+                raise self._overlimit(retry_after=len(calls) * 10)
+            return 'ok'
+
+        eventlet.sleep(10)
+        eventlet.sleep(20)
+        self.m.ReplayAll()
+
+        self.assertEqual('ok', self.limiter.call('GET', request))
+        self.m.VerifyAll()
+        self.assertEqual(2, self.limiter.throttled)
+
+    def test_backoff(self):
+        self._set(backend_overlimit_retries=2, backend_retry_max_delay=3)
+
+        def request():
+            raise self._overlimit()
+
+        self.m.StubOutWithMock(clients.random, 'uniform')
+        clients.random.uniform(1, 2).AndReturn(1.5)
+        eventlet.sleep(1.5)
+        clients.random.uniform(1, 2).AndReturn(1.75)
+        eventlet.sleep(3)
+        self.m.ReplayAll()
+
+        self.assertRaises(nova_exceptions.OverLimit,
+                          self.limiter.call, 'DELETE', request)
+        self.m.VerifyAll()
+
+    def test_not_idempotent(self):
+        def request():
+            raise self._overlimit(retry_after=1)
+
+        self.m.ReplayAll()
+        self.assertRaises(nova_exceptions.OverLimit,
+                          self.limiter.call, 'POST', request)
+        self.assertEqual(0, self.limiter.throttled)
+
+    def test_other_errors(self):
+        def request():
+            raise nova_exceptions.NotFound(404)
+
+        self.m.ReplayAll()
+        self.assertRaises(nova_exceptions.NotFound,
+                          self.limiter.call, 'GET', request)
+
+    def test_nova_client_limited(self):
+        ctx = utils.dummy_context()
+        os_clients = clients.OpenStackClients(ctx)
+        self.m.StubOutWithMock(os_clients, 'url_for')
+        os_clients.url_for(service_type='compute').AndReturn(
+            'http://nova:8774/v2/tenant')
+        self.m.ReplayAll()
+
+        nova = os_clients.nova()
+        self.m.VerifyAll()
+        self.m.UnsetStubs()
+        self.m.StubOutWithMock(self.limiter, 'call')
+        self.limiter.call('GET', mox.IgnoreArg(), '/servers',
+                          'GET').AndReturn(('resp', 'body'))
+        self.m.ReplayAll()
+
+        self.assertEqual(('resp', 'body'), nova.client.get('/servers'))
+        self.m.VerifyAll()
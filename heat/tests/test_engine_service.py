@@ -13,6 +13,7 @@
 #    under the License.
 
 
+import datetime
 import functools
 import json
 import sys
@@ -32,10 +33,14 @@ from heat.common import template_format
 from heat.engine import parser
 from heat.engine import service
 from heat.engine.properties import Properties
+from heat.engine import resource as engine_resource
 from heat.engine.resources import instance as instances
+from heat.engine import watchbatch
 from heat.engine import watchrule
 from heat.openstack.common import threadgroup
+from heat.openstack.common import timeutils
 from heat.tests.common import HeatTestCase
+from heat.tests import generic_resource as generic_rsrc
 from heat.tests import utils
 from heat.tests.utils import dummy_context
 from heat.tests.utils import setup_dummy_db
@@ -1144,10 +1149,327 @@ class StackServiceTest(HeatTestCase):
         stack.create()
         self.eng.stg[stack.id] = DummyThreadGroup()
         self.eng._start_watch_task(stack.id, self.ctx)
-        self.assertEqual([self.eng._periodic_watcher_task],
-                         self.eng.stg[stack.id].threads)
+        self.assertEqual([], self.eng.stg[stack.id].threads)
+        wr = db_api.watch_rule_get_all_by_stack(self.ctx, stack.id)[0]
+        self.assertTrue(wr.id in self.eng.watch_scheduler)
         self.stack.delete()
 
+    def test_periodic_watcher_task(self):
+        stack = get_alarm_stack('periodic_watcher_task',
+                                create_context(self.m))
+        self.stack = stack
+        self.m.ReplayAll()
+        stack.store()
+        stack.create()
+        self.eng._start_watch_task(stack.id, self.ctx)
+        wr = db_api.watch_rule_get_all_by_stack(self.ctx, stack.id)[0]
+
+        self.m.StubOutWithMock(watchrule.WatchRule, 'evaluate')
+        watchrule.WatchRule.evaluate().AndReturn([])
+        self.m.ReplayAll()
+
+        # Nothing is due yet
+        self.eng._periodic_watcher_task()
+        self.assertTrue(wr.id in self.eng.watch_scheduler)
+
+        self.eng.watch_scheduler.schedule(wr.id,
+                                          datetime.datetime(2013, 1, 1))
+        self.eng._periodic_watcher_task()
+        self.m.VerifyAll()
+
+        # The rule is rescheduled one Period after its last evaluation
+        now = timeutils.utcnow()
+        self.assertTrue(wr.id in self.eng.watch_scheduler)
+        self.assertEqual([], self.eng.watch_scheduler.pop_due(now))
+        self.assertEqual([wr.id], self.eng.watch_scheduler.pop_due(
+            now + datetime.timedelta(seconds=300)))
+        self.stack.delete()
+
+    def test_periodic_watcher_task_bulk(self):
+        cfg.CONF.set_override('bulk_watch_evaluation', True)
+        self.addCleanup(cfg.CONF.clear_override, 'bulk_watch_evaluation')
+
+        stack = get_alarm_stack('periodic_watcher_task_bulk',
+                                create_context(self.m))
+        self.stack = stack
+        self.m.ReplayAll()
+        stack.store()
+        stack.create()
+        self.eng._start_watch_task(stack.id, self.ctx)
+        wr = db_api.watch_rule_get_all_by_stack(self.ctx, stack.id)[0]
+
+        self.m.StubOutWithMock(watchbatch, 'available')
+        watchbatch.available().AndReturn(True)
+        self.m.StubOutWithMock(watchbatch, 'alarm_states')
+        watchbatch.alarm_states(mox.IgnoreArg(), mox.IgnoreArg(),
+                                mox.IgnoreArg()).AndReturn({wr.id: 'ALARM'})
+        self.m.StubOutWithMock(watchrule.WatchRule, 'evaluate')
+        watchrule.WatchRule.evaluate('ALARM').AndReturn([])
+        self.m.ReplayAll()
+
+        self.eng.watch_scheduler.schedule(wr.id,
+                                          datetime.datetime(2013, 1, 1))
+        self.eng._periodic_watcher_task()
+        self.m.VerifyAll()
+        self.stack.delete()
+
+    @stack_context('periodic_watcher_failure_test_stack', False)
+    @utils.wr_delete_after
+    def test_periodic_watcher_task_stack_failure(self):
+        other = parser.Stack(self.ctx, 'periodic_watcher_other_stack',
+                             parser.Template({}))
+        other.store()
+        self.addCleanup(other.delete)
+
+        self.wr = []
+        for sid in (other.id, self.stack.id):
+            wr = watchrule.WatchRule(context=self.ctx,
+                                     watch_name='failure_watch_%s' % sid,
+                                     rule={u'Period': u'300',
+                                           u'Statistic': u'SampleCount',
+                                           u'ComparisonOperator':
+                                           u'GreaterThanThreshold',
+                                           u'Threshold': u'2',
+                                           u'MetricName': u'ServiceFailure'},
+                                     stack_id=sid)
+            wr.store()
+            self.wr.append(wr)
+            self.eng.watch_scheduler.schedule(wr.id,
+                                              datetime.datetime(2013, 1, 1))
+
+        stack_get = db_api.stack_get
+        failures = [other.id]
+
+        def failing_stack_get(cnxt, sid, admin=False):
+            if sid in failures:
+                failures.remove(sid)
+                raise Exception('Database unavailable')
+            return stack_get(cnxt, sid, admin=admin)
+
+        self.m.stubs.Set(db_api, 'stack_get', failing_stack_get)
+        self.m.StubOutWithMock(watchrule.WatchRule, 'evaluate')
+        watchrule.WatchRule.evaluate(None).AndReturn([])
+        self.m.ReplayAll()
+
+        self.eng._periodic_watcher_task()
+        self.m.VerifyAll()
+        self.assertEqual([], failures)
+
+        # The rules of both stacks are due again one Period later
+        now = timeutils.utcnow()
+        self.assertEqual([], self.eng.watch_scheduler.pop_due(now))
+        self.assertEqual(set(wr.id for wr in self.wr),
+                         set(self.eng.watch_scheduler.pop_due(
+                             now + datetime.timedelta(seconds=301))))
+
+    def test_periodic_watcher_task_deleted_rule(self):
+        self.eng.watch_scheduler.schedule(-1, datetime.datetime(2013, 1, 1))
+        self.eng._periodic_watcher_task()
+        self.assertEqual(0, len(self.eng.watch_scheduler))
+
+    def test_dispatch_alarm_actions_coalesced(self):
+        cfg.CONF.set_override('alarm_coalesce_window', 30)
+        self.addCleanup(cfg.CONF.clear_override, 'alarm_coalesce_window')
+
+        now = datetime.datetime(2013, 1, 1)
+        self.m.StubOutWithMock(timeutils, 'utcnow')
+        later = now + datetime.timedelta(seconds=10)
+        timeutils.utcnow().AndReturn(now)
+        timeutils.utcnow().AndReturn(later)
+        timeutils.utcnow().AndReturn(later)
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=30))
+
+        run = self.eng._run_alarm_actions
+        self.m.StubOutWithMock(self.eng, '_start_in_thread')
+        self.eng._start_in_thread('s1', run, self.ctx, 's1', ['A', 'B'])
+        self.eng._start_in_thread('s1', run, self.ctx, 's1', ['C'])
+        self.eng._start_in_thread('s2', run, self.ctx, 's2', ['A'])
+        self.eng._start_in_thread('s1', run, self.ctx, 's1', ['A', 'B'])
+        self.m.ReplayAll()
+
+        self.eng._dispatch_alarm_actions(self.ctx, 's1', ['A', 'A', 'B'])
+        self.eng._dispatch_alarm_actions(self.ctx, 's1', ['A', 'C'])
+        self.eng._dispatch_alarm_actions(self.ctx, 's2', ['A'])
+        # The window has passed for the first actions
+        self.eng._dispatch_alarm_actions(self.ctx, 's1', ['A', 'B', 'C'])
+        self.m.VerifyAll()
+
+    def test_dispatch_alarm_actions_override(self):
+        cfg.CONF.set_override('alarm_coalesce_window', 30)
+        self.addCleanup(cfg.CONF.clear_override, 'alarm_coalesce_window')
+
+        now = datetime.datetime(2013, 1, 1)
+        self.m.StubOutWithMock(timeutils, 'utcnow')
+        timeutils.utcnow().AndReturn(now)
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=10))
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=20))
+
+        run = self.eng._run_alarm_actions
+        self.m.StubOutWithMock(self.eng, '_start_in_thread')
+        self.eng._start_in_thread('s1', run, self.ctx, 's1', ['A'])
+        self.eng._start_in_thread('s1', run, self.ctx, 's1', ['A', 'B'])
+        self.m.ReplayAll()
+
+        self.eng._dispatch_alarm_actions(self.ctx, 's1', ['A'])
+        # Explicit overrides are never coalesced...
+        self.eng._dispatch_alarm_actions(self.ctx, 's1', ['A', 'B', 'A'],
+                                         coalesce=False)
+        # ...but are taken into account when coalescing periodic actions
+        self.eng._dispatch_alarm_actions(self.ctx, 's1', ['B'])
+        self.m.VerifyAll()
+
+    def test_run_alarm_actions(self):
+        engine_resource._register_class('GenericResourceType',
+                                        generic_rsrc.GenericResource)
+        engine_resource._register_class('ResourceWithPropsType',
+                                        generic_rsrc.ResourceWithProps)
+        tpl = {'Resources': {
+            'Group': {'Type': 'GenericResourceType'},
+            'Policy': {'Type': 'ResourceWithPropsType',
+                       'Properties': {'Foo': {'Ref': 'Group'}}},
+            'Watcher': {'Type': 'GenericResourceType',
+                        'Metadata': {'g': {'Fn::GetAtt': ['Group', 'foo']}}},
+            'Chained': {'Type': 'GenericResourceType',
+                        'Metadata': {'w': {'Fn::GetAtt': ['Watcher',
+                                                          'foo']}}},
+            'Other': {'Type': 'GenericResourceType'}}}
+        stack = parser.Stack(self.ctx, 'run_alarm_actions_test_stack',
+                             parser.Template(tpl))
+        stack.store()
+        stack.create()
+        self.addCleanup(stack.delete)
+
+        self.m.StubOutWithMock(parser.Stack, 'load')
+        parser.Stack.load(self.ctx, stack_id=stack.id).AndReturn(stack)
+        stack['Policy'].alarm = self.m.CreateMockAnything()
+        stack['Policy'].alarm()
+        # Only the resources referencing the policy or the group it acts
+        # upon, directly or indirectly, have their metadata refreshed
+        for res in stack:
+            self.m.StubOutWithMock(res, 'metadata_update')
+        for name in ('Policy', 'Watcher', 'Chained'):
+            stack[name].metadata_update()
+        self.m.ReplayAll()
+
+        self.eng._run_alarm_actions(self.ctx, stack.id, ['Policy', 'Missing'])
+        self.m.VerifyAll()
+
+    def test_service_task_purges_metric_samples(self):
+        for name, value in (('metric_purge_interval', 600),
+                            ('metric_retention_grace_period', 60),
+                            ('metric_rollup', 'minute')):
+            cfg.CONF.set_override(name, value)
+            self.addCleanup(cfg.CONF.clear_override, name)
+
+        now = datetime.datetime(2013, 1, 1)
+        self.m.StubOutWithMock(timeutils, 'utcnow')
+        timeutils.utcnow().AndReturn(now)
+        timeutils.utcnow().AndReturn(now + datetime.timedelta(seconds=599))
+        later = now + datetime.timedelta(seconds=600)
+        timeutils.utcnow().AndReturn(later)
+
+        self.m.StubOutWithMock(watchrule, 'purge_metric_samples')
+        watchrule.purge_metric_samples(mox.IgnoreArg(), 60, 'minute',
+                                       now).AndReturn(3)
+        watchrule.purge_metric_samples(
+            mox.IgnoreArg(), 60, 'minute',
+            later).AndRaise(exception.NotFound('gone'))
+        self.m.ReplayAll()
+
+        self.eng._service_task()
+        self.eng._service_task()
+        # A failed purge must not stop the service task
+        self.eng._service_task()
+        self.m.VerifyAll()
+
+    def test_service_task_purge_disabled(self):
+        cfg.CONF.set_override('metric_purge_interval', 0)
+        self.addCleanup(cfg.CONF.clear_override, 'metric_purge_interval')
+
+        self.m.StubOutWithMock(watchrule, 'purge_metric_samples')
+        self.m.ReplayAll()
+
+        self.eng._service_task()
+        self.m.VerifyAll()
+
+    @stack_context('service_create_watch_data_test_stack', False)
+    @utils.wr_delete_after
+    def test_create_watch_data(self):
+        rule = {u'EvaluationPeriods': u'1',
+                u'AlarmDescription': u'test alarm',
+                u'Period': u'300',
+                u'ComparisonOperator': u'GreaterThanThreshold',
+                u'Statistic': u'SampleCount',
+                u'Threshold': u'2',
+                u'MetricName': u'ServiceFailure'}
+        self.wr = watchrule.WatchRule(context=self.ctx,
+                                      watch_name='create_data_watch',
+                                      rule=rule,
+                                      stack_id=self.stack.id)
+        self.wr.store()
+        self.eng.metric_samples = watchrule.MetricSampleBuffer(10)
+
+        self.m.StubOutWithMock(watchrule.WatchRule, 'load')
+        self.m.ReplayAll()
+
+        data = {u'Namespace': u'system/linux',
+                u'ServiceFailure': {u'Units': u'Counter', u'Value': 1}}
+        self.eng.create_watch_data(self.ctx, 'create_data_watch', data)
+        self.eng.create_watch_data(
+            self.ctx, 'create_data_watch',
+            {u'Namespace': u'system/linux',
+             u'Other': {u'Units': u'Counter', u'Value': 2}})
+        self.assertEqual(1, len(self.eng.metric_samples))
+        self.assertEqual([], db_api.metric_sample_get_all_by_watch_rule_id(
+            self.ctx, self.wr.id))
+
+        self.eng._flush_metric_samples()
+        samples = db_api.metric_sample_get_all_by_watch_rule_id(self.ctx,
+                                                                self.wr.id)
+        self.assertEqual([1.0], [d.value for d in samples])
+        self.m.VerifyAll()
+
+    def test_create_watch_data_not_found(self):
+        self.assertRaises(exception.WatchRuleNotFound,
+                          self.eng.create_watch_data,
+                          self.ctx, 'no_such_watch', {})
+
+    @stack_context('service_create_watch_data_all_test_stack', False)
+    @utils.wr_delete_after
+    def test_create_watch_data_all(self):
+        rule = {u'EvaluationPeriods': u'1',
+                u'AlarmDescription': u'test alarm',
+                u'Period': u'300',
+                u'ComparisonOperator': u'GreaterThanThreshold',
+                u'Statistic': u'SampleCount',
+                u'Threshold': u'2',
+                u'MetricName': u'ServiceFailure'}
+        self.wr = watchrule.WatchRule(context=self.ctx,
+                                      watch_name='create_data_all_watch',
+                                      rule=rule,
+                                      stack_id=self.stack.id)
+        self.wr.store()
+        self.eng.metric_samples = watchrule.MetricSampleBuffer(10)
+
+        def data(value):
+            return {u'Namespace': u'system/linux',
+                    u'ServiceFailure': {u'Units': u'Counter',
+                                        u'Value': value}}
+
+        # Data for a watch which does not exist, or with an invalid value,
+        # does not prevent the rest from being stored
+        self.eng.create_watch_data_all(self.ctx, [
+            ['create_data_all_watch', data(1)],
+            ['no_such_watch', data(2)],
+            ['create_data_all_watch', data('lots')],
+            ['create_data_all_watch', data(3)]])
+        self.assertEqual(2, len(self.eng.metric_samples))
+
+        self.eng._flush_metric_samples()
+        samples = db_api.metric_sample_get_all_by_watch_rule_id(self.ctx,
+                                                                self.wr.id)
+        self.assertEqual([1.0, 3.0], [d.value for d in samples])
+
     @stack_context('service_show_watch_test_stack', False)
     @utils.wr_delete_after
     def test_show_watch(self):
@@ -1194,6 +1516,24 @@ class StackServiceTest(HeatTestCase):
         for key in engine_api.WATCH_KEYS:
             self.assertTrue(key in result[0])
 
+        # Changes made by another engine are shown
+        db_api.watch_rule_update(self.ctx, self.wr[0].id, {'state': 'ALARM'})
+        result = self.eng.show_watch(self.ctx, watch_name="HttpFailureAlarm")
+        self.assertEqual('ALARM', result[0][engine_api.WATCH_STATE_VALUE])
+
+        # Stored rules are shown from the cache, and listing them all takes
+        # a single query, without loading each rule
+        self.m.StubOutWithMock(db_api, 'watch_rule_get_by_name')
+        self.m.StubOutWithMock(watchrule.WatchRule, 'load')
+        self.m.ReplayAll()
+
+        result = self.eng.show_watch(self.ctx, watch_name="AnotherWatch")
+        self.assertEqual('AnotherWatch', result[0][engine_api.WATCH_NAME])
+        self.assertEqual('NORMAL', result[0][engine_api.WATCH_STATE_VALUE])
+        self.assertEqual(2, len(self.eng.show_watch(self.ctx,
+                                                    watch_name=None)))
+        self.m.VerifyAll()
+
     @stack_context('service_show_watch_metric_test_stack', False)
     @utils.wr_delete_after
     def test_show_watch_metric(self):
@@ -1219,10 +1559,11 @@ class StackServiceTest(HeatTestCase):
         watch = db_api.watch_rule_get_by_name(self.ctx, "HttpFailureAlarm")
         self.assertNotEqual(watch, None)
         values = {'watch_rule_id': watch.id,
-                  'data': {u'Namespace': u'system/linux',
-                           u'ServiceFailure': {
-                           u'Units': u'Counter', u'Value': 1}}}
-        watch = db_api.watch_data_create(self.ctx, values)
+                  'namespace': u'system/linux',
+                  'metric_name': u'ServiceFailure',
+                  'unit': u'Counter',
+                  'value': 1}
+        watch = db_api.metric_sample_create(self.ctx, values)
 
         # Check there is one result returned
         result = self.eng.show_watch_metric(self.ctx,
@@ -1231,7 +1572,7 @@ class StackServiceTest(HeatTestCase):
         self.assertEqual(1, len(result))
 
         # Create another metric datapoint and check we get two
-        watch = db_api.watch_data_create(self.ctx, values)
+        watch = db_api.metric_sample_create(self.ctx, values)
         result = self.eng.show_watch_metric(self.ctx,
                                             metric_namespace=None,
                                             metric_name=None)
@@ -1241,6 +1582,79 @@ class StackServiceTest(HeatTestCase):
         for key in engine_api.WATCH_DATA_KEYS:
             self.assertTrue(key in result[0])
 
+        # Check filtering by namespace and metric name
+        result = self.eng.show_watch_metric(self.ctx,
+                                            metric_namespace=u'system/linux',
+                                            metric_name=u'ServiceFailure')
+        self.assertEqual(2, len(result))
+        self.assertEqual(1, result[0][engine_api.WATCH_DATA]['Value'])
+        result = self.eng.show_watch_metric(self.ctx,
+                                            metric_namespace=u'system/other',
+                                            metric_name=None)
+        self.assertEqual([], result)
+        result = self.eng.show_watch_metric(self.ctx,
+                                            metric_namespace=None,
+                                            metric_name=u'OtherMetric')
+        self.assertEqual([], result)
+
+        # Check paging through the results
+        first = self.eng.show_watch_metric(self.ctx, limit=1)
+        self.assertEqual(1, len(first))
+        rest = self.eng.show_watch_metric(
+            self.ctx, marker=first[0][engine_api.WATCH_DATA_ID])
+        self.assertEqual(1, len(rest))
+        self.assertTrue(rest[0][engine_api.WATCH_DATA_ID] >
+                        first[0][engine_api.WATCH_DATA_ID])
+
+    @stack_context('service_show_watch_metric_stats_test_stack', False)
+    @utils.wr_delete_after
+    def test_show_watch_metric_statistics(self):
+        rule = {u'EvaluationPeriods': u'1',
+                u'Namespace': u'stats/test',
+                u'Period': u'300',
+                u'ComparisonOperator': u'GreaterThanThreshold',
+                u'Statistic': u'SampleCount',
+                u'Threshold': u'2',
+                u'MetricName': u'Latency'}
+        self.wr = watchrule.WatchRule(context=self.ctx,
+                                      watch_name='StatsAlarm',
+                                      rule=rule,
+                                      stack_id=self.stack.id)
+        self.wr.store()
+
+        start = datetime.datetime(2013, 1, 1, 12)
+        for offset, value in ((0, 1), (30, 3), (90, 10), (400, 7)):
+            db_api.metric_sample_create(self.ctx, {
+                'watch_rule_id': self.wr.id,
+                'namespace': u'stats/test',
+                'metric_name': u'Latency',
+                'unit': u'Seconds',
+                'value': value,
+                'created_at': start + datetime.timedelta(seconds=offset)})
+
+        result = self.eng.show_watch_metric_statistics(
+            self.ctx, u'stats/test', u'Latency', '2013-01-01T12:00:00Z',
+            '2013-01-01T12:05:00Z', 60, ['SampleCount', 'Average', 'Sum',
+                                         'Minimum', 'Maximum'])
+        self.assertEqual([
+            {'timestamp': '2013-01-01T12:00:00Z', 'unit': u'Seconds',
+             'statistics': {'SampleCount': 2, 'Average': 2.0, 'Sum': 4.0,
+                            'Minimum': 1.0, 'Maximum': 3.0}},
+            {'timestamp': '2013-01-01T12:01:00Z', 'unit': u'Seconds',
+             'statistics': {'SampleCount': 1, 'Average': 10.0, 'Sum': 10.0,
+                            'Minimum': 10.0, 'Maximum': 10.0}}], result)
+
+        # Purged samples are included through their aggregates
+        watchrule.purge_metric_samples(self.ctx, 0, 'minute',
+                                       start + datetime.timedelta(hours=1))
+        result = self.eng.show_watch_metric_statistics(
+            self.ctx, u'stats/test', u'Latency', '2013-01-01T12:00:00Z',
+            '2013-01-01T13:00:00Z', 3600, ['SampleCount', 'Maximum'],
+            u'Seconds')
+        self.assertEqual([
+            {'timestamp': '2013-01-01T12:00:00Z', 'unit': u'Seconds',
+             'statistics': {'SampleCount': 4, 'Maximum': 10.0}}], result)
+
     @stack_context('service_show_watch_state_test_stack')
     @utils.wr_delete_after
     def test_set_watch_state(self):
@@ -1262,16 +1676,8 @@ class StackServiceTest(HeatTestCase):
                                       state='NORMAL')
         self.wr.store()
 
-        class DummyAction(object):
-            alarm = "dummyfoo"
-
-        dummy_action = DummyAction()
-        self.m.StubOutWithMock(parser.Stack, '__getitem__')
-        parser.Stack.__getitem__(
-            'WebServerRestartPolicy').AndReturn(dummy_action)
-
         # Replace the real stack threadgroup with a dummy one, so we can
-        # check the function returned on ALARM is correctly scheduled
+        # check the actions to run on ALARM are correctly scheduled
         self.eng.stg[self.stack.id] = DummyThreadGroup()
 
         self.m.ReplayAll()
@@ -1295,7 +1701,7 @@ class StackServiceTest(HeatTestCase):
                                           watch_name="OverrideAlarm",
                                           state=state)
         self.assertEqual(state, result[engine_api.WATCH_STATE_VALUE])
-        self.assertEqual([DummyAction.alarm],
+        self.assertEqual([self.eng._run_alarm_actions],
                          self.eng.stg[self.stack.id].threads)
 
         self.m.VerifyAll()
@@ -1338,8 +1744,8 @@ class StackServiceTest(HeatTestCase):
     def test_set_watch_state_noexist(self):
         state = watchrule.WatchRule.ALARM   # State valid
 
-        self.m.StubOutWithMock(watchrule.WatchRule, 'load')
-        watchrule.WatchRule.load(self.ctx, "nonexistent")\
+        self.m.StubOutWithMock(watchrule, 'lookup')
+        watchrule.lookup(self.ctx, "nonexistent")\
             .AndRaise(exception.WatchRuleNotFound)
         self.m.ReplayAll()
 
@@ -13,9 +13,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mox
 import testtools
 
 from heat.engine import environment
+from heat.engine import resource
 
 
 class EnvironmentTest(testtools.TestCase):
@@ -62,3 +64,68 @@ class EnvironmentTest(testtools.TestCase):
         self.assertEqual('OS::Nova::FloatingIP',
                          env.get_resource_type('OS::Networking::FloatingIP',
                                                'my_fip'))
+
+    def test_longest_global_match(self):
+        new_env = {u'resource_registry': {u'OS::*': 'CloudX::*',
+                                          u'OS::Compute::*': 'CloudY::*'}}
+        env = environment.Environment(new_env)
+        self.assertEqual('CloudY::Server',
+                         env.get_resource_type('OS::Compute::Server',
+                                               'my_server'))
+        self.assertEqual('CloudX::Networking::Port',
+                         env.get_resource_type('OS::Networking::Port',
+                                               'my_port'))
+        self.assertEqual('AWS::EC2::Instance',
+                         env.get_resource_type('AWS::EC2::Instance',
+                                               'my_instance'))
+
+    def test_exact_match_before_global(self):
+        new_env = {u'resource_registry': {u'OS::*': 'CloudX::*',
+                                          u'OS::Food': 'fruity'}}
+        env = environment.Environment(new_env)
+        self.assertEqual('fruity', env.get_resource_type('OS::Food', 'x'))
+
+    def test_large_registry(self):
+        registry = dict(('OS::Type%d' % i, 'CloudX::Type%d' % i)
+                        for i in range(1000))
+        registry.update(('Prefix%d::*' % i, 'CloudX%d::*' % i)
+                        for i in range(1000))
+        env = environment.Environment({u'resource_registry': registry})
+        self.assertEqual('CloudX::Type999',
+                         env.get_resource_type('OS::Type999', 'r'))
+        self.assertEqual('CloudX42::Compute::Server',
+                         env.get_resource_type('Prefix42::Compute::Server',
+                                               'r'))
+        self.assertEqual('OS::Other', env.get_resource_type('OS::Other', 'r'))
+
+
+class EnvironmentClassCacheTest(testtools.TestCase):
+
+    def setUp(self):
+        super(EnvironmentClassCacheTest, self).setUp()
+        self.m = mox.Mox()
+        self.addCleanup(self.m.UnsetStubs)
+        self.m.StubOutWithMock(resource, 'get_class')
+
+    def test_class_cached_per_type(self):
+        env = environment.Environment({u'resource_registry':
+                                       {u'OS::*': 'CloudX::*'}})
+        resource.get_class('CloudX::Server').AndReturn(object)
+        self.m.ReplayAll()
+
+        for name in ('a', 'b', 'c'):
+            self.assertEqual(object, env.get_class('OS::Server', name))
+        self.m.VerifyAll()
+
+    def test_class_cached_per_resource(self):
+        env = environment.Environment({u'resource_registry': {
+            u'resources': {u'a': {u'OS::Server': 'CloudX::Server'}}}})
+        resource.get_class('CloudX::Server').AndReturn(object)
+        resource.get_class('OS::Server').AndReturn(dict)
+        self.m.ReplayAll()
+
+        self.assertEqual(object, env.get_class('OS::Server', 'a'))
+        self.assertEqual(dict, env.get_class('OS::Server', 'b'))
+        self.assertEqual(object, env.get_class('OS::Server', 'a'))
+        self.assertEqual(dict, env.get_class('OS::Server', 'c'))
+        self.m.VerifyAll()
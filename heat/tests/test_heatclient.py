@@ -13,6 +13,7 @@
 #    under the License.
 
 import mox
+from oslo.config import cfg
 
 from heat.common import heat_keystoneclient
 from heat.tests.common import HeatTestCase
@@ -64,3 +65,61 @@ class KeystoneClientTest(HeatTestCase):
         heat_ks_client = heat_keystoneclient.KeystoneClient(
             dummy_context())
         heat_ks_client.create_stack_user(long_user_name, password='password')
+
+    def test_stack_user_role_cached(self):
+        """Test that the stack user role is looked up only once."""
+
+        self.addCleanup(heat_keystoneclient._stack_user_roles.clear)
+        role = self.m.CreateMockAnything()
+        role.id = 'role_id'
+        role.name = cfg.CONF.heat_stack_user_role
+        self.mock_ks_client.users = self.m.CreateMockAnything()
+        self.mock_ks_client.roles = self.m.CreateMockAnything()
+        self.mock_ks_client.roles.list().AndReturn([role])
+        for user_id in ('user1', 'user2'):
+            mock_user = self.m.CreateMockAnything()
+            mock_user.id = user_id
+            (self.mock_ks_client.users.create(user_id, '', mox.IgnoreArg(),
+                                              enabled=True,
+                                              tenant_id=mox.IgnoreArg())
+             .AndReturn(mock_user))
+            self.mock_ks_client.roles.add_user_role(user_id, 'role_id',
+                                                    mox.IgnoreArg())
+        self.m.ReplayAll()
+
+        heat_ks_client = heat_keystoneclient.KeystoneClient(
+            dummy_context())
+        self.assertEqual('user1', heat_ks_client.create_stack_user('user1'))
+        self.assertEqual('user2', heat_ks_client.create_stack_user('user2'))
+
+    def test_stack_user_role_stale(self):
+        """Test that a stale cached stack user role is looked up again."""
+
+        self.addCleanup(heat_keystoneclient._stack_user_roles.clear)
+        role_name = cfg.CONF.heat_stack_user_role
+        heat_keystoneclient._stack_user_roles[
+            (dummy_context().auth_url, role_name)] = 'old_role_id'
+        role = self.m.CreateMockAnything()
+        role.id = 'role_id'
+        role.name = role_name
+        mock_user = self.m.CreateMockAnything()
+        mock_user.id = 'user1'
+        self.mock_ks_client.users = self.m.CreateMockAnything()
+        self.mock_ks_client.roles = self.m.CreateMockAnything()
+        (self.mock_ks_client.users.create('user1', '', mox.IgnoreArg(),
+                                          enabled=True,
+                                          tenant_id=mox.IgnoreArg())
+         .AndReturn(mock_user))
+        (self.mock_ks_client.roles.add_user_role('user1', 'old_role_id',
+                                                 mox.IgnoreArg())
+         .AndRaise(heat_keystoneclient.kc.exceptions.NotFound(404)))
+        self.mock_ks_client.roles.list().AndReturn([role])
+        self.mock_ks_client.roles.add_user_role('user1', 'role_id',
+                                                mox.IgnoreArg())
+        self.m.ReplayAll()
+
+        heat_ks_client = heat_keystoneclient.KeystoneClient(
+            dummy_context())
+        self.assertEqual('user1', heat_ks_client.create_stack_user('user1'))
+        self.assertEqual('role_id', heat_keystoneclient._stack_user_roles[
+            (dummy_context().auth_url, role_name)])
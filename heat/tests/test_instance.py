@@ -15,6 +15,7 @@
 import copy
 
 import mox
+from oslo.config import cfg
 
 from heat.engine import environment
 from heat.tests.v1_1 import fakes
@@ -603,3 +604,49 @@ class InstancesTest(HeatTestCase):
                                               'test_without_ip_address')
 
         self.assertEqual(instance.FnGetAtt('PrivateIp'), '0.0.0.0')
+
+
+class UserdataTest(HeatTestCase):
+
+    def setUp(self):
+        super(UserdataTest, self).setUp()
+        self.addCleanup(instances._cloudinit_parts.clear)
+        self.addCleanup(instances._userdata_cache.clear)
+        instances._cloudinit_parts.clear()
+        instances._userdata_cache.clear()
+
+    def test_userdata_reused(self):
+        self.m.StubOutWithMock(instances, '_read_cloudinit_file')
+        for fn in ('config', 'boothook.sh', 'part_handler.py',
+                   'loguserdata.py'):
+            instances._read_cloudinit_file(fn).AndReturn(fn)
+        self.m.ReplayAll()
+
+        first = instances.build_userdata('userdata', '{"foo": "bar"}')
+        self.assertTrue('{"foo": "bar"}' in first)
+        self.assertEqual(first, instances.build_userdata('userdata',
+                                                         '{"foo": "bar"}'))
+
+        # Only the per-server parts differ for other servers
+        other = instances.build_userdata('other', None)
+        self.assertTrue('other' in other)
+        self.assertFalse('cfn-init-data' in other)
+        self.m.VerifyAll()
+
+    def test_userdata_config(self):
+        cfg.CONF.set_override('instance_user', 'first_user')
+        self.addCleanup(cfg.CONF.clear_override, 'instance_user')
+        self.assertTrue('first_user' in instances.build_userdata('ud'))
+
+        cfg.CONF.set_override('instance_user', 'second_user')
+        userdata = instances.build_userdata('ud')
+        self.assertTrue('second_user' in userdata)
+        self.assertFalse('first_user' in userdata)
+
+    def test_userdata_cache_size(self):
+        self.m.stubs.Set(instances, 'USERDATA_CACHE_SIZE', 2)
+        for userdata in ('a', 'b', 'a', 'c'):
+            instances.build_userdata(userdata)
+        self.assertEqual([(instances._config_key(), u, None)
+                          for u in ('a', 'c')],
+                         list(instances._userdata_cache))
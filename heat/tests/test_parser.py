@@ -12,13 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import json
 import time
 import uuid
 
+import eventlet
+
 from heat.engine import environment
 from heat.common import exception
 from heat.common import template_format
+from heat.engine import api
 from heat.engine import clients
 from heat.engine import resource
 from heat.engine import parser
@@ -528,6 +532,30 @@ class StackTest(HeatTestCase):
 
         self.m.ReplayAll()
 
+    def test_validate_concurrent(self):
+        tmpl = {'Resources': {
+                'A': {'Type': 'GenericResourceType'},
+                'B': {'Type': 'GenericResourceType', 'DependsOn': 'A'},
+                'C': {'Type': 'GenericResourceType', 'DependsOn': 'B'}}}
+        stack = parser.Stack(self.ctx, 'validate_test', parser.Template(tmpl))
+        events = []
+
+        def validate(rsrc):
+            events.append(('start', rsrc.name))
+            eventlet.sleep(0)
+            events.append(('end', rsrc.name))
+            if rsrc.name != 'A':
+                return 'Invalid %s' % rsrc.name
+
+        self.m.stubs.Set(generic_rsrc.GenericResource, 'validate', validate)
+
+        # The failure of the first invalid resource is reported
+        ex = self.assertRaises(exception.StackValidationFailed,
+                               stack.validate)
+        self.assertEqual('Invalid B', str(ex))
+        # ... but all of the resources were validated at once
+        self.assertEqual(['start'] * 3, [e for e, r in events[:3]])
+
     def test_state_defaults(self):
         stack = parser.Stack(self.ctx, 'test_stack', parser.Template({}))
         self.assertEqual(stack.state, (None, None))
@@ -672,6 +700,53 @@ class StackTest(HeatTestCase):
         self.assertNotEqual(self.stack.updated_time, None)
         self.assertNotEqual(self.stack.updated_time, stored_time)
 
+    @stack_delete_after
+    def test_updated_time_set(self):
+        self.stack = parser.Stack(self.ctx, 'update_time_set_test',
+                                  parser.Template({}))
+        self.stack.store()
+        now = datetime.datetime(2013, 9, 1, 12, 30)
+        self.stack.updated_time = now
+        self.assertEqual(now, self.stack.updated_time)
+        self.assertEqual(now, db_api.stack_get(self.ctx,
+                                               self.stack.id).updated_at)
+
+    @stack_delete_after
+    def test_timestamps_loaded_with_row(self):
+        tmpl = {'Resources': dict(('R%d' % i,
+                                   {'Type': 'GenericResourceType'})
+                                  for i in range(20))}
+        stack = parser.Stack(self.ctx, 'timestamp_load_test',
+                             parser.Template(tmpl))
+        stack.store()
+        stack.create()
+        self.stack = parser.Stack.load(self.ctx, stack_id=stack.id)
+
+        # The timestamps were loaded with the rows, so they are not fetched
+        # from the database one at a time
+        for cls in (parser.Stack, resource.Resource):
+            for ts in ('created_time', 'updated_time'):
+                self.m.StubOutWithMock(vars(cls)[ts], 'db_fetch')
+        self.m.ReplayAll()
+
+        self.assertNotEqual(None, self.stack.created_time)
+        self.assertNotEqual(None, self.stack.updated_time)
+        api.format_stack(self.stack)
+        for res in self.stack:
+            self.assertNotEqual(None, res.created_time)
+            api.format_stack_resource(res, detail=False)
+        self.m.VerifyAll()
+
+    @stack_delete_after
+    def test_timestamps_after_state_set(self):
+        self.stack = parser.Stack(self.ctx, 'timestamp_state_test',
+                                  parser.Template({}))
+        self.stack.store()
+        self.stack.state_set(self.stack.CREATE, self.stack.COMPLETE, 'test')
+        self.assertEqual(db_api.stack_get(self.ctx,
+                                          self.stack.id).updated_at,
+                         self.stack.updated_time)
+
     @stack_delete_after
     def test_delete(self):
         self.stack = parser.Stack(self.ctx, 'delete_test',
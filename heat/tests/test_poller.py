@@ -0,0 +1,264 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mox
+
+from cinderclient.v1 import client as cinderclient
+from cinderclient.v1 import volumes
+from quantumclient.v2_0 import client as quantumclient
+
+from heat.engine import poller
+from heat.tests.common import HeatTestCase
+from heat.tests import utils
+from heat.tests.v1_1 import fakes
+
+
+class ServerPollerTest(HeatTestCase):
+
+    def setUp(self):
+        super(ServerPollerTest, self).setUp()
+        self.fc = fakes.FakeClient()
+        self.ctx = utils.dummy_context()
+
+    def _servers(self):
+        # Server 1234 is BUILD, and 5678 ACTIVE, in the detailed listing
+        building, active = self.fc.servers.list()[:2]
+        active.status = 'BUILD'
+        return building, active
+
+    def _list_calls(self):
+        return [c for c in self.fc.client.callstack
+                if c[1].startswith('/servers/detail?')]
+
+    def test_single_server(self):
+        server = self.fc.servers.list()[0]
+        self.m.StubOutWithMock(server, 'get')
+        server.get()
+        server.get()
+        self.m.ReplayAll()
+
+        poller.refresh_server(self.ctx, server)
+        poller.refresh_server(self.ctx, server)
+        self.m.VerifyAll()
+        self.assertEqual([], self._list_calls())
+
+    def test_servers_polled_together(self):
+        building, active = self._servers()
+        poller.refresh_server(self.ctx, building)
+        del self.fc.client.callstack[:]
+
+        poller.refresh_server(self.ctx, active)
+        self.assertEqual('ACTIVE', active.status)
+        self.assertEqual(1, len(self._list_calls()))
+        self.assertTrue('changes-since=' in self._list_calls()[0][1])
+
+        # The other server picks up its status from the same listing
+        poller.refresh_server(self.ctx, building)
+        self.assertEqual('BUILD', building.status)
+        self.assertEqual(1, len(self._list_calls()))
+
+        # The next round polls again
+        poller.refresh_server(self.ctx, active)
+        self.assertEqual(2, len(self._list_calls()))
+        self.assertEqual(self._list_calls(), self.fc.client.callstack)
+
+    def test_servers_paged(self):
+        building, active = self._servers()
+        server_poller = poller._poller(poller.ServerPoller, self.ctx,
+                                       self.fc.servers)
+        server_poller.PAGE_SIZE = 1
+        server_poller.refresh(building)
+
+        listing = self.fc.servers.list()
+        self.m.StubOutWithMock(self.fc.servers, 'list')
+        self.fc.servers.list(
+            detailed=True,
+            search_opts=mox.And(mox.ContainsKeyValue('limit', 1),
+                                mox.Not(mox.In('marker')))
+        ).AndReturn(listing[:1])
+        self.fc.servers.list(
+            detailed=True,
+            search_opts=mox.ContainsKeyValue('marker', 1234)
+        ).AndReturn(listing[1:2])
+        self.fc.servers.list(
+            detailed=True,
+            search_opts=mox.ContainsKeyValue('marker', 5678)
+        ).AndReturn([])
+        self.m.ReplayAll()
+
+        server_poller.refresh(active)
+        self.m.VerifyAll()
+        self.assertEqual('ACTIVE', active.status)
+
+    def test_batch_failure(self):
+        building, active = self._servers()
+        poller.refresh_server(self.ctx, building)
+
+        self.m.StubOutWithMock(self.fc.servers, 'list')
+        self.fc.servers.list(
+            detailed=True,
+            search_opts=mox.IgnoreArg()).AndRaise(Exception('overLimit'))
+        self.m.StubOutWithMock(active, 'get')
+        active.get()
+        self.m.ReplayAll()
+
+        poller.refresh_server(self.ctx, active)
+        self.m.VerifyAll()
+
+    def test_servers_held_weakly(self):
+        building, active = self._servers()
+        server_poller = poller._poller(poller.ServerPoller, self.ctx,
+                                       self.fc.servers)
+        server_poller.refresh(building)
+        server_poller.refresh(active)
+        self.assertEqual(2, len(server_poller))
+
+        del active
+        self.assertEqual(1, len(server_poller))
+
+    def test_pollers_per_tenant(self):
+        other_ctx = utils.dummy_context(tenant_id='other_tenant')
+        self.assertTrue(
+            poller._poller(poller.ServerPoller, self.ctx, self.fc.servers) is
+            poller._poller(poller.ServerPoller, self.ctx, self.fc.servers))
+        self.assertFalse(
+            poller._poller(poller.ServerPoller, self.ctx, self.fc.servers) is
+            poller._poller(poller.ServerPoller, other_ctx, self.fc.servers))
+
+
+class VolumePollerTest(HeatTestCase):
+
+    def setUp(self):
+        super(VolumePollerTest, self).setUp()
+        self.cinder = cinderclient.Client('user', 'password', 'tenant',
+                                          'http://keystone:5000/v2.0')
+        self.ctx = utils.dummy_context()
+
+    def _volume(self, volume_id, status):
+        return volumes.Volume(self.cinder.volumes,
+                              {'id': volume_id, 'status': status},
+                              loaded=True)
+
+    def test_volumes_polled_together(self):
+        attaching = self._volume('v1', 'attaching')
+        detaching = self._volume('v2', 'detaching')
+        self.m.StubOutWithMock(attaching, 'get')
+        attaching.get()
+        self.m.StubOutWithMock(self.cinder.volumes, 'list')
+        self.cinder.volumes.list(detailed=True).AndReturn(
+            [self._volume('v1', 'in-use'), self._volume('v2', 'available'),
+             self._volume('v3', 'in-use')])
+        self.m.ReplayAll()
+
+        poller.refresh_volume(self.ctx, self.cinder.volumes, attaching)
+        poller.refresh_volume(self.ctx, self.cinder.volumes, detaching)
+        self.assertEqual('available', detaching.status)
+
+        # The other volume picks up its status from the same listing
+        poller.refresh_volume(self.ctx, self.cinder.volumes, attaching)
+        self.assertEqual('in-use', attaching.status)
+        self.m.VerifyAll()
+
+    def test_missing_volume_fetched(self):
+        attaching = self._volume('v1', 'attaching')
+        deleted = self._volume('v2', 'detaching')
+        self.m.StubOutWithMock(attaching, 'get')
+        attaching.get()
+        self.m.StubOutWithMock(deleted, 'get')
+        deleted.get().AndRaise(Exception('Not found'))
+        self.m.StubOutWithMock(self.cinder.volumes, 'list')
+        self.cinder.volumes.list(detailed=True).AndReturn(
+            [self._volume('v1', 'in-use')])
+        self.m.ReplayAll()
+
+        poller.refresh_volume(self.ctx, self.cinder.volumes, attaching)
+        self.assertRaises(Exception, poller.refresh_volume,
+                          self.ctx, self.cinder.volumes, deleted)
+        poller.refresh_volume(self.ctx, self.cinder.volumes, attaching)
+        self.assertEqual('in-use', attaching.status)
+        self.m.VerifyAll()
+
+
+class FakeQuantumResource(object):
+    def __init__(self, resource_id):
+        self.resource_id = resource_id
+        self.polled_attributes = None
+
+    def refresh_attributes(self):
+        self.polled_attributes = {'id': self.resource_id, 'status': 'BUILD'}
+
+
+class QuantumPollerTest(HeatTestCase):
+
+    def setUp(self):
+        super(QuantumPollerTest, self).setUp()
+        self.qc = quantumclient.Client(endpoint_url='http://quantum:9696',
+                                       token='token')
+        self.ctx = utils.dummy_context()
+        self.m.StubOutWithMock(quantumclient.Client, 'list_ports')
+
+    def _poller(self):
+        return poller.quantum_poller(self.ctx, self.qc, 'ports')
+
+    def test_single_resource(self):
+        self.m.ReplayAll()
+        port = FakeQuantumResource('p1')
+        self._poller().refresh(port)
+        self.assertEqual('BUILD', port.polled_attributes['status'])
+        self.m.VerifyAll()
+
+    def test_resources_polled_together(self):
+        ports = [FakeQuantumResource(p) for p in ('p1', 'p2')]
+        self.qc.list_ports(id=['p1', 'p2']).AndReturn(
+            {'ports': [{'id': 'p1', 'status': 'ACTIVE'},
+                       {'id': 'p2', 'status': 'DOWN'}]})
+        self.m.ReplayAll()
+
+        port_poller = self._poller()
+        port_poller.refresh(ports[0])
+        self.assertEqual('BUILD', ports[0].polled_attributes['status'])
+        port_poller.refresh(ports[1])
+        self.assertEqual('DOWN', ports[1].polled_attributes['status'])
+
+        # The other port picks up its status from the same listing
+        port_poller.refresh(ports[0])
+        self.assertEqual('ACTIVE', ports[0].polled_attributes['status'])
+        self.m.VerifyAll()
+
+    def test_deleted_resource(self):
+        ports = [FakeQuantumResource(p) for p in ('p1', 'p2')]
+        self.qc.list_ports(id=['p1', 'p2']).AndReturn(
+            {'ports': [{'id': 'p1', 'status': 'ACTIVE'}]})
+        self.m.ReplayAll()
+
+        port_poller = self._poller()
+        port_poller.refresh(ports[0])
+        port_poller.refresh(ports[1])
+        self.assertEqual(None, ports[1].polled_attributes)
+        port_poller.discard(ports[1])
+
+        # Once the other port is no longer waited on, a port is fetched on
+        # its own again
+        port_poller.refresh(ports[0])
+        self.assertEqual('ACTIVE', ports[0].polled_attributes['status'])
+        port_poller.refresh(ports[0])
+        self.assertEqual('BUILD', ports[0].polled_attributes['status'])
+        self.m.VerifyAll()
+
+    def test_pollers_per_collection(self):
+        self.m.ReplayAll()
+        self.assertTrue(self._poller() is self._poller())
+        self.assertFalse(
+            self._poller() is poller.quantum_poller(self.ctx, self.qc,
+                                                    'networks'))
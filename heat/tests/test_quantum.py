@@ -338,6 +338,36 @@ class QuantumNetTest(HeatTestCase):
         scheduler.TaskRunner(rsrc.delete)()
         self.m.VerifyAll()
 
+    def test_net_error(self):
+        clients.OpenStackClients.keystone().AndReturn(
+            fakes.FakeKeystoneClient())
+        quantumclient.Client.create_network({
+            'network': {'name': u'the_network', 'admin_state_up': True}
+        }).AndReturn({"network": {
+            "status": "BUILD",
+            "name": "name",
+            "id": "fc68ea2c-b60b-4b4f-bd82-94ec81110766"
+        }})
+        quantumclient.Client.show_network(
+            'fc68ea2c-b60b-4b4f-bd82-94ec81110766'
+        ).AndReturn({"network": {
+            "status": "ERROR",
+            "name": "name",
+            "id": "fc68ea2c-b60b-4b4f-bd82-94ec81110766"
+        }})
+
+        self.m.ReplayAll()
+        t = template_format.parse(quantum_template)
+        stack = parse_stack(t)
+        rsrc = net.Net('test_net', t['Resources']['network'], stack)
+        self.assertRaises(exception.ResourceFailure,
+                          scheduler.TaskRunner(rsrc.create))
+        self.assertEqual((rsrc.CREATE, rsrc.FAILED), rsrc.state)
+
+        # The failed network is no longer polled with the others
+        self.assertEqual(0, len(rsrc._poller()))
+        self.m.VerifyAll()
+
 
 @skipIf(quantumclient is None, 'quantumclient unavailable')
 class QuantumSubnetTest(HeatTestCase):
@@ -0,0 +1,207 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from heat.common import exception
+from heat.common import template_format
+from heat.engine import parser
+from heat.engine import resource
+from heat.engine import template
+
+from heat.tests.common import HeatTestCase
+from heat.tests import generic_resource as generic_rsrc
+from heat.tests import utils
+
+
+cfn_tpl = template_format.parse('''
+{
+  "Parameters" : {
+    "KeyName" : {"Type" : "String", "Default" : "foo"}
+  },
+  "Resources" : {
+    "A" : {"Type" : "GenericResourceType"},
+    "B" : {
+      "Type" : "ResourceWithPropsType",
+      "Metadata" : {"key" : {"Ref" : "KeyName"},
+                    "stack" : {"Ref" : "AWS::StackName"}},
+      "Properties" : {"Foo" : {"Fn::Join" : ["", [{"Ref" : "A"}, "-x"]]}}
+    },
+    "C" : {
+      "Type" : "GenericResourceType",
+      "DependsOn" : "A",
+      "Metadata" : {"b" : {"Fn::GetAtt" : ["B", "foo"]}}
+    },
+    "D" : {"Type" : "GenericResourceType"}
+  },
+  "Outputs" : {
+    "Out" : {"Value" : {"Fn::GetAtt" : ["C", "Foo"]}}
+  }
+}
+''')
+
+hot_tpl = template_format.parse('''
+heat_template_version: 2013-05-23
+resources:
+  A:
+    type: GenericResourceType
+  B:
+    type: ResourceWithPropsType
+    properties:
+      Foo: {get_attr: [A, foo]}
+outputs:
+  out:
+    value: {get_attr: [B, foo]}
+''')
+
+
+class ReferenceIndexTest(HeatTestCase):
+
+    def setUp(self):
+        super(ReferenceIndexTest, self).setUp()
+        utils.setup_dummy_db()
+        resource._register_class('GenericResourceType',
+                                 generic_rsrc.GenericResource)
+        resource._register_class('ResourceWithPropsType',
+                                 generic_rsrc.ResourceWithProps)
+
+    def test_resources(self):
+        index = template.Template(cfn_tpl).references
+
+        self.assertEqual(set(), index.resources['A'].resources())
+        self.assertEqual(set(['A']), index.resources['B'].resources())
+        self.assertEqual(set(['A', 'B']), index.resources['C'].resources())
+        self.assertEqual(set(), index.resources['D'].resources())
+
+    def test_parameters_not_indexed(self):
+        index = template.Template(cfn_tpl).references
+
+        refs = index.resources['B'].section('Metadata')
+        self.assertEqual(0, len(refs))
+
+    def test_attributes(self):
+        index = template.Template(cfn_tpl).references
+
+        self.assertEqual(set([('B', 'foo')]),
+                         index.resources['C'].attributes())
+        self.assertEqual(set([('C', 'Foo')]),
+                         index.outputs['Out'].attributes())
+
+    def test_properties(self):
+        index = template.Template(cfn_tpl).references
+
+        self.assertEqual({'Foo': set(['A'])},
+                         index.resources['B'].properties())
+        self.assertEqual({}, index.resources['C'].properties())
+
+    def test_explicit(self):
+        index = template.Template(cfn_tpl).references
+
+        explicit = [r.resource for r in index.resources['C'] if r.explicit]
+        self.assertEqual(['A'], explicit)
+
+    def test_required_by(self):
+        index = template.Template(cfn_tpl).references
+
+        self.assertEqual(set(['B', 'C']), index.required_by('A'))
+        self.assertEqual(set(['C']), index.required_by('B'))
+        self.assertEqual(set(), index.required_by('D'))
+
+    def test_dependents(self):
+        index = template.Template(cfn_tpl).references
+
+        self.assertEqual(set(['C']), index.dependents(['B']))
+        self.assertEqual(set(['B', 'C']), index.dependents(['A']))
+        self.assertEqual(set(), index.dependents(['C', 'D']))
+
+    def test_for_snippet(self):
+        tmpl = template.Template(cfn_tpl)
+        index = tmpl.references
+
+        snippet = tmpl[template.RESOURCES]['C']
+        self.assertTrue(index.for_snippet('C', snippet) is
+                        index.resources['C'])
+        self.assertTrue(index.for_snippet('C', dict(snippet)) is
+                        index.resources['C'])
+
+        other = index.for_snippet('C', {'Type': 'GenericResourceType',
+                                        'Metadata': {'Ref': 'D'}})
+        self.assertEqual(set(['D']), other.resources())
+
+    def test_non_string_targets(self):
+        index = template.Template({'Resources': {
+            'A': {'Type': 'GenericResourceType'},
+            'B': {'Type': 'GenericResourceType',
+                  'Metadata': {'a': {'Fn::GetAtt': [{'Ref': 'A'}, 'foo']},
+                               'b': {'Fn::GetAtt': [['A'], 'foo']},
+                               'c': {'Fn::GetAtt': 'A'},
+                               'd': {'Ref': {'Fn::Join': ['', ['A']]}}}}}
+        }).references
+
+        self.assertEqual(set(['A']), index.resources['B'].resources())
+        self.assertEqual(set(), index.resources['B'].attributes())
+        self.assertEqual(set(['B']), index.required_by('A'))
+
+    def test_non_string_targets_hot(self):
+        index = template.Template(template_format.parse('''
+heat_template_version: 2013-05-23
+resources:
+  A:
+    type: GenericResourceType
+  B:
+    type: ResourceWithPropsType
+    properties:
+      Foo: {get_attr: [{get_resource: A}, foo]}
+''')).references
+
+        self.assertEqual(set(), index.resources['B'].resources())
+
+    def test_index_built_once(self):
+        tmpl = template.Template(cfn_tpl)
+        self.assertTrue(tmpl.references is tmpl.references)
+
+    def test_hot(self):
+        index = template.Template(hot_tpl).references
+
+        self.assertEqual(set([('A', 'foo')]),
+                         index.resources['B'].attributes())
+        self.assertEqual({'Foo': set(['A'])},
+                         index.resources['B'].properties())
+        self.assertEqual(set([('B', 'foo')]),
+                         index.outputs['out'].attributes())
+
+    def test_stack_dependencies(self):
+        stack = parser.Stack(utils.dummy_context(), 'test_stack',
+                             template.Template(cfn_tpl))
+
+        deps = stack.dependencies
+        self.assertEqual(set([stack['B'], stack['C']]),
+                         set(deps.required_by(stack['A'])))
+        self.assertEqual([stack['C']], list(deps.required_by(stack['B'])))
+
+    def test_stack_dependencies_hot(self):
+        stack = parser.Stack(utils.dummy_context(), 'test_stack',
+                             template.Template(hot_tpl))
+
+        self.assertEqual([stack['B']],
+                         list(stack.dependencies.required_by(stack['A'])))
+
+    def test_invalid_reference(self):
+        tmpl = template.Template({'Resources': {
+            'A': {'Type': 'GenericResourceType',
+                  'Properties': {'Foo': {'Ref': 'Missing'}}}}})
+
+        ex = self.assertRaises(exception.InvalidTemplateReference,
+                               parser.Stack, utils.dummy_context(),
+                               'test_stack', tmpl)
+        self.assertEqual(str(exception.InvalidTemplateReference(
+            resource='Missing', key='Foo')), str(ex))
@@ -99,6 +99,16 @@ class ResourceTest(HeatTestCase):
         self.assertNotEqual(res.updated_time, None)
         self.assertNotEqual(res.updated_time, stored_time)
 
+    def test_updated_time_metadata_set(self):
+        tmpl = {'Type': 'Foo'}
+        res = generic_rsrc.GenericResource('test_res_meta', tmpl, self.stack)
+        res._store()
+        stored_time = res.updated_time
+        res.metadata = {'foo': 'bar'}
+        self.assertEqual(db_api.resource_get(None, res.id).updated_at,
+                         res.updated_time)
+        self.assertNotEqual(stored_time, res.updated_time)
+
     def test_store_or_update(self):
         tmpl = {'Type': 'Foo'}
         res = generic_rsrc.GenericResource('test_res_upd', tmpl, self.stack)
@@ -500,3 +510,60 @@ class MetadataTest(HeatTestCase):
         test_data = {'Test': 'Newly-written data'}
         self.res.metadata = test_data
         self.assertEqual(self.res.metadata, test_data)
+
+    def test_write_increments_version(self):
+        ctx = self.stack.context
+        version = db_api.resource_metadata_version_get(ctx, self.res.id)
+        self.res.metadata = {'Test': 'Newly-written data'}
+        self.assertEqual(version + 1,
+                         db_api.resource_metadata_version_get(ctx,
+                                                              self.res.id))
+
+    def test_read_cached(self):
+        self.res.metadata = {'Test': 'Newly-written data'}
+
+        self.m.StubOutWithMock(db_api, 'resource_metadata_get')
+        self.m.ReplayAll()
+
+        self.assertEqual(self.res.metadata, {'Test': 'Newly-written data'})
+        self.m.VerifyAll()
+
+    def test_read_changed_elsewhere(self):
+        self.assertEqual(self.res.metadata, {'Test': 'Initial metadata'})
+
+        # Simulate a write from another engine
+        db_api.resource_metadata_set(self.stack.context, self.res.id,
+                                     {'Test': 'Written elsewhere'})
+
+        self.assertEqual(self.res.metadata, {'Test': 'Written elsewhere'})
+
+    def test_read_returns_copy(self):
+        metadata = self.res.metadata
+        metadata['Test'] = 'Modified but not written'
+        self.assertEqual(self.res.metadata, {'Test': 'Initial metadata'})
+
+    def test_cache_bounded(self):
+        ctx = self.stack.context
+        resources = [self.res]
+        for name in ('other_resource', 'third_resource'):
+            res = generic_rsrc.GenericResource(name, {'Type': 'Foo'},
+                                               self.stack)
+            scheduler.TaskRunner(res.create)()
+            resources.append(res)
+
+        cache = resource.MetadataCache(max_entries=2)
+        for res in resources:
+            cache.get(ctx, res.id)
+        self.assertEqual(2, len(cache))
+
+        # Only the least recently used entry was dropped
+        self.m.StubOutWithMock(db_api, 'resource_metadata_get')
+        db_api.resource_metadata_get(ctx, self.res.id).AndReturn(
+            (0, {'Test': 'Initial metadata'}))
+        self.m.ReplayAll()
+
+        cache.get(ctx, resources[2].id)
+        self.assertEqual({'Test': 'Initial metadata'},
+                         cache.get(ctx, self.res.id))
+        self.assertEqual(2, len(cache))
+        self.m.VerifyAll()
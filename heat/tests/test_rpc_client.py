@@ -154,17 +154,29 @@ class EngineRpcAPITestCase(testtools.TestCase):
                               metadata={u'wordpress': []})
 
     def test_create_watch_data(self):
-        self._test_engine_api('create_watch_data', 'call',
+        self._test_engine_api('create_watch_data', 'cast',
                               watch_name='watch1',
                               stats_data={})
 
+    def test_create_watch_data_all(self):
+        self._test_engine_api('create_watch_data_all', 'cast',
+                              watch_data=[['watch1', {}]])
+
     def test_show_watch(self):
         self._test_engine_api('show_watch', 'call',
                               watch_name='watch1')
 
     def test_show_watch_metric(self):
         self._test_engine_api('show_watch_metric', 'call',
-                              metric_namespace=None, metric_name=None)
+                              metric_namespace=None, metric_name=None,
+                              limit=None, marker=None)
+
+    def test_show_watch_metric_statistics(self):
+        self._test_engine_api('show_watch_metric_statistics', 'call',
+                              metric_namespace='ns1', metric_name='metric1',
+                              start_time='2012-08-30T15:00:00Z',
+                              end_time='2012-08-30T16:00:00Z',
+                              period=60, statistics=['Sum'], unit=None)
 
     def test_set_watch_state(self):
         self._test_engine_api('set_watch_state', 'call',
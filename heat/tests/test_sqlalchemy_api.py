@@ -99,3 +99,6 @@ class SqlAlchemyTest(HeatTestCase):
         self.assertNotEqual(encrypted_key, "fake secret")
         decrypted_key = cs.my_secret
         self.assertEqual(decrypted_key, "fake secret")
+
+        # The stored value is not modified by reading it
+        self.assertEqual(cs.my_secret, "fake secret")
@@ -13,7 +13,9 @@
 #    under the License.
 
 from testtools import skipIf
+import fixtures
 import os
+import yaml
 
 from heat.engine import clients
 from heat.common import template_format
@@ -91,6 +93,43 @@ Outputs: {}
         self.assertEqual(tpl1, tpl2)
 
 
+class YamlParseLoaderTest(HeatTestCase):
+
+    tmpl_str = u'''HeatTemplateFormatVersion: '2012-12-12'
+Description: Unicode string \u2603
+Resources:
+  WebServer:
+    Type: AWS::EC2::Instance
+    Metadata: {created: 2013-05-23, port: 80}
+    Properties: {ImageId: F17-x86_64-gold, InstanceType: m1.large}
+'''
+
+    def check_parsed(self, tpl):
+        self.assertEqual(u'Unicode string \u2603', tpl[u'Description'])
+        metadata = tpl[u'Resources'][u'WebServer'][u'Metadata']
+        self.assertTrue(isinstance(metadata[u'created'], unicode))
+        self.assertEqual(u'2013-05-23', metadata[u'created'])
+        self.assertEqual(80, metadata[u'port'])
+        image = tpl[u'Resources'][u'WebServer'][u'Properties'][u'ImageId']
+        self.assertTrue(isinstance(image, unicode))
+
+    def test_parse_default_loader(self):
+        self.check_parsed(template_format.parse(self.tmpl_str))
+
+    def test_parse_pure_python_loader(self):
+        self.useFixture(fixtures.MonkeyPatch(
+            'heat.common.template_format.yaml_loader', yaml.SafeLoader))
+        self.check_parsed(template_format.parse(self.tmpl_str))
+
+    @skipIf(not hasattr(yaml, 'CSafeLoader'), 'libyaml unavailable')
+    def test_parse_libyaml_loader(self):
+        self.assertEqual(yaml.CSafeLoader, template_format.yaml_loader)
+        self.check_parsed(template_format.parse(self.tmpl_str))
+
+    def test_parse_invalid(self):
+        self.assertRaises(ValueError, template_format.parse, 'foo: [bar')
+
+
 class YamlEnvironmentTest(HeatTestCase):
 
     def test_no_template_sections(self):
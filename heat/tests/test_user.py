@@ -148,6 +148,30 @@ class UserTest(UserPolicyTestCase):
         self.assertEqual((rsrc.DELETE, rsrc.COMPLETE), rsrc.state)
         self.m.VerifyAll()
 
+    def test_user_delete_during_create(self):
+
+        self.m.StubOutWithMock(user.User, 'keystone')
+        user.User.keystone().MultipleTimes().AndReturn(self.fc)
+        self.m.StubOutWithMock(self.fc, 'delete_stack_user')
+        self.fc.delete_stack_user(self.fc.user_id)
+
+        self.m.ReplayAll()
+
+        t = template_format.parse(user_template)
+        stack = parse_stack(t)
+        rsrc = user.User('CfnUser', t['Resources']['CfnUser'], stack)
+
+        # Abandon the create before check_create_complete() has run
+        create = scheduler.TaskRunner(rsrc.create)
+        create.start()
+        create.cancel()
+        self.assertEqual(None, rsrc.resource_id)
+
+        scheduler.TaskRunner(rsrc.delete)()
+        self.assertEqual(self.fc.user_id, rsrc.resource_id)
+        self.assertEqual((rsrc.DELETE, rsrc.COMPLETE), rsrc.state)
+        self.m.VerifyAll()
+
     def test_user_validate_policies(self):
 
         self.m.StubOutWithMock(user.User, 'keystone')
@@ -299,6 +323,10 @@ class AccessKeyTest(UserPolicyTestCase):
 
         self.assertEqual(utils.PhysName(stack.name, 'CfnUser'),
                          rsrc.FnGetAtt('UserName'))
+        # The secret stored on creation is used rather than fetching the
+        # keypair from keystone again
+        self.m.StubOutWithMock(self.fc, 'get_ec2_keypair')
+        self.m.ReplayAll()
         rsrc._secret = None
         self.assertEqual(rsrc.FnGetAtt('SecretAccessKey'),
                          self.fc.secret)
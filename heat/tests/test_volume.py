@@ -365,6 +365,11 @@ class VolumeTest(HeatTestCase):
 
         self.m.VerifyAll()
 
+    def test_poll_steps(self):
+        poll_steps = vol._poll_steps()
+        self.assertEqual([1, 2, 4, 4, 4],
+                         [next(poll_steps) for i in range(5)])
+
     @skipIf(volume_backups is None, 'unable to import volume_backups')
     def test_snapshot(self):
         stack_name = 'test_volume_stack'
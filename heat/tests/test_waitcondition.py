@@ -414,6 +414,11 @@ class WaitConditionHandleTest(HeatTestCase):
         rsrc.created_time = created_time
         self.assertEqual(rsrc.state, (rsrc.CREATE, rsrc.COMPLETE))
 
+        # Discard the URL stored when the handle was first referenced, so
+        # that it is signed again for the new creation time
+        db_api.resource_data_get_by_key(rsrc.context, rsrc.id,
+                                        'waitcondition_signed_url').delete()
+
         expected_url = "".join([
             'http://127.0.0.1:8000/v1/waitcondition/',
             'arn%3Aopenstack%3Aheat%3A%3Atest_tenant%3Astacks%2F',
@@ -432,6 +437,47 @@ class WaitConditionHandleTest(HeatTestCase):
                           rsrc.handle_update, {}, {}, {})
         self.m.VerifyAll()
 
+    @stack_delete_after
+    def test_handle_url_stored(self):
+        rsrc = self.stack.resources['WaitHandle']
+        url = rsrc.FnGetRefId()
+        self.assertEqual(url, db_api.resource_data_get(
+            rsrc, 'waitcondition_signed_url'))
+        self.assertEqual('4567', db_api.resource_data_get(rsrc,
+                                                          'access_key'))
+        # The signed URL is a credential, so it is stored encrypted
+        self.assertTrue(db_api.resource_data_get_by_key(
+            rsrc.context, rsrc.id, 'waitcondition_signed_url').redact)
+
+        # Neither the URL nor the credentials are fetched from keystone
+        # again when the stack is loaded
+        self.m.StubOutWithMock(self.fc, 'get_ec2_keypair')
+        self.m.ReplayAll()
+
+        stack = parser.Stack.load(self.stack.context,
+                                  stack_id=self.stack.id)
+        self.assertEqual(url, stack.resources['WaitHandle'].FnGetRefId())
+        self.m.VerifyAll()
+
+    @stack_delete_after
+    def test_handle_delete_during_create(self):
+        rsrc = wc.WaitConditionHandle('WaitHandle2',
+                                      self.stack.t['Resources']['WaitHandle'],
+                                      self.stack)
+
+        # Abandon the create before check_create_complete() has run
+        create = scheduler.TaskRunner(rsrc.create)
+        create.start()
+        create.cancel()
+        self.assertEqual(None, rsrc.resource_id)
+
+        # The user is still deleted
+        scheduler.TaskRunner(rsrc.delete)()
+        self.assertEqual('1234', rsrc.resource_id)
+        self.assertEqual(None, self.fc.user_id)
+        self.assertEqual((rsrc.DELETE, rsrc.COMPLETE), rsrc.state)
+        self.m.VerifyAll()
+
     @stack_delete_after
     def test_metadata_update(self):
         rsrc = self.stack.resources['WaitHandle']
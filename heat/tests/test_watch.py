@@ -14,11 +14,12 @@
 
 
 import datetime
-import mox
+from testtools import skipIf
 import heat.db.api as db_api
 
 from heat.common import exception
 from heat.openstack.common import timeutils
+from heat.engine import watchbatch
 from heat.engine import watchrule
 from heat.engine import parser
 from heat.tests.common import HeatTestCase
@@ -29,12 +30,9 @@ from heat.tests.utils import dummy_context
 class WatchData(object):
     def __init__(self, data, created_at):
         self.created_at = created_at
-        self.data = {'test_metric': {'Value': data,
-                                     'Unit': 'Count'}}
-
-
-class DummyAction(object):
-    alarm = "DummyAction"
+        self.metric_name = 'test_metric'
+        self.value = data
+        self.unit = 'Count'
 
 
 class WatchRuleTest(HeatTestCase):
@@ -69,17 +67,11 @@ class WatchRuleTest(HeatTestCase):
 
         self.m.ReplayAll()
 
-    def _action_set_stubs(self, now, action_expected=True):
+    def _action_set_stubs(self, now):
         # Setup stubs for the action tests
         self.m.StubOutWithMock(timeutils, 'utcnow')
         timeutils.utcnow().MultipleTimes().AndReturn(now)
 
-        if action_expected:
-            dummy_action = DummyAction()
-            self.m.StubOutWithMock(parser.Stack, '__getitem__')
-            parser.Stack.__getitem__(mox.IgnoreArg()
-                                     ).MultipleTimes().AndReturn(dummy_action)
-
         self.m.ReplayAll()
 
     def test_minimum(self):
@@ -430,7 +422,7 @@ class WatchRuleTest(HeatTestCase):
                 'Threshold': '30'}
 
         now = timeutils.utcnow()
-        self._action_set_stubs(now, action_expected=False)
+        self._action_set_stubs(now)
 
         # Set data so rule evaluates to NORMAL state
         last = now - datetime.timedelta(seconds=300)
@@ -507,7 +499,31 @@ class WatchRuleTest(HeatTestCase):
 
         actions = self.wr.evaluate()
         self.assertEqual(self.wr.state, 'ALARM')
-        self.assertEqual(actions, ['DummyAction', 'DummyAction'])
+        self.assertEqual(actions, ['DummyAction', 'AnotherDummyAction'])
+        self.m.VerifyAll()
+
+    def test_rule_actions_stack_deleted(self):
+        rule = {'EvaluationPeriods': '1',
+                'MetricName': 'test_metric',
+                'AlarmActions': ['DummyAction'],
+                'Period': '300',
+                'Statistic': 'Maximum',
+                'ComparisonOperator': 'GreaterThanOrEqualToThreshold',
+                'Threshold': '30'}
+
+        class DeletedStack(object):
+            action = parser.Stack.DELETE
+            status = parser.Stack.COMPLETE
+
+        self.m.StubOutWithMock(db_api, 'stack_get')
+        db_api.stack_get(self.ctx, self.stack_id).AndReturn(DeletedStack())
+        self.m.ReplayAll()
+
+        self.wr = watchrule.WatchRule(context=self.ctx,
+                                      watch_name="testwatch",
+                                      rule=rule,
+                                      stack_id=self.stack_id)
+        self.assertEqual([], self.wr.rule_actions('ALARM'))
         self.m.VerifyAll()
 
     @utils.wr_delete_after
@@ -521,7 +537,7 @@ class WatchRuleTest(HeatTestCase):
                 'Threshold': '30'}
 
         now = timeutils.utcnow()
-        self._action_set_stubs(now, action_expected=False)
+        self._action_set_stubs(now)
 
         # On creation the rule evaluates to NODATA state
         last = now - datetime.timedelta(seconds=300)
@@ -562,7 +578,7 @@ class WatchRuleTest(HeatTestCase):
                 'Threshold': '30'}
 
         now = timeutils.utcnow()
-        self._action_set_stubs(now, action_expected=False)
+        self._action_set_stubs(now)
 
         # Set data so rule evaluates to ALARM state
         last = now - datetime.timedelta(seconds=300)
@@ -611,11 +627,15 @@ class WatchRuleTest(HeatTestCase):
         self.wr.create_watch_data(data)
 
         dbwr = db_api.watch_rule_get_by_name(self.ctx, 'create_data_test')
-        self.assertEqual(dbwr.watch_data[0].data, data)
+        sample = dbwr.metric_samples[0]
+        self.assertEqual('CreateDataMetric', sample.metric_name)
+        self.assertEqual(1.0, sample.value)
+        self.assertEqual('Counter', sample.unit)
+        self.assertEqual([], sample.dimensions)
 
         # Note, would be good to write another datapoint and check it
         # but sqlite seems to not interpret the backreference correctly
-        # so dbwr.watch_data is always a list containing only the latest
+        # so dbwr.metric_samples is always a list containing only the latest
         # datapoint.  In non-test use on mysql this is not the case, we
         # correctly get a list of all datapoints where watch_rule_id ==
         # watch_rule.id, so leave it as a single-datapoint test for now.
@@ -642,7 +662,445 @@ class WatchRuleTest(HeatTestCase):
         self.wr.create_watch_data(data)
 
         dbwr = db_api.watch_rule_get_by_name(self.ctx, 'create_data_test')
-        self.assertEqual(dbwr.watch_data, [])
+        self.assertEqual(dbwr.metric_samples, [])
+
+    def _store_window_rule(self, name, statistic, now):
+        rule = {'EvaluationPeriods': '1',
+                'MetricName': 'test_metric',
+                'Period': '300',
+                'Statistic': statistic,
+                'ComparisonOperator': 'GreaterThanThreshold',
+                'Threshold': '2'}
+        self.wr = watchrule.WatchRule(context=self.ctx,
+                                      watch_name=name,
+                                      rule=rule,
+                                      stack_id=self.stack_id)
+        self.wr.store()
+
+        # Two samples inside the evaluation period, one outside it
+        for value, age in ((1, 100), (2, 200), (50, 400)):
+            db_api.metric_sample_create(self.ctx, {
+                'metric_name': 'test_metric',
+                'value': value,
+                'unit': 'Count',
+                'watch_rule_id': self.wr.id,
+                'created_at': now - datetime.timedelta(seconds=age)})
+
+        wr = watchrule.WatchRule.load(self.ctx, watch_name=name)
+        wr.now = now
+        return wr
+
+    @utils.wr_delete_after
+    def test_load_window_data(self):
+        now = timeutils.utcnow()
+        wr = self._store_window_rule('window_data_test', 'Maximum', now)
+
+        self.m.StubOutWithMock(db_api, 'metric_sample_get_all')
+        self.m.ReplayAll()
+
+        self.assertEqual(None, wr.watch_data)
+        self.assertEqual([2, 1], [d.value for d in wr._window_data()])
+        self.assertEqual('NORMAL', wr.get_alarm_state())
+        self.m.VerifyAll()
+
+    @utils.wr_delete_after
+    def test_load_window_sum(self):
+        now = timeutils.utcnow()
+        wr = self._store_window_rule('window_sum_test', 'Sum', now)
+        self.assertEqual('ALARM', wr.get_alarm_state())
+
+        wr.now = now + datetime.timedelta(seconds=150)
+        self.assertEqual('NORMAL', wr.get_alarm_state())
+
+    @utils.wr_delete_after
+    def test_load_window_aggregate(self):
+        now = timeutils.utcnow()
+        wr = self._store_window_rule('window_aggregate_test', 'SampleCount',
+                                     now)
+
+        self.m.StubOutWithMock(db_api,
+                               'metric_sample_get_all_by_watch_rule_id')
+        self.m.ReplayAll()
+
+        self.assertEqual('NORMAL', wr.do_SampleCount())
+        self.assertEqual((2, 3.0, 1.0, 2.0),
+                         db_api.metric_sample_aggregate_by_watch_rule_id(
+                             self.ctx, wr.id, now - wr.timeperiod))
+        self.assertEqual((3, 53.0, 1.0, 50.0),
+                         db_api.metric_sample_aggregate_by_watch_rule_id(
+                             self.ctx, wr.id))
+        self.assertEqual((0, 0, None, None),
+                         db_api.metric_sample_aggregate_by_watch_rule_id(
+                             self.ctx, wr.id, now))
+        self.m.VerifyAll()
+
+    @utils.wr_delete_after
+    def test_aggregates_match_raw_samples(self):
+        now = timeutils.utcnow()
+        for statistic in watchrule.WatchRule.AGGREGATE_STATISTICS:
+            wr = self._store_window_rule('aggregate_%s_test' % statistic,
+                                         statistic, now)
+            for offset in (0, 150, 250, 350):
+                wr.now = now + datetime.timedelta(seconds=offset)
+                self.assertEqual(getattr(wr, 'do_%s' % statistic)(),
+                                 wr.get_alarm_state())
+            self.wr.destroy()
+
+    @utils.wr_delete_after
+    def test_aggregates_updated_on_ingest(self):
+        now = timeutils.utcnow()
+        wr = self._store_window_rule('aggregate_ingest_test', 'Maximum',
+                                     now)
+        self.assertEqual('NORMAL', wr.get_alarm_state())
+
+        self.m.StubOutWithMock(db_api,
+                               'metric_sample_get_all_by_watch_rule_id')
+        self.m.ReplayAll()
+
+        wr.create_watch_data({'test_metric': {'Value': 5, 'Unit': 'Count'}})
+        wr.now = timeutils.utcnow()
+        self.assertEqual('ALARM', wr.get_alarm_state())
+        self.assertEqual((3, 8.0, 1.0, 5.0),
+                         wr.aggregates().statistics(wr.now))
+        self.m.VerifyAll()
+
+    @utils.wr_delete_after
+    def test_aggregates_missing_samples(self):
+        now = timeutils.utcnow()
+        wr = self._store_window_rule('aggregate_missing_test', 'Maximum',
+                                     now)
+        self.assertEqual('NORMAL', wr.get_alarm_state())
+
+        # A sample stored by another engine, which was never added to the
+        # aggregates of this one
+        db_api.metric_sample_create(self.ctx, {
+            'metric_name': 'test_metric',
+            'value': 5,
+            'unit': 'Count',
+            'watch_rule_id': wr.id,
+            'created_at': now})
+        self.assertEqual('ALARM', wr.get_alarm_state())
+        self.assertEqual((3, 8.0, 1.0, 5.0),
+                         wr.aggregates().statistics(now))
+
+        # Once caught up, the aggregates are not populated again
+        self.m.StubOutWithMock(db_api,
+                               'metric_sample_get_all_by_watch_rule_id')
+        self.m.ReplayAll()
+        wr.create_watch_data({'test_metric': {'Value': 7, 'Unit': 'Count'}})
+        wr.now = timeutils.utcnow()
+        self.assertEqual((4, 15.0, 1.0, 7.0),
+                         wr.aggregates().statistics(wr.now))
+        self.m.VerifyAll()
+
+    @utils.wr_delete_after
+    def test_window_boundary(self):
+        now = timeutils.utcnow()
+        wr = self._store_window_rule('window_boundary_test', 'SampleCount',
+                                     now)
+        start = watchrule.window_start(now, 300)
+        self.assertTrue(now - wr.timeperiod <= start)
+        self.assertTrue(start < now - datetime.timedelta(seconds=295))
+        for value, when in ((10, start),
+                            (20, start - datetime.timedelta(microseconds=1))):
+            db_api.metric_sample_create(self.ctx, {
+                'metric_name': 'test_metric',
+                'value': value,
+                'unit': 'Count',
+                'watch_rule_id': wr.id,
+                'created_at': when})
+
+        # Only the sample at the start of the window is counted, however
+        # the rule is evaluated
+        expected = (3, 13.0, 1.0, 10.0)
+        self.assertEqual(expected, wr._statistics())
+        self.assertEqual(expected, wr.aggregates().statistics(now))
+        wr.watch_data = db_api.metric_sample_get_all_by_watch_rule_id(
+            self.ctx, wr.id)
+        self.assertEqual(expected, wr._statistics())
+
+    def _buffered_sample(self, wr, value):
+        return watchrule.metric_sample(wr.id, 'test_metric',
+                                       {'Namespace': 'test/ns',
+                                        'test_metric': {'Value': value,
+                                                        'Unit': 'Count'}})
+
+    @utils.wr_delete_after
+    def test_metric_sample_buffer(self):
+        now = timeutils.utcnow()
+        wr = self._store_window_rule('sample_buffer_test', 'Maximum', now)
+        wr.aggregates()
+
+        buf = watchrule.MetricSampleBuffer(3)
+        buf.add(self.ctx, self._buffered_sample(wr, 5))
+        buf.add(self.ctx, self._buffered_sample(wr, 7))
+        self.assertEqual(2, len(buf))
+        self.assertEqual(3, len(db_api.metric_sample_get_all_by_watch_rule_id(
+            self.ctx, wr.id)))
+
+        self.assertEqual(2, buf.flush(self.ctx))
+        self.assertEqual(0, len(buf))
+        samples = db_api.metric_sample_get_all_by_watch_rule_id(self.ctx,
+                                                                wr.id)
+        self.assertEqual([50, 2, 1, 5, 7], [d.value for d in samples])
+        self.assertEqual('test/ns', samples[-1].namespace)
+        self.assertEqual('Count', samples[-1].unit)
+        self.assertEqual([], samples[-1].dimensions)
+
+        wr.now = timeutils.utcnow()
+        self.assertEqual((4, 15.0, 1.0, 7.0),
+                         wr.aggregates().statistics(wr.now))
+        self.assertEqual(0, buf.flush(self.ctx))
+
+    @utils.wr_delete_after
+    def test_metric_sample_buffer_full(self):
+        wr = self._store_window_rule('sample_buffer_full_test', 'Maximum',
+                                     timeutils.utcnow())
+
+        buf = watchrule.MetricSampleBuffer(2)
+        buf.add(self.ctx, self._buffered_sample(wr, 5))
+        buf.add(self.ctx, self._buffered_sample(wr, 7))
+        self.assertEqual(0, len(buf))
+        self.assertEqual(5, len(db_api.metric_sample_get_all_by_watch_rule_id(
+            self.ctx, wr.id)))
+
+    @utils.wr_delete_after
+    def test_metric_sample_buffer_dropped(self):
+        wr = self._store_window_rule('sample_buffer_drop_test', 'Maximum',
+                                     timeutils.utcnow())
+        info = watchrule.lookup(self.ctx, 'sample_buffer_drop_test')
+        self.assertEqual((wr.id, 'NODATA'), (info.id, info.state))
+
+        buf = watchrule.MetricSampleBuffer(10)
+        buf.add(self.ctx, self._buffered_sample(wr, 5))
+        wr.state_set(wr.SUSPENDED)
+        self.assertEqual(0, buf.flush(self.ctx))
+        info = watchrule.lookup(self.ctx, 'sample_buffer_drop_test')
+        self.assertEqual((wr.id, 'SUSPENDED'), (info.id, info.state))
+
+        buf.add(self.ctx, self._buffered_sample(wr, 5))
+        db_api.watch_rule_delete(self.ctx, wr.id)
+        self.assertEqual(0, buf.flush(self.ctx))
+        self.assertRaises(exception.WatchRuleNotFound, watchrule.lookup,
+                          self.ctx, 'sample_buffer_drop_test')
+
+    @utils.wr_delete_after
+    def test_lookup_cached(self):
+        wr = self._store_window_rule('lookup_cache_test', 'Maximum',
+                                     timeutils.utcnow())
+        info = watchrule.lookup(self.ctx, 'lookup_cache_test')
+        self.assertEqual((wr.id, wr.rule, wr.stack_id, 'NODATA'),
+                         (info.id, info.rule, info.stack_id, info.state))
+        self.assertEqual(wr.updated_at, info.updated_at)
+
+        # Unchanged rules are not loaded again
+        self.m.StubOutWithMock(db_api, 'watch_rule_get_by_name')
+        self.m.ReplayAll()
+        self.assertEqual(info, watchrule.lookup(self.ctx, 'lookup_cache_test'))
+        self.m.VerifyAll()
+        self.m.UnsetStubs()
+
+        # Changes made behind the engine's back (e.g. by another engine) are
+        # seen straight away
+        db_api.watch_rule_update(self.ctx, wr.id, {'state': 'ALARM'})
+        self.assertEqual('ALARM',
+                         watchrule.lookup(self.ctx, 'lookup_cache_test').state)
+        self.assertTrue('lookup_cache_test' in
+                        [w.name for w in watchrule.lookup_all(self.ctx)])
+        self.assertEqual('ALARM',
+                         watchrule.lookup(self.ctx, 'lookup_cache_test').state)
+
+        loaded = watchrule.WatchRule.load(self.ctx, watch=info)
+        self.assertEqual((wr.id, wr.name), (loaded.id, loaded.name))
+
+        wr.destroy()
+        self.assertRaises(exception.WatchRuleNotFound, watchrule.lookup,
+                          self.ctx, 'lookup_cache_test')
+
+    @utils.wr_delete_after
+    def test_lookup_deleted_elsewhere(self):
+        wr = self._store_window_rule('lookup_deleted_test', 'Maximum',
+                                     timeutils.utcnow())
+        watchrule.lookup(self.ctx, 'lookup_deleted_test')
+
+        db_api.watch_rule_delete(self.ctx, wr.id)
+        self.assertRaises(exception.WatchRuleNotFound, watchrule.lookup,
+                          self.ctx, 'lookup_deleted_test')
+
+    def test_percentile(self):
+        self.assertEqual(3, watchrule.percentile([3], 99))
+        self.assertEqual(2.5, watchrule.percentile([1, 2, 3, 4], 50))
+        self.assertEqual(3.7, watchrule.percentile([1, 2, 3, 4], 90))
+
+    def test_percentile_statistic(self):
+        rule = {'EvaluationPeriods': '1',
+                'MetricName': 'test_metric',
+                'Period': '300',
+                'Statistic': 'p90',
+                'ComparisonOperator': 'GreaterThanThreshold',
+                'Threshold': '30'}
+        now = timeutils.utcnow()
+        last = now - datetime.timedelta(seconds=300)
+        data = [WatchData(v, now - datetime.timedelta(seconds=10))
+                for v in range(1, 11)]
+        data.append(WatchData(100, now - datetime.timedelta(seconds=400)))
+
+        self.wr = watchrule.WatchRule(context=self.ctx,
+                                      watch_name="testwatch",
+                                      rule=rule,
+                                      watch_data=data,
+                                      stack_id=self.stack_id,
+                                      last_evaluated=last)
+        self.wr.now = now
+        self.assertEqual('NORMAL', self.wr.get_alarm_state())
+
+        rule['Threshold'] = '9'
+        self.assertEqual('ALARM', self.wr.get_alarm_state())
+
+        self.wr.watch_data = data[-1:]
+        self.assertEqual('NODATA', self.wr.get_alarm_state())
+
+    @skipIf(not watchbatch.available(), 'numpy unavailable')
+    @utils.wr_delete_after
+    def test_bulk_alarm_states(self):
+        now = timeutils.utcnow()
+        ages = (10, 50, 100, 200, 280, 350)
+        patterns = {'increasing': (1, 2, 3, 4, 5, 60),
+                    'mixed': (7, 1, 30, 2, 2, 0.5),
+                    'old': (None, None, None, None, None, 9),
+                    'empty': ()}
+
+        self.wr = []
+        for statistic in watchbatch.STATISTICS:
+            for op in watchbatch.COMPARISONS:
+                for threshold in ('2', '4.5', '30'):
+                    for pattern, values in sorted(patterns.items()):
+                        name = 'bulk_%s_%s_%s_%s' % (statistic, op,
+                                                     threshold, pattern)
+                        wr = watchrule.WatchRule(
+                            context=self.ctx, watch_name=name,
+                            rule={'EvaluationPeriods': '1',
+                                  'MetricName': 'test_metric',
+                                  'Period': '300',
+                                  'Statistic': statistic,
+                                  'ComparisonOperator': op,
+                                  'Threshold': threshold},
+                            stack_id=self.stack_id)
+                        wr.store()
+                        self.wr.append(wr)
+                        db_api.metric_sample_create_all(self.ctx, [
+                            {'metric_name': 'test_metric',
+                             'value': value,
+                             'watch_rule_id': wr.id,
+                             'created_at':
+                             now - datetime.timedelta(seconds=age)}
+                            for age, value in zip(ages, values)
+                            if value is not None])
+
+        states = watchbatch.alarm_states(self.ctx, self.wr, now)
+        self.assertEqual(len(self.wr), len(states))
+        for wr in self.wr:
+            loaded = watchrule.WatchRule.load(self.ctx, watch_name=wr.name)
+            loaded.now = now
+            self.assertEqual((wr.name, loaded.get_alarm_state()),
+                             (wr.name, states[wr.id]))
+        self.assertEqual(set(['ALARM', 'NORMAL', 'NODATA']),
+                         set(states.values()))
+
+    @skipIf(not watchbatch.available(), 'numpy unavailable')
+    @utils.wr_delete_after
+    def test_bulk_alarm_states_window_boundary(self):
+        now = timeutils.utcnow()
+        self.wr = []
+        for threshold in ('1', '2'):
+            wr = watchrule.WatchRule(
+                context=self.ctx, watch_name='bulk_boundary_%s' % threshold,
+                rule={'EvaluationPeriods': '1',
+                      'MetricName': 'test_metric',
+                      'Period': '100',
+                      'Statistic': 'SampleCount',
+                      'ComparisonOperator': 'GreaterThanOrEqualToThreshold',
+                      'Threshold': threshold},
+                stack_id=self.stack_id)
+            wr.store()
+            self.wr.append(wr)
+            start = watchrule.window_start(now, 100)
+            db_api.metric_sample_create_all(self.ctx, [
+                {'metric_name': 'test_metric',
+                 'value': 1,
+                 'watch_rule_id': wr.id,
+                 'created_at': when}
+                for when in (start,
+                             start - datetime.timedelta(microseconds=1))])
+
+        states = watchbatch.alarm_states(self.ctx, self.wr, now)
+        for wr in self.wr:
+            loaded = watchrule.WatchRule.load(self.ctx, watch_name=wr.name)
+            loaded.now = now
+            self.assertEqual(loaded.get_alarm_state(), states[wr.id])
+        self.assertEqual(['ALARM', 'NORMAL'],
+                         [states[wr.id] for wr in self.wr])
+
+    @utils.wr_delete_after
+    def test_purge_metric_samples(self):
+        now = datetime.datetime(2013, 1, 1, 12, 30)
+        wr = self._store_window_rule('purge_test', 'Maximum', now)
+
+        self.m.StubOutWithMock(db_api, 'watch_rule_get_all')
+        db_api.watch_rule_get_all(self.ctx).MultipleTimes().AndReturn(
+            [db_api.watch_rule_get(self.ctx, wr.id)])
+        self.m.ReplayAll()
+
+        self.assertEqual(1, watchrule.purge_metric_samples(self.ctx, 0,
+                                                           now=now))
+        self.assertEqual(0, watchrule.purge_metric_samples(self.ctx, 0,
+                                                           now=now))
+        self.assertEqual([2, 1], [d.value for d in wr._window_data()])
+        self.assertEqual([], db_api.metric_aggregate_get_all_by_watch_rule_id(
+            self.ctx, wr.id))
+        self.m.VerifyAll()
+
+    @utils.wr_delete_after
+    def test_purge_metric_samples_rollup(self):
+        now = datetime.datetime(2013, 1, 1, 12, 30)
+        wr = self._store_window_rule('purge_rollup_test', 'Maximum', now)
+
+        self.m.StubOutWithMock(db_api, 'watch_rule_get_all')
+        db_api.watch_rule_get_all(self.ctx).MultipleTimes().AndReturn(
+            [db_api.watch_rule_get(self.ctx, wr.id)])
+        self.m.ReplayAll()
+
+        self.assertEqual(1, watchrule.purge_metric_samples(
+            self.ctx, 0, 'hour', now))
+        self.assertEqual(1, watchrule.purge_metric_samples(
+            self.ctx, 0, 'hour', now + datetime.timedelta(seconds=200)))
+
+        aggs = db_api.metric_aggregate_get_all_by_watch_rule_id(self.ctx,
+                                                                wr.id)
+        self.assertEqual(1, len(aggs))
+        self.assertEqual(datetime.datetime(2013, 1, 1, 12), aggs[0].created_at)
+        self.assertEqual(3600, aggs[0].resolution)
+        self.assertEqual((2, 52.0, 2.0, 50.0),
+                         (aggs[0].sample_count, aggs[0].sum,
+                          aggs[0].minimum, aggs[0].maximum))
+        self.assertEqual([1], [d.value for d in wr._window_data()])
+        self.m.VerifyAll()
+
+    def test_purge_metric_samples_invalid_rollup(self):
+        self.assertRaises(ValueError, watchrule.purge_metric_samples,
+                          self.ctx, 0, 'fortnight')
+
+    @utils.wr_delete_after
+    def test_watch_data_delete(self):
+        wr = self._store_window_rule('data_delete_test', 'Maximum',
+                                     timeutils.utcnow())
+
+        self.assertEqual(3, db_api.watch_data_delete(self.ctx,
+                                                     'data_delete_test'))
+        self.assertEqual([], db_api.metric_sample_get_all_by_watch_rule_id(
+            self.ctx, wr.id))
+        self.assertRaises(exception.NotFound, db_api.watch_data_delete,
+                          self.ctx, 'no_such_watch')
 
     def test_destroy(self):
         rule = {'EvaluationPeriods': '1',
@@ -749,3 +1207,62 @@ class WatchRuleTest(HeatTestCase):
         self.assertRaises(ValueError, self.wr.set_watch_state, None)
 
         self.assertRaises(ValueError, self.wr.set_watch_state, "BADSTATE")
+
+
+class AggregatesTest(HeatTestCase):
+
+    def setUp(self):
+        super(AggregatesTest, self).setUp()
+        self.now = datetime.datetime(2013, 9, 1, 12, 0, 0)
+        self.agg = watchrule.Aggregates(300, buckets=30)
+
+    def _add(self, age, value):
+        self.agg.add(self.now - datetime.timedelta(seconds=age), value)
+
+    def test_empty(self):
+        self.assertEqual((0, 0, None, None), self.agg.statistics(self.now))
+
+    def test_statistics(self):
+        self._add(10, 4.0)
+        self._add(12, 2.0)
+        self._add(100, 9.0)
+        self.assertEqual((3, 15.0, 2.0, 9.0), self.agg.statistics(self.now))
+
+    def test_period_expiry(self):
+        self._add(100, 9.0)
+        self._add(200, 1.0)
+        later = self.now + datetime.timedelta(seconds=150)
+        self.assertEqual((1, 9.0, 9.0, 9.0), self.agg.statistics(later))
+
+    def test_bucket_reuse(self):
+        self._add(100, 9.0)
+        # 300s later the same bucket in the ring is reused
+        self.now += datetime.timedelta(seconds=300)
+        self._add(100, 1.0)
+        self.assertEqual((1, 1.0, 1.0, 1.0), self.agg.statistics(self.now))
+
+    def test_old_sample_ignored(self):
+        self._add(10, 1.0)
+        self._add(310, 50.0)
+        self.assertEqual((1, 1.0, 1.0, 1.0), self.agg.statistics(self.now))
+
+    def test_window_start(self):
+        start = watchrule.window_start(self.now, 300, buckets=30)
+        self.assertEqual(datetime.datetime(2013, 9, 1, 11, 55, 10), start)
+        self.agg.add(start, 1.0)
+        self.agg.add(start - datetime.timedelta(microseconds=1), 2.0)
+        self.assertEqual((1, 1.0, 1.0, 1.0), self.agg.statistics(self.now))
+
+    def test_window_start_uneven_buckets(self):
+        period = datetime.timedelta(seconds=100)
+        for micros in range(0, 5000000, 123457):
+            now = self.now + datetime.timedelta(microseconds=micros)
+            start = watchrule.window_start(now, 100)
+            self.assertTrue(now - period <= start)
+            bucket = period / 60 + datetime.timedelta(microseconds=1)
+            self.assertTrue(start <= now - period + bucket)
+
+            agg = watchrule.Aggregates(100)
+            agg.add(start, 1.0)
+            agg.add(start - datetime.timedelta(microseconds=1), 2.0)
+            self.assertEqual((1, 1.0, 1.0, 1.0), agg.statistics(now))
@@ -0,0 +1,74 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import testtools
+
+from heat.engine import watchscheduler
+
+
+def at(seconds):
+    return datetime.datetime(2013, 1, 1) + datetime.timedelta(seconds=seconds)
+
+
+class WatchSchedulerTest(testtools.TestCase):
+
+    def setUp(self):
+        super(WatchSchedulerTest, self).setUp()
+        self.scheduler = watchscheduler.WatchScheduler()
+
+    def test_pop_due_in_order(self):
+        self.scheduler.schedule('c', at(30))
+        self.scheduler.schedule('a', at(10))
+        self.scheduler.schedule('b', at(20))
+
+        self.assertEqual([], self.scheduler.pop_due(at(5)))
+        self.assertEqual(['a', 'b'], self.scheduler.pop_due(at(20)))
+        self.assertEqual(1, len(self.scheduler))
+        self.assertEqual(['c'], self.scheduler.pop_due(at(100)))
+        self.assertEqual(0, len(self.scheduler))
+
+    def test_reschedule(self):
+        self.scheduler.schedule('a', at(10))
+        self.scheduler.schedule('a', at(50))
+
+        self.assertEqual([], self.scheduler.pop_due(at(20)))
+        self.assertTrue('a' in self.scheduler)
+        self.assertEqual(['a'], self.scheduler.pop_due(at(50)))
+        self.assertFalse('a' in self.scheduler)
+
+    def test_schedule_twice(self):
+        self.scheduler.schedule('a', at(10))
+        self.scheduler.schedule('a', at(10))
+
+        self.assertEqual(['a'], self.scheduler.pop_due(at(10)))
+
+    def test_unschedule(self):
+        self.scheduler.schedule('a', at(10))
+        self.scheduler.schedule('b', at(10))
+        self.scheduler.unschedule('a')
+        self.scheduler.unschedule('missing')
+
+        self.assertEqual(['b'], self.scheduler.pop_due(at(10)))
+
+    def test_due_time(self):
+        rule = {'Period': '300'}
+
+        self.assertEqual(at(400), watchscheduler.due_time(rule, at(100),
+                                                          at(200)))
+        self.assertEqual(at(700), watchscheduler.due_time(rule, at(100),
+                                                          at(400)))
+        self.assertEqual(at(500), watchscheduler.due_time(rule, None,
+                                                          at(200)))